@@ -1,24 +1,63 @@
+import os
 from flask import Flask
+from werkzeug.middleware.proxy_fix import ProxyFix
+from jinja2 import FileSystemBytecodeCache
 from config import config
-from app.extensions import db, login_manager, migrate, scheduler
+from app.extensions import db, login_manager, migrate, login_limiter, event_broker, audit_sink, metrics, request_profiler
+from app.extensions import static_assets, response_compression
+from app.extensions import configure_read_replica, enable_sqlite_wal
 
-def create_app(config_name='default'):
+def create_app(config_name='default', background_services=True):
     """
     Application Factory: Creates and configures the Flask app.
+    Pass background_services=False (tests, benchmarks, one-off scripts) to skip
+    starting the scheduler and its jobs.
     """
     app = Flask(__name__)
     
     # 1. Load Configuration
     app.config.from_object(config[config_name])
 
+    # Trust X-Forwarded-For from that many proxies, so request.remote_addr is the client
+    proxies = app.config.get("PROXY_FIX_X_FOR", 0)
+    if proxies:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxies)
+
+    # Cache compiled templates on disk so new workers skip Jinja compilation
+    cache_dir = app.config.get("TEMPLATE_BYTECODE_CACHE_DIR")
+    if cache_dir:
+        if not os.path.isabs(cache_dir):
+            cache_dir = os.path.join(app.instance_path, cache_dir)
+        os.makedirs(cache_dir, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+
     # 2. Initialize Extensions
+    configure_read_replica(app)  # Optional 'replica' bind for read routing
     db.init_app(app)
+    enable_sqlite_wal(app)
     login_manager.init_app(app)
     migrate.init_app(app, db)
+    login_limiter.init_app(app)
+    event_broker.init_app(app)
+    audit_sink.init_app(app)
+    metrics.init_app(app)
+    request_profiler.init_app(app)  # Admin-only: ?_profile=1 or PROFILER_SAMPLE_RATE
+    static_assets.init_app(app)  # asset_url() and /assets/ (build with `flask assets build`)
+    response_compression.init_app(app)  # Registered last, so it runs first: timings include it
+
+    # Live calendar updates: publish slot changes to SSE clients after each commit
+    from app.events import register_publisher
+    register_publisher(event_broker)
     
     # Initialize Scheduler (Modern Flask-APScheduler pattern)
-    scheduler.init_app(app)
-    scheduler.start()
+    if background_services:
+        from app.extensions import get_scheduler
+        from app.tasks import register_jobs
+
+        scheduler = get_scheduler()
+        scheduler.init_app(app)
+        register_jobs(app)
+        scheduler.start()
 
     # 3. Register Blueprints (Routes)
     # We import these inside the function to avoid circular imports
@@ -32,6 +71,16 @@ def create_app(config_name='default'):
     app.register_blueprint(admin_bp, url_prefix='/admin') # e.g., /admin/dashboard
     app.register_blueprint(reservations_bp)               # e.g., /daily_slots/
 
+    # CLI: `flask seed` (synthetic data for load testing)
+    from app.seed import seed_command
+    from app.slots import slots_cli
+    from app.telemetry import telemetry_cli
+    from app.assets import assets_cli
+    app.cli.add_command(seed_command)
+    app.cli.add_command(slots_cli)  # `flask slots convert-sparse`, `flask slots compact`
+    app.cli.add_command(telemetry_cli)  # `flask telemetry agent <server_id>` (simulated agent)
+    app.cli.add_command(assets_cli)  # `flask assets build`
+
     # 4. Import Models
     # This ensures SQLAlchemy "knows" about your tables before migration runs
     from app import models
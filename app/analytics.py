@@ -0,0 +1,394 @@
+import threading
+import time
+from calendar import monthrange
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import bindparam, exists, extract, func, select, tuple_
+
+from app.archive import archive_usage, is_archived_month
+from app.extensions import db
+from app.models import ReservationVersion, Server, SlotArchive, TimeSlot, UsageRollup, User, user_server
+
+
+# --- Incremental Updates ---
+
+
+def record_booking(server_id, user_id, day, delta):
+    """
+    Adds delta (+1 book / -1 cancel) to the rollup row for the slot's month.
+    Does NOT commit: it rides along with the caller's booking transaction.
+    """
+    table = UsageRollup.__table__
+    key = (
+        (table.c.year == day.year)
+        & (table.c.month == day.month)
+        & (table.c.server_id == server_id)
+        & (table.c.user_id == user_id)
+    )
+
+    result = db.session.execute(
+        table.update().where(key).values(booked_days=table.c.booked_days + delta)
+    )
+    if result.rowcount == 0 and delta > 0:  # type: ignore
+        db.session.add(UsageRollup(day.year, day.month, server_id, user_id, delta))
+
+
+def record_bookings(deltas):
+    """
+    record_booking for many changes at once: {(server_id, user_id, year, month): delta}.
+    One executemany UPDATE, plus one INSERT for new rows. Does NOT commit.
+    """
+    table = UsageRollup.__table__
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    # Rows that don't exist yet can only be created by bookings (delta > 0)
+    existing = set()
+    if any(delta > 0 for delta in deltas.values()):
+        server_ids = {server_id for server_id, _, _, _ in deltas}
+        existing = set(
+            db.session.execute(
+                select(table.c.server_id, table.c.user_id, table.c.year, table.c.month).where(
+                    table.c.server_id.in_(server_ids)
+                    & tuple_(table.c.year, table.c.month).in_({(year, month) for _, _, year, month in deltas})
+                )
+            ).all()
+        )
+
+    updates = [
+        {"k_server": server_id, "k_user": user_id, "k_year": year, "k_month": month, "delta": delta}
+        for (server_id, user_id, year, month), delta in deltas.items()
+        if delta < 0 or (server_id, user_id, year, month) in existing
+    ]
+    inserts = [
+        {"server_id": server_id, "user_id": user_id, "year": year, "month": month, "booked_days": delta}
+        for (server_id, user_id, year, month), delta in deltas.items()
+        if delta > 0 and (server_id, user_id, year, month) not in existing
+    ]
+
+    if updates:
+        db.session.execute(
+            table.update()
+            .where(
+                (table.c.server_id == bindparam("k_server"))
+                & (table.c.user_id == bindparam("k_user"))
+                & (table.c.year == bindparam("k_year"))
+                & (table.c.month == bindparam("k_month"))
+            )
+            .values(booked_days=table.c.booked_days + bindparam("delta")),
+            updates,
+        )
+    if inserts:
+        db.session.execute(table.insert(), inserts)
+
+
+def rebuild_rollups():
+    """
+    Recomputes the whole rollup table: live months from TimeSlot in a single
+    INSERT ... SELECT, compacted months from SlotArchive.
+    Returns the number of rollup rows written.
+    """
+    table = UsageRollup.__table__
+    archive = SlotArchive.__table__
+    year_col = extract("year", TimeSlot.start_time)
+    month_col = extract("month", TimeSlot.start_time)
+
+    # Server-months already in the archive are counted from there only (a compaction
+    # interrupted before its deletes leaves rows behind in both places)
+    archived = exists().where(
+        archive.c.server_id == TimeSlot.server_id,
+        archive.c.year == year_col,
+        archive.c.month == month_col,
+    )
+
+    counts = (
+        select(
+            year_col,
+            month_col,
+            TimeSlot.server_id,
+            TimeSlot.reserved_by_user_id,
+            func.count(TimeSlot.id),
+        )
+        .where(TimeSlot.reserved_by_user_id.isnot(None), ~archived)  # type: ignore
+        .group_by(year_col, month_col, TimeSlot.server_id, TimeSlot.reserved_by_user_id)
+    )
+
+    db.session.execute(table.delete())
+    db.session.execute(
+        table.insert().from_select(
+            ["year", "month", "server_id", "user_id", "booked_days"], counts
+        )
+    )
+    archived_counts = archive_usage()
+    if archived_counts:
+        db.session.execute(
+            table.insert(),
+            [
+                {"year": year, "month": month, "server_id": server_id, "user_id": user_id, "booked_days": days}
+                for (year, month, server_id, user_id), days in archived_counts.items()
+            ],
+        )
+    db.session.commit()
+    return db.session.query(func.count()).select_from(table).scalar()
+
+
+# --- Read Side (rollup table only, never scans TimeSlot) ---
+
+
+def server_utilization(year, month):
+    """
+    Booked days / days in month, for every server.
+    """
+    days_in_month = monthrange(year, month)[1]
+
+    rows = (
+        db.session.query(
+            Server.id,
+            Server.name,
+            func.coalesce(func.sum(UsageRollup.booked_days), 0),
+        )
+        .outerjoin(
+            UsageRollup,
+            (UsageRollup.server_id == Server.id)
+            & (UsageRollup.year == year)
+            & (UsageRollup.month == month),
+        )
+        .group_by(Server.id, Server.name)
+        .order_by(Server.name)
+        .all()
+    )
+
+    return [
+        {
+            "server_id": server_id,
+            "server": name,
+            "booked_days": booked,
+            "available_days": days_in_month,
+            "utilization": round(booked / days_in_month * 100, 1),
+        }
+        for server_id, name, booked in rows
+    ]
+
+
+def user_utilization(year, month):
+    """
+    Booked days / available days (days in month x assigned servers), for every user who booked.
+    """
+    days_in_month = monthrange(year, month)[1]
+
+    assigned = (
+        select(user_server.c.user_id, func.count().label("servers"))
+        .group_by(user_server.c.user_id)
+        .subquery()
+    )
+
+    rows = (
+        db.session.query(
+            User.id,
+            User.username,
+            User.position,
+            User.ratio,
+            func.coalesce(assigned.c.servers, 0),
+            func.sum(UsageRollup.booked_days),
+        )
+        .join(UsageRollup, UsageRollup.user_id == User.id)
+        .outerjoin(assigned, assigned.c.user_id == User.id)
+        .filter(UsageRollup.year == year, UsageRollup.month == month)
+        .group_by(User.id, User.username, User.position, User.ratio, assigned.c.servers)
+        .order_by(User.username)
+        .all()
+    )
+
+    results = []
+    for user_id, username, position, ratio, servers, booked in rows:
+        available = days_in_month * max(servers, 1)
+        results.append(
+            {
+                "user_id": user_id,
+                "user": username,
+                "position": position,
+                "ratio": ratio,
+                "booked_days": booked,
+                "available_days": available,
+                "utilization": round(booked / available * 100, 1),
+            }
+        )
+    return results
+
+
+def position_utilization(user_rows):
+    """
+    Groups user_utilization() rows by position.
+    """
+    by_position = {}
+    for row in user_rows:
+        entry = by_position.setdefault(
+            row["position"] or "Unknown",
+            {"position": row["position"] or "Unknown", "ratio": row["ratio"], "users": 0,
+             "booked_days": 0, "available_days": 0},
+        )
+        entry["users"] += 1
+        entry["booked_days"] += row["booked_days"]
+        entry["available_days"] += row["available_days"]
+
+    for entry in by_position.values():
+        entry["utilization"] = round(entry["booked_days"] / entry["available_days"] * 100, 1)
+
+    return sorted(by_position.values(), key=lambda e: e["position"])
+
+
+def month_report(year, month):
+    """
+    Everything the analytics page and JSON export need for one month.
+    """
+    users = user_utilization(year, month)
+    return {
+        "year": year,
+        "month": month,
+        "servers": server_utilization(year, month),
+        "users": users,
+        "positions": position_utilization(users),
+    }
+
+
+# --- Occupancy Heatmap (server x day) ---
+
+# Matrices per (year, month, location, gpu_model): {"built", "version", "data"}
+_occupancy_cache = {}
+_occupancy_lock = threading.Lock()
+OCCUPANCY_CACHE_MAX = 256
+
+
+def _reservations_version():
+    """
+    Sum of every server's ReservationVersion: changes whenever any booking does.
+    """
+    table = ReservationVersion.__table__
+    return db.session.execute(
+        select(func.coalesce(func.sum(table.c.version), 0)).where(table.c.scope == "server")
+    ).scalar()
+
+
+def compute_occupancy(year, month, location=None, gpu_model=None):
+    """
+    Reserved days per server for one month, from a single GROUP BY (server, day) query
+    (plus the archive row for compacted months). Servers can be filtered by location
+    and GPU model.
+    """
+    days_in_month = monthrange(year, month)[1]
+    month_start = datetime(year, month, 1)
+    month_end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+
+    server_filter = []
+    if location:
+        server_filter.append(Server.location == location)
+    if gpu_model:
+        server_filter.append(Server.gpu_model == gpu_model)
+
+    servers = db.session.execute(
+        select(Server.id, Server.name, Server.location, Server.gpu_model)
+        .where(*server_filter)
+        .order_by(Server.name)
+    ).all()
+    grid = {server_id: [0] * days_in_month for server_id, _, _, _ in servers}
+
+    # 1. One aggregate query for the whole fleet
+    day_col = extract("day", TimeSlot.start_time)
+    rows = db.session.execute(
+        select(TimeSlot.server_id, day_col, func.count())
+        .join(Server, Server.id == TimeSlot.server_id)
+        .where(
+            TimeSlot.start_time >= month_start,  # type: ignore
+            TimeSlot.start_time < month_end,  # type: ignore
+            TimeSlot.reserved_by_user_id.isnot(None),  # type: ignore
+            *server_filter,
+        )
+        .group_by(TimeSlot.server_id, day_col)
+    )
+    for server_id, day, count in rows:
+        if server_id in grid:
+            grid[server_id][int(day) - 1] = 1 if count else 0
+
+    # 2. Compacted months live in the archive
+    if is_archived_month(year, month) and grid:
+        archived = db.session.execute(
+            select(SlotArchive.server_id, SlotArchive.owners).where(
+                SlotArchive.year == year,
+                SlotArchive.month == month,
+                SlotArchive.server_id.in_(list(grid)),  # type: ignore
+            )
+        )
+        for server_id, owners in archived:
+            for index, user_id in enumerate(owners):
+                if user_id:
+                    grid[server_id][index] = 1
+
+    # 3. Totals
+    day_totals = [sum(column) for column in zip(*grid.values())] if grid else [0] * days_in_month
+    server_rows = []
+    for server_id, name, server_location, server_gpu in servers:
+        booked = sum(grid[server_id])
+        server_rows.append(
+            {
+                "server_id": server_id,
+                "server": name,
+                "location": server_location,
+                "gpu_model": server_gpu,
+                "days": grid[server_id],
+                "booked_days": booked,
+                "utilization": round(booked / days_in_month * 100, 1),
+            }
+        )
+
+    total = sum(day_totals)
+    capacity = days_in_month * len(servers)
+    return {
+        "year": year,
+        "month": month,
+        "days_in_month": days_in_month,
+        "location": location,
+        "gpu_model": gpu_model,
+        "servers": server_rows,
+        "day_totals": day_totals,
+        "booked_days": total,
+        "utilization": round(total / capacity * 100, 1) if capacity else 0.0,
+    }
+
+
+def get_occupancy(year, month, location=None, gpu_model=None):
+    """
+    Cached wrapper around compute_occupancy(). An entry is reused until a booking
+    changes (the summed reservation versions differ) or HEATMAP_CACHE_TTL runs out,
+    which also picks up server edits.
+    """
+    key = (year, month, location or None, gpu_model or None)
+    ttl = current_app.config.get("HEATMAP_CACHE_TTL", 300)
+    version = _reservations_version()
+    now = time.time()
+
+    with _occupancy_lock:
+        entry = _occupancy_cache.get(key)
+        if entry and entry["version"] == version and now - entry["built"] < ttl:
+            return entry["data"]
+
+    data = compute_occupancy(*key)
+    with _occupancy_lock:
+        if len(_occupancy_cache) >= OCCUPANCY_CACHE_MAX:
+            _occupancy_cache.clear()
+        _occupancy_cache[key] = {"built": now, "version": version, "data": data}
+    return data
+
+
+def server_filter_options():
+    """
+    Distinct locations and GPU models, for the heatmap filters.
+    """
+    locations = db.session.execute(
+        select(Server.location).where(Server.location.isnot(None)).distinct().order_by(Server.location)  # type: ignore
+    ).scalars().all()
+    gpu_models = db.session.execute(
+        select(Server.gpu_model).where(Server.gpu_model.isnot(None)).distinct().order_by(Server.gpu_model)  # type: ignore
+    ).scalars().all()
+    return locations, gpu_models
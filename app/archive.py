@@ -0,0 +1,169 @@
+from calendar import monthrange
+from collections import Counter, namedtuple
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import extract
+
+from app.extensions import db
+from app.models import Server, SlotArchive, TimeSlot, User
+
+# Cold storage for past months. A completed month never changes again, so
+# compact_history() folds its TimeSlot rows into one SlotArchive row per server
+# (an owner per day) and deletes the originals. Months start moving once they are
+# older than SLOT_ARCHIVE_AFTER_MONTHS. Read paths that show old months (the user and
+# admin calendars, the rollup rebuild) merge the archive in, so it is transparent.
+
+# Stand-in for a TimeSlot row in the calendar templates (no id: nothing to act on)
+ArchivedSlot = namedtuple(
+    "ArchivedSlot",
+    ["id", "server_id", "server", "start_time", "reserved_by_user_id", "reserved_by_user", "archived"],
+)
+
+
+def archive_cutoff(today=None):
+    """
+    First day of the oldest month kept in TimeSlot; earlier months are compacted.
+    """
+    today = today or datetime.now()
+    index = today.year * 12 + today.month - 1 - current_app.config.get("SLOT_ARCHIVE_AFTER_MONTHS", 3)
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def is_archived_month(year, month, today=None):
+    return datetime(year, month, 1) < archive_cutoff(today)
+
+
+def _month_end(year, month):
+    return datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+
+
+# --- Read Side ---
+
+
+def archived_slots(year, month, server_id=None):
+    """
+    Reserved days of a compacted month as ArchivedSlot tuples, for one server or all.
+    """
+    query = SlotArchive.query.filter_by(year=year, month=month)
+    if server_id is not None:
+        query = query.filter_by(server_id=server_id)
+    archives = query.all()
+    if not archives:
+        return []
+
+    # Two lookups for the names instead of one per day
+    user_ids = {user_id for archive in archives for user_id in archive.owners if user_id}
+    users = {u.id: u for u in User.query.filter(User.id.in_(user_ids))} if user_ids else {}  # type: ignore
+    servers = {s.id: s for s in Server.query.filter(Server.id.in_({a.server_id for a in archives}))}  # type: ignore
+
+    slots = []
+    for archive in archives:
+        for index, user_id in enumerate(archive.owners):
+            if user_id:
+                slots.append(
+                    ArchivedSlot(
+                        None, archive.server_id, servers.get(archive.server_id),
+                        datetime(year, month, index + 1), user_id, users.get(user_id), True,
+                    )
+                )
+    return slots
+
+
+def archive_usage():
+    """
+    Booked days per (year, month, server_id, user_id) over the whole archive.
+    """
+    table = SlotArchive.__table__
+    counts = Counter()
+    rows = db.session.execute(
+        db.select(table.c.year, table.c.month, table.c.server_id, table.c.owners).execution_options(yield_per=1000)
+    )
+    for year, month, server_id, owners in rows:
+        for user_id in owners:
+            if user_id:
+                counts[(year, month, server_id, user_id)] += 1
+    return counts
+
+
+# --- Compaction ---
+
+
+def compact_history(chunk_size=5000, today=None):
+    """
+    Moves every TimeSlot month before archive_cutoff() into SlotArchive. Per server-month,
+    one transaction writes the archive row, then the originals are deleted chunk_size rows
+    per transaction. Safe to re-run after an interruption: archive rows are merged.
+    Returns (server-months compacted, TimeSlot rows deleted).
+    """
+    table = TimeSlot.__table__
+    cutoff = archive_cutoff(today)
+    year_col = extract("year", table.c.start_time)
+    month_col = extract("month", table.c.start_time)
+
+    groups = db.session.execute(
+        db.select(table.c.server_id, year_col, month_col)
+        .where(table.c.start_time < cutoff)
+        .group_by(table.c.server_id, year_col, month_col)
+    ).all()
+
+    months = deleted = 0
+    for server_id, year, month in groups:
+        year, month = int(year), int(month)
+        in_month = (
+            (table.c.server_id == server_id)
+            & (table.c.start_time >= datetime(year, month, 1))
+            & (table.c.start_time < _month_end(year, month))
+        )
+
+        # 1. Archive row (merged with a partial one from an interrupted run)
+        owners = [None] * monthrange(year, month)[1]
+        for start_time, user_id in db.session.execute(
+            db.select(table.c.start_time, table.c.reserved_by_user_id).where(
+                in_month, table.c.reserved_by_user_id.isnot(None)
+            )
+        ):
+            owners[start_time.day - 1] = user_id
+
+        archive = db.session.get(SlotArchive, (server_id, year, month))
+        if archive is None:
+            db.session.add(SlotArchive(server_id, year, month, owners))
+        else:
+            archive.owners = [new or old for new, old in zip(owners, archive.owners)]
+        db.session.commit()
+
+        # 2. Originals, in short transactions
+        while True:
+            ids = db.select(table.c.id).where(in_month).limit(chunk_size).scalar_subquery()
+            result = db.session.execute(table.delete().where(table.c.id.in_(ids)))
+            db.session.commit()
+            deleted += result.rowcount
+            if result.rowcount < chunk_size:
+                break
+        months += 1
+
+    return months, deleted
+
+
+def forget_user(user_id):
+    """
+    Clears a deleted user from every archived month (their days become unowned, as
+    the user deletion policy does for TimeSlot). Returns the archive rows changed.
+    """
+    table = SlotArchive.__table__
+    changed = []
+    rows = db.session.execute(
+        db.select(table.c.server_id, table.c.year, table.c.month, table.c.owners).execution_options(yield_per=1000)
+    )
+    for server_id, year, month, owners in rows:
+        if user_id in owners:
+            changed.append((server_id, year, month, [None if o == user_id else o for o in owners]))
+
+    for server_id, year, month, owners in changed:
+        db.session.execute(
+            table.update()
+            .where(table.c.server_id == server_id, table.c.year == year, table.c.month == month)
+            .values(owners=owners)
+        )
+    db.session.commit()
+    return len(changed)
@@ -0,0 +1,237 @@
+import asyncio
+import json
+import re
+import time
+from http.cookies import SimpleCookie
+
+from a2wsgi import WSGIMiddleware
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app import create_app
+from app.archive import is_archived_month
+from app.availability import archive_query, assignment_query, build_availability, slots_query, usernames_query
+from app.events import month_topic, server_topic
+from app.extensions import REPLICA_BIND, db, event_broker
+from app.metrics import REQUEST_LATENCY, REQUESTS
+from app.models import User
+from app.slots import open_days
+from app.maintenance import month_days, windows_query
+
+# Optional ASGI serving mode (`uvicorn asgi:app`, extra packages: see README).
+# The long-lived and read-heavy GET endpoints - the live-calendar event streams and
+# the month availability JSON - run as coroutines on an async driver (aiosqlite /
+# asyncpg), so an idle browser costs a few KB instead of a worker thread. Every other
+# request goes to the normal Flask app in a thread pool, unchanged.
+
+# Async engine drivers for the sync URLs this app is configured with
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+
+def async_url(url):
+    """
+    The same database through its async driver (url is a SQLAlchemy URL object).
+    """
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise RuntimeError(f"No async driver configured for {backend} databases.")
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+
+class AsyncApp:
+    """
+    ASGI application: async views for the routes in self.routes, Flask for the rest.
+    """
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.wsgi = WSGIMiddleware(flask_app, workers=flask_app.config.get("ASGI_WSGI_THREADS", 10))  # Threads for the Flask routes
+
+        with flask_app.app_context():
+            primary = db.engine.url  # Relative SQLite paths are already resolved here
+            replica = db.engines[REPLICA_BIND].url if REPLICA_BIND in db.engines else None
+        override = flask_app.config.get("ASYNC_DATABASE_URL")
+        self.engine = create_async_engine(override or async_url(primary))
+        self.replica_engine = create_async_engine(async_url(replica)) if replica and not override else None
+        self.serializer = flask_app.session_interface.get_signing_serializer(flask_app)  # type: ignore
+
+        self.routes = [
+            (re.compile(r"/reserve/(?P<server_id>\d+)/(?P<year>\d+)/(?P<month>\d+)/availability\.json"),
+             "reservations.availability", self.availability),
+            (re.compile(r"/reserve/(?P<server_id>\d+)/(?P<year>\d+)/(?P<month>\d+)/stream"),
+             "reservations.stream", self.server_stream),
+            (re.compile(r"/admin/reservations/(?P<year>\d+)/(?P<month>\d+)/stream"),
+             "admin.reservations_stream", self.month_stream),
+        ]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self._lifespan(receive, send)
+
+        if scope["type"] == "http" and scope["method"] in ("GET", "HEAD"):
+            for pattern, endpoint, view in self.routes:
+                match = pattern.fullmatch(scope["path"])
+                if match:
+                    started = time.perf_counter()
+                    status = await view(scope, receive, send, **{k: int(v) for k, v in match.groupdict().items()})
+                    REQUEST_LATENCY.observe(time.perf_counter() - started, endpoint, scope["method"])
+                    REQUESTS.inc(endpoint, scope["method"], str(status))
+                    return
+
+        await self.wsgi(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.engine.dispose()
+                if self.replica_engine is not None:
+                    await self.replica_engine.dispose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    # --- Helpers ---
+
+    def _session(self, scope):
+        """
+        The Flask session from the signed cookie ({} if missing or invalid).
+        """
+        cookie_name = self.flask_app.config["SESSION_COOKIE_NAME"]
+        for name, value in scope.get("headers", ()):
+            if name == b"cookie":
+                morsel = SimpleCookie(value.decode("latin-1")).get(cookie_name)
+                if morsel is None:
+                    continue
+                try:
+                    max_age = int(self.flask_app.permanent_session_lifetime.total_seconds())
+                    return self.serializer.loads(morsel.value, max_age=max_age)
+                except Exception:
+                    return {}
+        return {}
+
+    def _read_engine(self, session):
+        # Same rule as RoutingSession: the replica, unless this browser wrote recently
+        if self.replica_engine is not None and session.get("_primary_until", 0) < time.time():
+            return self.replica_engine
+        return self.engine
+
+    async def _user(self, conn, session):
+        """
+        (id, is_admin) of the logged-in user, or None.
+        """
+        user_id = session.get("_user_id")
+        if user_id is None:
+            return None
+        row = (await conn.execute(User.__table__.select().with_only_columns(
+            User.__table__.c.id, User.__table__.c.is_admin).where(User.__table__.c.id == int(user_id))
+        )).first()
+        return tuple(row) if row else None
+
+    @staticmethod
+    async def _respond(send, status, body=b"", content_type=b"text/plain; charset=utf-8"):
+        await send({"type": "http.response.start", "status": status, "headers": [(b"content-type", content_type)]})
+        await send({"type": "http.response.body", "body": body})
+        return status
+
+    # --- Views ---
+
+    async def availability(self, scope, receive, send, server_id, year, month):
+        """
+        Async twin of reservations.availability (same JSON).
+        """
+        session = self._session(scope)
+        async with self._read_engine(session).connect() as conn:
+            user = await self._user(conn, session)
+            if user is None:
+                return await self._respond(send, 401, b"Login required\n")
+            if not (await conn.execute(assignment_query(user[0], server_id))).first():
+                return await self._respond(send, 403, b"Forbidden\n")
+
+            slot_rows = (await conn.execute(slots_query(server_id, year, month))).all()
+            windows = (await conn.execute(windows_query(server_id, year, month))).all()
+            archived_owners, usernames = None, {}
+            with self.flask_app.app_context():
+                archived = is_archived_month(year, month)
+                free_days = open_days(year, month)
+            if archived:
+                archived_owners = (await conn.execute(archive_query(server_id, year, month))).scalar()
+                owner_ids = {owner_id for owner_id in archived_owners or () if owner_id}
+                if owner_ids:
+                    usernames = dict((await conn.execute(usernames_query(owner_ids))).all())
+
+        payload = build_availability(
+            server_id, year, month, user[0], slot_rows, archived_owners, usernames, free_days,
+            month_days(windows, year, month),
+        )
+        body = json.dumps(payload, separators=(",", ":")).encode()
+        return await self._respond(send, 200, body, b"application/json")
+
+    async def server_stream(self, scope, receive, send, server_id, year, month):
+        session = self._session(scope)
+        async with self._read_engine(session).connect() as conn:
+            user = await self._user(conn, session)
+            if user is None:
+                return await self._respond(send, 401, b"Login required\n")
+            if not (await conn.execute(assignment_query(user[0], server_id))).first():
+                return await self._respond(send, 403, b"Forbidden\n")
+        return await self._stream(receive, send, server_topic(server_id, year, month))
+
+    async def month_stream(self, scope, receive, send, year, month):
+        session = self._session(scope)
+        async with self._read_engine(session).connect() as conn:
+            user = await self._user(conn, session)
+        if user is None or not user[1]:
+            return await self._respond(send, 403, b"Forbidden\n")
+        return await self._stream(receive, send, month_topic(year, month))
+
+    async def _stream(self, receive, send, topic):
+        """
+        Server-Sent Events for one topic, as EventBroker.stream() does for sync views.
+        The database connection is already back in the pool while the client idles.
+        """
+        sub = event_broker.subscribe_async(topic)
+        disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+        try:
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"text/event-stream"),
+                    (b"cache-control", b"no-cache"),
+                    (b"x-accel-buffering", b"no"),
+                ],
+            })
+            await send({"type": "http.response.body", "body": b"retry: 5000\n\n", "more_body": True})
+            while True:
+                # Wake up for an event, the heartbeat or the client leaving, whichever comes first
+                next_event = asyncio.ensure_future(sub.queue.get())
+                await asyncio.wait({next_event, disconnected}, timeout=event_broker.heartbeat,
+                                   return_when=asyncio.FIRST_COMPLETED)
+                if disconnected.done():
+                    next_event.cancel()
+                    break
+                if next_event.done():
+                    frame = f"event: slot\ndata: {next_event.result()}\n\n"
+                else:
+                    next_event.cancel()
+                    frame = ": heartbeat\n\n"
+                await send({"type": "http.response.body", "body": frame.encode(), "more_body": True})
+        except OSError:
+            pass  # Client went away mid-write
+        finally:
+            event_broker.unsubscribe(sub)
+            disconnected.cancel()
+        return 200
+
+
+async def _wait_for_disconnect(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+def create_asgi_app(config_name="default"):
+    return AsyncApp(create_app(config_name))
@@ -0,0 +1,199 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+
+import click
+from flask import abort, current_app, request, send_from_directory, url_for
+from flask.cli import AppGroup
+
+# Self-hosted static files. `flask assets build` copies everything under app/static to
+# the build directory with a content hash in each file name, points url(...) references
+# inside CSS at the hashed names, writes .gz (and .br when the brotli package is
+# installed) next to every compressible file, and records logical -> hashed names in
+# manifest.json. Templates call asset_url("vendor/..."): with a build that is
+# /assets/<hashed name>, cacheable forever and served precompressed; without one it is
+# the plain /static URL.
+
+COMPRESSIBLE = (".css", ".js", ".svg", ".json", ".txt", ".map", ".html", ".ico")
+CSS_URL = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""")
+MANIFEST = "manifest.json"
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip only
+    brotli = None
+
+
+def build_dir(app):
+    path = app.config.get("ASSETS_BUILD_DIR") or "dist"
+    return path if os.path.isabs(path) else os.path.join(app.static_folder, path)
+
+
+class StaticAssets:
+    """
+    Serves the fingerprinted build and provides asset_url() to templates.
+    """
+
+    def __init__(self, app=None):
+        self._manifest = None
+        self._manifest_key = None  # (path, mtime) it was read from
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        prefix = app.config.get("ASSETS_URL_PREFIX", "/assets")
+        app.add_url_rule(f"{prefix}/<path:filename>", "assets", self._serve)
+        app.jinja_env.globals["asset_url"] = self.url
+
+    def manifest(self):
+        """
+        {"files": {logical: hashed}, "encodings": {hashed: [...]}}; empty without a build.
+        Re-read when the file changes, so a rebuild needs no restart.
+        """
+        path = os.path.join(build_dir(current_app), MANIFEST)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return {"files": {}, "encodings": {}}
+        if (path, mtime) != self._manifest_key:
+            with open(path) as f:
+                self._manifest = json.load(f)
+            self._manifest_key = (path, mtime)
+        return self._manifest
+
+    def url(self, filename):
+        hashed = self.manifest()["files"].get(filename)
+        if hashed is None:
+            return url_for("static", filename=filename)
+        return url_for("assets", filename=hashed)
+
+    def _serve(self, filename):
+        encodings = self.manifest()["encodings"].get(filename)
+        if encodings is None:
+            abort(404)
+
+        # Best precompressed variant the client accepts (encodings are listed br first)
+        encoding = next((e for e in encodings if request.accept_encodings[e]), None)
+        suffix = {"br": ".br", "gzip": ".gz"}.get(encoding, "")
+        max_age = current_app.config.get("ASSETS_MAX_AGE", 31536000)
+
+        response = send_from_directory(
+            build_dir(current_app), filename + suffix, mimetype=mimetypes.guess_type(filename)[0], max_age=max_age
+        )
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+        if encodings:
+            response.vary.add("Accept-Encoding")
+        response.cache_control.public = True
+        response.cache_control.immutable = True  # The name changes whenever the content does
+        return response
+
+
+# --- Build ---
+
+
+def _hashed_name(path, data):
+    digest = hashlib.sha256(data).hexdigest()[:10]
+    root, ext = posixpath.splitext(path)
+    return f"{root}.{digest}{ext}"
+
+
+def _rewrite_css(path, css, files):
+    """
+    Points relative url(...) references of a CSS file at the hashed files. The old
+    cache-busting query string (e.g. fonts/x.woff2?abc) is dropped: the name is enough.
+    """
+    base = posixpath.dirname(path)
+
+    def replace(match):
+        quote, ref = match.groups()
+        if ref.startswith(("data:", "http:", "https:", "//", "/", "#")):
+            return match.group(0)
+        target, fragment = ref.split("#", 1) if "#" in ref else (ref, None)
+        target = posixpath.normpath(posixpath.join(base, target.split("?", 1)[0]))
+        hashed = files.get(target)
+        if hashed is None:
+            return match.group(0)
+        new_ref = posixpath.relpath(hashed, base) + (f"#{fragment}" if fragment else "")
+        return f"url({quote}{new_ref}{quote})"
+
+    return CSS_URL.sub(replace, css.decode("utf-8")).encode("utf-8")
+
+
+def build_assets(static_dir, output_dir, gzip_level=9, brotli_quality=11):
+    """
+    Builds the fingerprinted, precompressed copy of static_dir in output_dir (replacing
+    any previous build). Returns [(logical, hashed, size, gzip size, brotli size)].
+    """
+    if os.path.isdir(output_dir):
+        shutil.rmtree(output_dir)
+    output_real = os.path.realpath(output_dir)
+
+    sources = []
+    for root, dirs, names in os.walk(static_dir):
+        dirs[:] = [d for d in dirs if not d.startswith(".") and os.path.realpath(os.path.join(root, d)) != output_real]
+        for name in names:
+            if not name.startswith("."):
+                full = os.path.join(root, name)
+                sources.append(os.path.relpath(full, static_dir).replace(os.sep, "/"))
+
+    # CSS last, so the files it references already have their hashed names
+    sources.sort(key=lambda path: (path.endswith(".css"), path))
+
+    files, encodings, report = {}, {}, []
+    for path in sources:
+        with open(os.path.join(static_dir, path), "rb") as f:
+            data = f.read()
+        if path.endswith(".css"):
+            data = _rewrite_css(path, data, files)
+
+        hashed = _hashed_name(path, data)
+        target = os.path.join(output_dir, hashed)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, "wb") as f:
+            f.write(data)
+
+        variants = {}
+        if path.endswith(COMPRESSIBLE):
+            if brotli is not None:
+                variants["br"] = brotli.compress(data, quality=brotli_quality)
+            variants["gzip"] = gzip.compress(data, compresslevel=gzip_level, mtime=0)
+        kept = []
+        for encoding, compressed in variants.items():
+            if len(compressed) < len(data) * 0.9:  # Not worth a Content-Encoding otherwise
+                with open(target + (".br" if encoding == "br" else ".gz"), "wb") as f:
+                    f.write(compressed)
+                kept.append(encoding)
+
+        files[path] = hashed
+        encodings[hashed] = kept
+        report.append((path, hashed, len(data), len(variants.get("gzip", b"")) or None, len(variants.get("br", b"")) or None))
+
+    with open(os.path.join(output_dir, MANIFEST), "w") as f:
+        json.dump({"files": files, "encodings": encodings}, f, indent=1, sort_keys=True)
+    return report
+
+
+assets_cli = AppGroup("assets", help="Static asset build.")
+
+
+@assets_cli.command("build")
+def build_command():
+    """Fingerprint and precompress app/static (run on every deploy)."""
+    output_dir = build_dir(current_app)
+    report = build_assets(current_app.static_folder, output_dir)
+    for path, hashed, size, gz, br in report:
+        sizes = f"{size:>9,} B"
+        if gz:
+            sizes += f"  gzip {gz:>8,} B"
+        if br:
+            sizes += f"  br {br:>8,} B"
+        click.echo(f"{hashed:<64}{sizes}")
+    click.echo(f"Built {len(report)} files into {output_dir}.")
+    if brotli is None:
+        click.echo("Install the brotli package to also write .br files.")
@@ -0,0 +1,127 @@
+import atexit
+import json
+import os
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# Append-only JSONL copy of the audit log, for offline analytics.
+# Events are buffered in memory and written in batches: one write + one fsync per
+# batch instead of per event. A crash can lose at most the last unflushed batch;
+# the AuditLog table stays the source of truth. log_action queues its events on the
+# DB session; they reach the buffer only when that transaction commits.
+
+
+class AuditSink:
+    """
+    Buffered, fsync-batched JSONL writer with size-based rotation
+    (events.jsonl -> events.jsonl.1 -> ... -> events.jsonl.N).
+    """
+
+    def __init__(self, app=None):
+        self.path = None
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._file = None
+        self._flusher = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        path = app.config.get("AUDIT_JSONL_PATH")
+        if not path:
+            self.path = None  # Sink disabled
+            return
+
+        # '{pid}' gives every worker process its own file (rotation isn't safe across processes)
+        path = path.format(pid=os.getpid())
+        if not os.path.isabs(path):
+            path = os.path.join(app.instance_path, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self.path = path
+        self.batch_size = app.config.get("AUDIT_JSONL_BATCH_SIZE", 100)
+        self.flush_interval = app.config.get("AUDIT_JSONL_FLUSH_INTERVAL", 1.0)
+        self.max_bytes = app.config.get("AUDIT_JSONL_MAX_BYTES", 50 * 1024 * 1024)
+        self.backup_count = app.config.get("AUDIT_JSONL_BACKUPS", 5)
+        atexit.register(self.flush)
+
+        if not event.contains(Session, "after_commit", _emit_queued):
+            event.listen(Session, "after_commit", _emit_queued)
+            event.listen(Session, "after_soft_rollback", _discard_queued)
+
+    def queue(self, session, event):
+        """
+        Emits the event once the session's transaction commits; dropped on rollback.
+        """
+        if self.path:
+            session.info.setdefault("audit_events", []).append((self, event))
+
+    def emit(self, event):
+        """
+        Queues one event (a JSON-serializable dict). Written when the batch is full
+        or by the background flusher within flush_interval seconds.
+        """
+        if not self.path:
+            return
+
+        line = json.dumps(event, separators=(",", ":"), default=str) + "\n"
+        with self._lock:
+            self._buffer.append(line)
+            full = len(self._buffer) >= self.batch_size
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name="audit-sink", daemon=True)
+                self._flusher.start()
+        if full:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes everything buffered so far with a single fsync.
+        """
+        with self._lock:
+            if not self._buffer or not self.path:
+                return
+            data = "".join(self._buffer).encode()
+            self._buffer = []
+
+            try:
+                if self._file is None:
+                    self._file = open(self.path, "ab")
+                if self._file.tell() and self._file.tell() + len(data) > self.max_bytes:
+                    self._rotate()
+                self._file.write(data)
+                self._file.flush()
+                os.fsync(self._file.fileno())
+            except OSError as e:
+                # The table has the entry already: never let its JSONL copy crash a request
+                print(f"Audit sink write failed: {e}")
+
+    def _rotate(self):
+        # Caller holds the lock
+        self._file.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{i}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._file = open(self.path, "ab")
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+
+def _emit_queued(session):
+    for sink, event in session.info.pop("audit_events", []):
+        sink.emit(event)
+
+
+def _discard_queued(session, previous_transaction):
+    session.info.pop("audit_events", None)
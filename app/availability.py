@@ -0,0 +1,70 @@
+from datetime import datetime
+
+from sqlalchemy import select
+
+from app.models import SlotArchive, TimeSlot, User, user_server
+
+# Month availability for one server as JSON-ready data. The statements are plain Core,
+# so the same code serves the sync view (db.session) and the async view in app/asgi.py
+# (an AsyncConnection); only the execution differs.
+
+
+def month_bounds(year, month):
+    start = datetime(year, month, 1)
+    end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+    return start, end
+
+
+def assignment_query(user_id, server_id):
+    return select(user_server.c.user_id).where(
+        user_server.c.user_id == user_id, user_server.c.server_id == server_id
+    )
+
+
+def slots_query(server_id, year, month):
+    start, end = month_bounds(year, month)
+    return (
+        select(TimeSlot.start_time, TimeSlot.reserved_by_user_id, User.username)
+        .outerjoin(User, User.id == TimeSlot.reserved_by_user_id)
+        .where(
+            TimeSlot.server_id == server_id,
+            TimeSlot.start_time >= start,  # type: ignore
+            TimeSlot.start_time < end,  # type: ignore
+        )
+    )
+
+
+def archive_query(server_id, year, month):
+    return select(SlotArchive.owners).where(
+        SlotArchive.server_id == server_id, SlotArchive.year == year, SlotArchive.month == month
+    )
+
+
+def usernames_query(user_ids):
+    return select(User.id, User.username).where(User.id.in_(user_ids))  # type: ignore
+
+
+def build_availability(server_id, year, month, user_id, slot_rows, archived_owners, usernames, open_days, maintenance_days=()):
+    """
+    {"days": {day: {"reserved", "mine", "owner"}}, "open_days": [...], "maintenance_days": [...]}
+    for one month. slot_rows are slots_query() rows; archived_owners is the month's
+    SlotArchive owner list (or None) with usernames {user_id: name} for it;
+    maintenance_days are the days blocked by maintenance windows (not open).
+    """
+    days = {}
+    if archived_owners:
+        for index, owner_id in enumerate(archived_owners):
+            if owner_id:
+                days[index + 1] = {"reserved": True, "mine": owner_id == user_id, "owner": usernames.get(owner_id)}
+
+    for start_time, owner_id, username in slot_rows:
+        days[start_time.day] = {"reserved": owner_id is not None, "mine": owner_id == user_id, "owner": username}
+
+    return {
+        "server_id": server_id,
+        "year": year,
+        "month": month,
+        "days": days,
+        "open_days": sorted(set(open_days) - set(maintenance_days)),
+        "maintenance_days": sorted(maintenance_days),
+    }
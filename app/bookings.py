@@ -0,0 +1,170 @@
+from datetime import timedelta
+
+from app.extensions import db
+from app.models import TimeSlot, WaitlistEntry, user_server
+from app.analytics import record_booking
+from app.quota import adjust_used_quota, month_usage, monthly_allowance, weekly_allowance
+from app.events import queue_slot_change
+from app.slots import discard_if_empty
+from app.feeds import bump_versions
+
+# Shared booking logic used by the user calendar, the admin tools and the waitlist.
+# None of these functions commit: the caller commits once, so a booking, its counters
+# and any waitlist hand-over land in the same transaction.
+#
+# On PostgreSQL the booking path also takes row and advisory locks so several workers
+# can book at once; SQLite has a single writer, so the locks compile away there.
+
+
+def lock_slot(slot_id):
+    """
+    Loads the slot with SELECT ... FOR UPDATE, so a concurrent booking or cancel
+    of the same day waits for this transaction and then sees its result.
+    Returns None if there is no such slot.
+    """
+    return TimeSlot.query.filter_by(id=slot_id).with_for_update().first()
+
+
+def lock_quota(user_id, server_id):
+    """
+    Serializes quota checks for one user on one server until the transaction ends,
+    so two parallel bookings can't both pass check_limits with the last free day.
+    PostgreSQL advisory lock; a no-op on other databases.
+    """
+    if db.session.get_bind().dialect.name == "postgresql":
+        db.session.execute(
+            db.text("SELECT pg_advisory_xact_lock(:user_id, :server_id)"),
+            {"user_id": user_id, "server_id": server_id},
+        )
+
+
+def lock_server_days(server_ids, exclusive=False):
+    """
+    Bookings hold this lock shared, starting a maintenance window holds it exclusively,
+    so no booking can slip into days that are being blocked (in sparse storage a new
+    row is invisible to the window's FOR UPDATE). Take it before any row lock.
+    PostgreSQL advisory lock on the server id (the single-key space, apart from
+    lock_quota's two-key locks); a no-op on other databases.
+    """
+    if db.session.get_bind().dialect.name != "postgresql":
+        return
+    function = "pg_advisory_xact_lock" if exclusive else "pg_advisory_xact_lock_shared"
+    for server_id in sorted(server_ids):  # Same order everywhere: no deadlocks between windows
+        db.session.execute(db.text(f"SELECT {function}(:key)"), {"key": server_id})
+
+
+def check_limits(user_id, server_id, day, pending=()):
+    """
+    Returns None if the user may book 'day' on this server,
+    otherwise (reason, message) for the first limit that blocks it.
+    'pending': days the caller is giving the user on this server in the same
+    transaction that aren't written yet; they count against the limits too.
+    """
+    # 1. Monthly Limit (ratio-weighted allowance from the quota policy)
+    monthly_limit = monthly_allowance(user_id, server_id, day.year, day.month)
+    monthly_count = month_usage(user_id, server_id, day)
+    monthly_count += sum(1 for d in pending if (d.year, d.month) == (day.year, day.month))
+
+    if monthly_count >= monthly_limit:
+        return (
+            "quota",
+            f"Monthly Quota Reached: You cannot book more than {monthly_limit} days per month. (Used: {monthly_count}/{monthly_limit})",
+        )
+
+    # 2. Weekly Limit (a quarter of the monthly allowance, weeks start Sunday)
+    weekly_limit = weekly_allowance(monthly_limit)
+    days_to_subtract = (day.weekday() + 1) % 7
+    start_of_week = day - timedelta(days=days_to_subtract)
+    end_of_week = start_of_week + timedelta(days=6)
+
+    start_of_week = start_of_week.replace(hour=0, minute=0, second=0)
+    end_of_week = end_of_week.replace(hour=23, minute=59, second=59)
+
+    weekly_count = TimeSlot.query.filter(
+        TimeSlot.server_id == server_id,  # type: ignore
+        TimeSlot.reserved_by_user_id == user_id,
+        TimeSlot.start_time >= start_of_week,  # type: ignore
+        TimeSlot.start_time <= end_of_week,  # type: ignore
+    ).count()
+    weekly_count += sum(1 for d in pending if start_of_week <= d <= end_of_week)
+
+    if weekly_count >= weekly_limit:
+        return (
+            "weekly_limit",
+            f"Weekly Limit Reached: You can only book {weekly_limit} days per week (Sun-Sat).",
+        )
+
+    return None
+
+
+def reserve(slot, user_id):
+    """
+    Gives the slot to user_id and updates the usage counters.
+    """
+    slot.reserved_by_user_id = user_id
+    record_booking(slot.server_id, user_id, slot.start_time, +1)
+    adjust_used_quota(user_id, slot.server_id, slot.start_time, +1)
+
+    # The user no longer needs to wait for this day
+    WaitlistEntry.query.filter_by(
+        user_id=user_id, server_id=slot.server_id, day=slot.start_time.date()
+    ).delete()
+
+    bump_versions(slot.server_id, user_id)
+    queue_slot_change(db.session, slot)
+
+
+def release(slot):
+    """
+    Frees the slot, then hands it to the first eligible user on the waitlist.
+    Returns the User who received the slot, or None.
+    In sparse storage the row is deleted if nobody takes it.
+    """
+    user_id = slot.reserved_by_user_id
+    slot.reserved_by_user_id = None
+    record_booking(slot.server_id, user_id, slot.start_time, -1)
+    adjust_used_quota(user_id, slot.server_id, slot.start_time, -1)
+    bump_versions(slot.server_id, user_id)
+
+    new_owner = offer_to_waitlist(slot)
+    if new_owner is None:
+        queue_slot_change(db.session, slot)
+        discard_if_empty(slot)
+    return new_owner
+
+
+def offer_to_waitlist(slot):
+    """
+    Walks the waitlist for the slot's day in arrival order and reserves the slot for
+    the first user who is still assigned to the server and within their quota.
+    Users who lost access are dropped from the list; users over quota keep their place.
+    """
+    # SKIP LOCKED: entries another transaction is removing right now are passed over
+    entries = (
+        WaitlistEntry.query.filter_by(server_id=slot.server_id, day=slot.start_time.date())
+        .order_by(WaitlistEntry.created_at.asc(), WaitlistEntry.id.asc())  # type: ignore
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+
+    for entry in entries:
+        assigned = db.session.execute(
+            db.select(user_server.c.user_id).where(
+                user_server.c.user_id == entry.user_id,
+                user_server.c.server_id == slot.server_id,
+            )
+        ).first()
+
+        if not assigned:
+            db.session.delete(entry)
+            continue
+
+        lock_quota(entry.user_id, slot.server_id)
+        if check_limits(entry.user_id, slot.server_id, slot.start_time):
+            continue
+
+        user = entry.user
+        reserve(slot, entry.user_id)
+        return user
+
+    return None
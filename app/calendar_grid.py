@@ -0,0 +1,74 @@
+from calendar import monthcalendar
+from collections import namedtuple
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+from flask import current_app
+from markupsafe import Markup
+
+MonthGrid = namedtuple(
+    "MonthGrid",
+    ["weeks", "month_name", "prev_year", "prev_month", "next_year", "next_month"],
+)
+
+
+@lru_cache(maxsize=256)
+def month_grid(year, month):
+    """
+    The static part of a month view: the week matrix and prev/next navigation.
+    Never changes for a given (year, month), so it is computed once per process.
+    """
+    current_date = datetime(year, month, 1)
+    prev_date = current_date - timedelta(days=1)
+    if month == 12:
+        next_date = datetime(year + 1, 1, 1)
+    else:
+        next_date = datetime(year, month + 1, 1)
+
+    return MonthGrid(
+        weeks=tuple(tuple(week) for week in monthcalendar(year, month)),
+        month_name=current_date.strftime("%B"),
+        prev_year=prev_date.year,
+        prev_month=prev_date.month,
+        next_year=next_date.year,
+        next_month=next_date.month,
+    )
+
+
+@lru_cache(maxsize=256)
+def _skeleton(year, month, blank_html):
+    """
+    Pre-renders the grid skeleton as a tuple of segments: static HTML strings
+    (blank padding cells) alternating with day numbers where a dynamic cell goes.
+    """
+    segments = []
+    static = []
+    for week in month_grid(year, month).weeks:
+        for day in week:
+            if day == 0:
+                static.append(blank_html)
+            else:
+                segments.append("".join(static))
+                segments.append(day)
+                static = []
+    segments.append("".join(static))
+    return tuple(segments)
+
+
+def render_grid(year, month, cell_template, blank_html, **context):
+    """
+    Renders a month grid: the cached skeleton with only the per-day cells rendered
+    from cell_template (which receives 'year', 'month', 'day' plus the given context).
+    """
+    template = current_app.jinja_env.get_template(cell_template)
+    current_app.update_template_context(context)
+    context["year"], context["month"] = year, month
+
+    parts = []
+    for segment in _skeleton(year, month, blank_html):
+        if isinstance(segment, int):
+            context["day"] = segment
+            parts.append(template.render(context))
+        else:
+            parts.append(segment)
+    return Markup("".join(parts))
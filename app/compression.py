@@ -0,0 +1,55 @@
+import gzip
+
+from flask import current_app, request
+
+from app.metrics import COMPRESSION_BYTES
+
+# gzip for dynamic responses. The big pages (admin calendar, user list) are mostly
+# repeated markup and shrink 5-10x. Only complete, buffered responses of a text type
+# above COMPRESS_MIN_SIZE are touched: streams (SSE, .ics feeds) and files (static
+# assets are precompressed at build time, see app/assets.py) pass through unchanged.
+
+
+class ResponseCompression:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not app.config.get("COMPRESS_ENABLED", True):
+            return
+        app.after_request(self._compress)
+
+    @staticmethod
+    def _compress(response):
+        config = current_app.config
+        if (
+            response.direct_passthrough
+            or response.is_streamed
+            or response.status_code < 200
+            or response.status_code in (204, 304)
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in config.get("COMPRESS_MIMETYPES", ("text/html",))
+        ):
+            return response
+
+        data = response.get_data()
+        if len(data) < config.get("COMPRESS_MIN_SIZE", 1024):
+            return response
+
+        response.vary.add("Accept-Encoding")
+        if not request.accept_encodings["gzip"]:
+            return response
+
+        compressed = gzip.compress(data, compresslevel=config.get("COMPRESS_LEVEL", 6))
+        response.set_data(compressed)
+        response.headers["Content-Encoding"] = "gzip"
+
+        # Different bytes: a strong ETag would now be wrong
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+
+        COMPRESSION_BYTES.inc("original", amount=len(data))
+        COMPRESSION_BYTES.inc("sent", amount=len(compressed))
+        return response
@@ -0,0 +1,370 @@
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from app.extensions import db
+from app.models import (
+    AuditAction, AuditLog, DeletionJob, MaintenanceWindow, ReservationVersion, Server, ServerTelemetry, SlotArchive,
+    TimeSlot, UsageRollup, User, WaitlistEntry, user_server,
+)
+
+# Deleting a server or user with years of history touches every row that points at it.
+# Instead of loading those rows through ORM cascades, a background thread removes them
+# with chunked Core statements (one short transaction per chunk) and deletes the
+# server/user row last. Progress is kept in the deletion_job table, so every worker
+# can report it. Each write doubles as a heartbeat: a job whose heartbeat goes stale
+# (its process died) is picked up again by the resume_deletions task, and a failed
+# one runs again when the admin deletes the target again. Every step only touches rows
+# that still point at the target, so running a job twice is safe. The audit entry is
+# written in the same transaction that marks the job done.
+#
+# Policy for rows that point at the deleted server or user:
+#   server - its slots (reservation history and archive included), waitlist entries,
+#            assignments, usage rollups, telemetry and maintenance windows are deleted.
+#   user   - assignments and waitlist entries are deleted first, so nothing new can be
+#            booked; future reservations are released (the waitlist gets them); past
+#            reservations are cleared (deleted in sparse storage, where an unreserved row
+#            means nothing) and removed from archived months; AuditLog.user_id is set
+#            to NULL, as is MaintenanceWindow.created_by_id; usage rollups are deleted.
+#   AuditLog.server_id / target_user_id are plain ids and keep pointing at the deleted row.
+# The ON DELETE rules on the foreign keys (app/models.py) describe the same policy.
+
+KEEP_FINISHED_JOBS = 50
+PROGRESS_INTERVAL = 1.0  # Seconds between progress writes while a step runs
+ACTIVE = ("queued", "running")
+FINISHED = ("done", "failed")
+
+
+def start_deletion(app, kind, target_id, label, requested_by_id=None):
+    """
+    Starts deleting a 'server' or 'user' in a background thread and returns its job id.
+    A live deletion of the same target is reused; a failed or abandoned one runs again.
+    """
+    job = (
+        DeletionJob.query.filter(
+            DeletionJob.kind == kind,  # type: ignore
+            DeletionJob.target_id == target_id,  # type: ignore
+            DeletionJob.state.in_(ACTIVE + ("failed",)),  # type: ignore
+        )
+        .order_by(DeletionJob.started.desc())  # type: ignore
+        .first()
+    )
+    if job is not None:
+        if job.state in ACTIVE and job.heartbeat >= _stale_cutoff(app):
+            return job.id
+        if not _claim(job.id, job.heartbeat):
+            return job.id  # Another worker took it over just now
+    else:
+        job = DeletionJob(uuid.uuid4().hex[:12], kind, target_id, label, requested_by_id)
+        db.session.add(job)
+        _prune()
+        db.session.commit()
+
+    job_id = job.id
+    _launch(app, job_id)
+    return job_id
+
+
+def resume_abandoned(app):
+    """
+    Runs again the queued/running jobs whose heartbeat went stale. Returns their ids.
+    """
+    stale = db.session.execute(
+        db.select(DeletionJob.id, DeletionJob.heartbeat).where(
+            DeletionJob.state.in_(ACTIVE),  # type: ignore
+            DeletionJob.heartbeat < _stale_cutoff(app),  # type: ignore
+        )
+    ).all()
+    resumed = []
+    for job_id, heartbeat in stale:
+        if _claim(job_id, heartbeat):
+            _launch(app, job_id)
+            resumed.append(job_id)
+    return resumed
+
+
+def get_job(job_id):
+    job = db.session.get(DeletionJob, job_id)
+    return job.to_dict() if job else None
+
+
+def list_jobs():
+    jobs = DeletionJob.query.order_by(DeletionJob.started.desc()).limit(KEEP_FINISHED_JOBS).all()  # type: ignore
+    return [job.to_dict() for job in jobs]
+
+
+def pending_targets(kind):
+    """
+    Ids of the servers/users whose deletion is still running (the list pages mark them).
+    """
+    return set(
+        db.session.execute(
+            db.select(DeletionJob.target_id).where(DeletionJob.kind == kind, DeletionJob.state.in_(ACTIVE))  # type: ignore
+        ).scalars()
+    )
+
+
+def _stale_cutoff(app):
+    return datetime.now() - timedelta(seconds=app.config.get("DELETE_JOB_STALE_SECONDS", 120))
+
+
+def _claim(job_id, heartbeat):
+    """
+    Takes over a failed or abandoned job. The UPDATE only matches the heartbeat that
+    was read, so when several workers try at once exactly one of them wins.
+    """
+    table = DeletionJob.__table__
+    result = db.session.execute(
+        table.update()
+        .where(table.c.id == job_id, table.c.heartbeat == heartbeat)
+        .values(state="queued", heartbeat=datetime.now(), finished=None, seconds=None, error=None)
+    )
+    db.session.commit()
+    return result.rowcount == 1
+
+
+def _prune():
+    # Drops the oldest finished jobs; the caller commits
+    table = DeletionJob.__table__
+    keep = (
+        db.select(table.c.id)
+        .where(table.c.state.in_(FINISHED))
+        .order_by(table.c.started.desc())
+        .limit(KEEP_FINISHED_JOBS)
+    )
+    db.session.execute(table.delete().where(table.c.state.in_(FINISHED), table.c.id.not_in(keep.scalar_subquery())))
+
+
+def _launch(app, job_id):
+    thread = threading.Thread(target=_run, args=(app, job_id), name=f"delete-{job_id}", daemon=True)
+    thread.start()
+
+
+def _run(app, job_id):
+    started = time.perf_counter()
+    with app.app_context():
+        row = db.session.get(DeletionJob, job_id)
+        job = {
+            "id": row.id,
+            "kind": row.kind,
+            "target_id": row.target_id,
+            "label": row.label,
+            "requested_by_id": row.requested_by_id,
+            "step": row.step,
+            "rows": dict(row.rows or {}),  # A resumed job keeps counting
+            "saved": 0.0,
+        }
+        chunk_size = app.config.get("DELETE_CHUNK_SIZE", 5000)
+        try:
+            _save(job, state="running")
+            if job["kind"] == "server":
+                delete_server_rows(job["target_id"], chunk_size, job)
+            else:
+                delete_user_rows(job["target_id"], chunk_size, job)
+            _finish(job, time.perf_counter() - started)
+        except Exception as e:
+            db.session.rollback()
+            job["step"] = None
+            _save(job, state="failed", error=str(e), finished=datetime.now(), seconds=round(time.perf_counter() - started, 2))
+            print(f"Error deleting {job['kind']} {job['target_id']}: {e}")
+        finally:
+            db.session.remove()
+
+        from app.quota import invalidate_allowances
+
+        invalidate_allowances()
+
+
+def _save(job, commit=True, **values):
+    """
+    Writes the job's step and row counts (plus any other columns given) and a fresh heartbeat.
+    """
+    table = DeletionJob.__table__
+    db.session.execute(
+        table.update()
+        .where(table.c.id == job["id"])
+        .values(step=job["step"], rows=dict(job["rows"]), heartbeat=datetime.now(), **values)
+    )
+    if commit:
+        db.session.commit()
+    job["saved"] = time.monotonic()
+
+
+def _finish(job, seconds):
+    """
+    Marks the job done and writes its audit entry in one commit, so a deletion that
+    finished is logged exactly once (if the commit fails, the job runs again later).
+    """
+    from app.utils import log_action
+
+    job["step"] = None
+    _save(job, commit=False, state="done", finished=datetime.now(), seconds=round(seconds, 2))
+
+    # The admin who asked may be gone by now
+    admin_id = job["requested_by_id"]
+    if admin_id is not None and db.session.get(User, admin_id) is None:
+        admin_id = None
+    if job["kind"] == "server":
+        log_action(
+            admin_id,
+            AuditAction.DELETE_SERVER,
+            f"Deleted server {job['label']} (ID: {job['target_id']})",
+            server_id=job["target_id"],
+        )
+    else:
+        log_action(
+            admin_id,
+            AuditAction.DELETE_USER,
+            f"Deleted user {job['label']} (ID: {job['target_id']})",
+            target_user_id=job["target_id"],
+        )
+    db.session.commit()
+
+
+def _progress(job, step, table=None, rows=0):
+    # Called between transactions; a write at most every PROGRESS_INTERVAL keeps the heartbeat fresh
+    if job is None:
+        return
+    job["step"] = step
+    if table is not None:
+        job["rows"][table] = job["rows"].get(table, 0) + rows
+    if time.monotonic() - job["saved"] >= PROGRESS_INTERVAL:
+        _save(job)
+
+
+# --- Chunked statements ---
+
+
+def _delete_chunked(table, condition, chunk_size, job, step):
+    """
+    DELETEs the rows matching condition, chunk_size ids per transaction.
+    """
+    total = 0
+    while True:
+        ids = db.select(table.c.id).where(condition).limit(chunk_size).scalar_subquery()
+        result = db.session.execute(table.delete().where(table.c.id.in_(ids)))
+        db.session.commit()
+        total += result.rowcount
+        _progress(job, step, table.name, result.rowcount)
+        if result.rowcount < chunk_size:
+            return total
+
+
+def _update_chunked(table, condition, values, chunk_size, job, step):
+    """
+    UPDATEs the rows matching condition, chunk_size ids per transaction.
+    'values' must make a row stop matching condition, or this never ends.
+    """
+    total = 0
+    while True:
+        ids = db.select(table.c.id).where(condition).limit(chunk_size).scalar_subquery()
+        result = db.session.execute(table.update().where(table.c.id.in_(ids)).values(**values))
+        db.session.commit()
+        total += result.rowcount
+        _progress(job, step, table.name, result.rowcount)
+        if result.rowcount < chunk_size:
+            return total
+
+
+def _delete_all(table, condition, job, step):
+    # Small tables keyed by (user, server): one statement is enough
+    result = db.session.execute(table.delete().where(condition))
+    db.session.commit()
+    _progress(job, step, table.name, result.rowcount)
+
+
+# --- Deletions ---
+
+
+def delete_server_rows(server_id, chunk_size=5000, job=None):
+    """
+    Deletes a server and everything that references it (see the policy above).
+    """
+    slots = TimeSlot.__table__
+    waitlist = WaitlistEntry.__table__
+
+    # 1. Access first, so no new bookings arrive while the history is being removed
+    _delete_all(user_server, user_server.c.server_id == server_id, job, "assignments")
+    _delete_chunked(waitlist, waitlist.c.server_id == server_id, chunk_size, job, "waitlist")
+
+    # 2. History
+    _delete_all(UsageRollup.__table__, UsageRollup.__table__.c.server_id == server_id, job, "rollups")
+    _delete_chunked(slots, slots.c.server_id == server_id, chunk_size, job, "slots")
+    _delete_all(SlotArchive.__table__, SlotArchive.__table__.c.server_id == server_id, job, "archive")
+    _delete_all(ServerTelemetry.__table__, ServerTelemetry.__table__.c.server_id == server_id, job, "telemetry")
+    windows = MaintenanceWindow.__table__
+    _delete_all(windows, windows.c.server_id == server_id, job, "maintenance")
+
+    versions = ReservationVersion.__table__
+    _delete_all(versions, (versions.c.scope == "server") & (versions.c.key == server_id), job, "versions")
+
+    # 3. The server itself
+    result = db.session.execute(Server.__table__.delete().where(Server.__table__.c.id == server_id))
+    db.session.commit()
+    _progress(job, "server", "server", result.rowcount)
+
+
+def delete_user_rows(user_id, chunk_size=5000, job=None):
+    """
+    Deletes a user, releases their future reservations and detaches their history
+    (see the policy above).
+    """
+    from app.archive import forget_user
+    from app.bookings import release
+    from app.feeds import bump_version
+    from app.slots import sparse_storage
+    from app.utils import log_action
+
+    slots = TimeSlot.__table__
+    logs = AuditLog.__table__
+    waitlist = WaitlistEntry.__table__
+
+    # 1. Access and waiting list, so the user can't book or be handed a slot any more
+    _delete_all(user_server, user_server.c.user_id == user_id, job, "assignments")
+    _delete_chunked(waitlist, waitlist.c.user_id == user_id, chunk_size, job, "waitlist")
+
+    # 2. Future reservations go back to the pool: a handful of rows (booking horizon),
+    #    released one at a time so waitlisted users and live calendars see them
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    upcoming = TimeSlot.query.filter(
+        TimeSlot.reserved_by_user_id == user_id,
+        TimeSlot.start_time >= today,  # type: ignore
+    ).with_for_update().all()
+    for slot in upcoming:
+        new_owner = release(slot)
+        if new_owner:
+            log_action(
+                new_owner.id,
+                AuditAction.WAITLIST_ASSIGN,
+                f"Waitlist: {new_owner.username} received {slot.server.name} for {slot.start_time:%Y-%m-%d}",
+                slot=slot,
+            )
+    db.session.commit()
+    _progress(job, "future reservations", "time_slot", len(upcoming))
+
+    # 3. Past reservations and the user's audit trail
+    past = slots.c.reserved_by_user_id == user_id
+    touched_servers = db.session.execute(db.select(slots.c.server_id).where(past).distinct()).scalars().all()
+    if sparse_storage():
+        _delete_chunked(slots, past, chunk_size, job, "past reservations")
+    else:
+        _update_chunked(slots, past, {"reserved_by_user_id": None}, chunk_size, job, "past reservations")
+    _update_chunked(logs, logs.c.user_id == user_id, {"user_id": None}, chunk_size, job, "audit log")
+    windows = MaintenanceWindow.__table__
+    result = db.session.execute(windows.update().where(windows.c.created_by_id == user_id).values(created_by_id=None))
+    db.session.commit()
+    _progress(job, "maintenance", windows.name, result.rowcount)
+    _progress(job, "archive", "slot_archive", forget_user(user_id))
+    _delete_all(UsageRollup.__table__, UsageRollup.__table__.c.user_id == user_id, job, "rollups")
+
+    # Server feeds listed those reservations
+    for server_id in touched_servers:
+        bump_version("server", server_id)
+    versions = ReservationVersion.__table__
+    _delete_all(versions, (versions.c.scope == "user") & (versions.c.key == user_id), job, "versions")
+
+    # 4. The user itself
+    result = db.session.execute(User.__table__.delete().where(User.__table__.c.id == user_id))
+    db.session.commit()
+    _progress(job, "user", "user", result.rowcount)
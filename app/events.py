@@ -0,0 +1,188 @@
+import asyncio
+import json
+import queue
+import threading
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# In-process pub/sub for live calendar updates (Server-Sent Events).
+# Booking code queues slot changes on the DB session; they are published only
+# after the transaction commits, so browsers never see a change that rolled back.
+
+
+class Subscription:
+    """
+    One connected browser. Holds a bounded buffer of pending events:
+    when a slow client falls behind, the oldest events are dropped.
+    """
+
+    def __init__(self, topic, maxsize):
+        self.topic = topic
+        self.queue = queue.Queue(maxsize=maxsize)
+
+    def put(self, message):
+        while True:
+            try:
+                self.queue.put_nowait(message)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout):
+        return self.queue.get(timeout=timeout)
+
+
+class AsyncSubscription(Subscription):
+    """
+    A browser connected to an async view (ASGI mode). Events are published from worker
+    threads, so they are handed to the subscriber's event loop instead of a thread queue.
+    """
+
+    def __init__(self, topic, maxsize, loop):
+        self.topic = topic
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def put(self, message):
+        try:
+            self.loop.call_soon_threadsafe(self._put, message)
+        except RuntimeError:
+            pass  # Loop already closed (server shutting down)
+
+    def _put(self, message):
+        # Runs on the event loop
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+
+class EventBroker:
+    def __init__(self, app=None):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self.buffer_size = 32
+        self.heartbeat = 15
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.buffer_size = app.config.get("SSE_CLIENT_BUFFER", 32)
+        self.heartbeat = app.config.get("SSE_HEARTBEAT", 15)
+
+    def subscribe(self, topic):
+        sub = Subscription(topic, self.buffer_size)
+        with self._lock:
+            self._subscribers.setdefault(topic, set()).add(sub)
+        return sub
+
+    def subscribe_async(self, topic):
+        """
+        Like subscribe(), for a coroutine running on the current event loop.
+        """
+        sub = AsyncSubscription(topic, self.buffer_size, asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.setdefault(topic, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            subs = self._subscribers.get(sub.topic)
+            if subs:
+                subs.discard(sub)
+                if not subs:
+                    del self._subscribers[sub.topic]
+
+    def publish(self, topic, message):
+        with self._lock:
+            subs = list(self._subscribers.get(topic, ()))
+        for sub in subs:
+            sub.put(message)
+
+    def client_count(self):
+        with self._lock:
+            return sum(len(subs) for subs in self._subscribers.values())
+
+    def stream(self, sub):
+        """
+        Generator of SSE frames for one client. Sends a comment line as a heartbeat
+        so proxies keep the connection open, and unsubscribes when the client leaves.
+        """
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    message = sub.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    yield ": heartbeat\n\n"
+                    continue
+                yield f"event: slot\ndata: {message}\n\n"
+        finally:
+            self.unsubscribe(sub)
+
+
+# --- Topics ---
+
+
+def server_topic(server_id, year, month):
+    return ("server", server_id, year, month)
+
+
+def month_topic(year, month):
+    return ("month", year, month)
+
+
+# --- Publishing slot changes after commit ---
+
+
+def queue_slot_change(session, slot):
+    """
+    Remembers that a slot changed; it is published when the session commits.
+    """
+    queue_day_change(session, slot.server_id, slot.start_time, slot.reserved_by_user_id is not None, slot.id)
+
+
+def queue_day_change(session, server_id, day, reserved, slot_id=None):
+    """
+    Same for a server-day changed by a set-based statement (no loaded slot; slot_id
+    may be None, e.g. a free day that was blocked).
+    """
+    session.info.setdefault("slot_changes", []).append(
+        {
+            "slot_id": slot_id,
+            "server_id": server_id,
+            "year": day.year,
+            "month": day.month,
+            "day": day.day,
+            "reserved": reserved,
+        }
+    )
+
+
+_broker = None
+
+
+def _publish(session):
+    for change in session.info.pop("slot_changes", []):
+        message = json.dumps(change)
+        _broker.publish(server_topic(change["server_id"], change["year"], change["month"]), message)  # type: ignore
+        _broker.publish(month_topic(change["year"], change["month"]), message)  # type: ignore
+
+
+def _discard(session, previous_transaction):
+    session.info.pop("slot_changes", None)
+
+
+def register_publisher(broker):
+    """
+    Hooks the broker into SQLAlchemy session commit/rollback events (once per process).
+    """
+    global _broker
+    _broker = broker
+
+    if not event.contains(Session, "after_commit", _publish):
+        event.listen(Session, "after_commit", _publish)
+        event.listen(Session, "after_soft_rollback", _discard)
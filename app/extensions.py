@@ -1,14 +1,120 @@
+import time
+import sqlalchemy as sa
+from flask import current_app, has_request_context, request, session as browser_session
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
 from flask_login import LoginManager
 from flask_migrate import Migrate
-from flask_apscheduler import APScheduler
+from app.ratelimit import LoginRateLimiter
+from app.events import EventBroker
+from app.audit import AuditSink
+from app.metrics import Metrics
+from app.profiler import RequestProfiler
+from app.assets import StaticAssets
+from app.compression import ResponseCompression
+
+# Bind key of the read replica in SQLALCHEMY_BINDS
+REPLICA_BIND = 'replica'
+
+
+class RoutingSession(Session):
+    """
+    Read/write routing: plain SELECTs made while serving GET/HEAD requests go to the
+    read replica (if one is configured), everything else goes to the primary.
+    Read-your-writes: once this session has written, and for REPLICA_STICKY_SECONDS
+    after that browser's last write, its reads stay on the primary as well.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._reads_from_replica(clause):
+            return self._db.engines[REPLICA_BIND]
+
+        # Flushes (no clause), INSERT/UPDATE/DELETE, raw SQL and SELECT ... FOR UPDATE
+        if bind is None and not _is_plain_select(clause):
+            self._mark_write()
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _reads_from_replica(self, clause):
+        if self.info.get('wrote') or not _is_plain_select(clause):
+            return False
+        if not has_request_context() or request.method not in ('GET', 'HEAD'):
+            return False  # Background jobs, CLI and the reads of a write request
+        if REPLICA_BIND not in self._db.engines:
+            return False
+        return browser_session.get('_primary_until', 0) < time.time()
+
+    def _mark_write(self):
+        self.info['wrote'] = True
+        if has_request_context() and REPLICA_BIND in self._db.engines:
+            browser_session['_primary_until'] = time.time() + current_app.config['REPLICA_STICKY_SECONDS']
+
+
+def _is_plain_select(clause):
+    return isinstance(clause, sa.Select) and clause._for_update_arg is None
+
 
 # Initialize extensions (unbound)
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 migrate = Migrate()
-scheduler = APScheduler()
+login_limiter = LoginRateLimiter()
+event_broker = EventBroker()
+audit_sink = AuditSink()
+metrics = Metrics()
+request_profiler = RequestProfiler()
+static_assets = StaticAssets()
+response_compression = ResponseCompression()
 
 # Setup Login Manager
 login_manager = LoginManager()
 login_manager.login_view = 'auth.login' # type: ignore
-login_manager.login_message_category = 'info'
\ No newline at end of file
+login_manager.login_message_category = 'info'
+
+
+def configure_read_replica(app):
+    """
+    Adds the read replica bind used by RoutingSession (call before db.init_app).
+    REPLICA_DATABASE_URL points at a real replica; without it a SQLite primary gets
+    a separate read-only connection pool to the same file.
+    """
+    if not app.config.get('DB_READ_ROUTING'):
+        return
+
+    url = app.config.get('REPLICA_DATABASE_URL')
+    primary = app.config['SQLALCHEMY_DATABASE_URI']
+    if not url:
+        path = primary[len('sqlite:///'):] if primary.startswith('sqlite:///') else ''
+        if not path or path == ':memory:':
+            print("Read routing disabled: set REPLICA_DATABASE_URL to use a replica with this database.")
+            return
+        url = f'sqlite:///file:{path}?mode=ro&uri=true'
+
+    app.config['SQLALCHEMY_BINDS'] = {**(app.config.get('SQLALCHEMY_BINDS') or {}), REPLICA_BIND: url}
+
+
+def enable_sqlite_wal(app):
+    """
+    SQLite readers would otherwise block writers at commit: switch the primary to
+    WAL so the read-only connections and the booking writes run side by side.
+    """
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name != 'sqlite' or REPLICA_BIND not in (app.config.get('SQLALCHEMY_BINDS') or {}):
+        return
+
+    @sa.event.listens_for(engine, 'connect')
+    def _set_wal(dbapi_connection, connection_record):
+        dbapi_connection.execute('PRAGMA journal_mode=WAL')
+
+
+# Background scheduler: created on first use, so apps started without
+# background services (tests, benchmarks, CLI) never import APScheduler
+_scheduler = None
+
+
+def get_scheduler():
+    global _scheduler
+    if _scheduler is None:
+        from flask_apscheduler import APScheduler
+
+        _scheduler = APScheduler()
+    return _scheduler
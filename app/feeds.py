@@ -0,0 +1,165 @@
+from datetime import datetime, timedelta
+
+from flask import current_app
+from itsdangerous import BadSignature, URLSafeSerializer
+
+from app.extensions import db
+from app.models import ReservationVersion, Server, TimeSlot, User
+
+# Subscribable iCalendar feeds: "my reservations" (scope 'user') and "this server's
+# bookings" (scope 'server'). Calendar clients can't log in, so the feed URL carries
+# a signed token instead. Clients poll every few minutes; the ETag is the scope's
+# ReservationVersion, so an unchanged feed costs one primary-key read and a 304.
+
+
+# --- Versions ---
+
+
+def bump_version(scope, key):
+    """
+    Increments the change counter for a server or user. Does NOT commit.
+    """
+    table = ReservationVersion.__table__
+    result = db.session.execute(
+        table.update()
+        .where(table.c.scope == scope, table.c.key == key)
+        .values(version=table.c.version + 1)
+    )
+    if result.rowcount == 0:  # type: ignore
+        db.session.add(ReservationVersion(scope, key, 1))
+
+
+def bump_versions(server_id, user_id):
+    """
+    A slot of server_id changed hands to or from user_id.
+    """
+    bump_version("server", server_id)
+    if user_id is not None:
+        bump_version("user", user_id)
+
+
+def bump_renamed(scope, key):
+    """
+    A server or user was renamed: its own feed changes, and so do the feeds on the
+    other side that show the name in their events. Does NOT commit.
+    """
+    slots = TimeSlot.__table__
+    if scope == "server":
+        others = db.select(slots.c.reserved_by_user_id).where(
+            slots.c.server_id == key, slots.c.reserved_by_user_id.isnot(None)
+        )
+        other_scope = "user"
+    else:
+        others = db.select(slots.c.server_id).where(slots.c.reserved_by_user_id == key)
+        other_scope = "server"
+
+    bump_version(scope, key)
+    for other in db.session.execute(others.where(slots.c.start_time >= feed_window_start()).distinct()).scalars():
+        bump_version(other_scope, other)
+
+
+def get_version(scope, key):
+    table = ReservationVersion.__table__
+    version = db.session.execute(
+        db.select(table.c.version).where(table.c.scope == scope, table.c.key == key)
+    ).scalar()
+    return version or 0
+
+
+# --- Tokens ---
+
+
+def _serializer():
+    return URLSafeSerializer(current_app.config["SECRET_KEY"], salt="ics-feed")
+
+
+def feed_token(user_id, server_id=None):
+    """
+    Token for the user's own feed, or (with server_id) for a server's feed as seen by
+    that user. Changing SECRET_KEY revokes every token.
+    """
+    payload = {"u": user_id}
+    if server_id is not None:
+        payload["s"] = server_id
+    return _serializer().dumps(payload)
+
+
+def read_token(token):
+    """
+    (user_id, server_id or None), or None if the token is not valid.
+    """
+    try:
+        payload = _serializer().loads(token)
+    except BadSignature:
+        return None
+    return payload.get("u"), payload.get("s")
+
+
+# --- Rendering ---
+
+
+def _escape(text):
+    return (
+        str(text).replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+    )
+
+
+def feed_window_start(today=None):
+    today = today or datetime.now().date()
+    past_days = current_app.config.get("ICS_FEED_PAST_DAYS", 90)
+    start = today - timedelta(days=past_days)
+    return datetime(start.year, start.month, start.day)
+
+
+def feed_rows(user_id=None, server_id=None, since=None):
+    """
+    Core query for the feed: (slot id, day, title) tuples, no ORM objects.
+    """
+    if server_id is None:
+        stmt = (
+            db.select(TimeSlot.id, TimeSlot.start_time, Server.name)
+            .join(Server, Server.id == TimeSlot.server_id)
+            .where(TimeSlot.reserved_by_user_id == user_id)
+        )
+    else:
+        stmt = (
+            db.select(TimeSlot.id, TimeSlot.start_time, User.username)
+            .join(User, User.id == TimeSlot.reserved_by_user_id)
+            .where(TimeSlot.server_id == server_id)
+        )
+    stmt = stmt.where(TimeSlot.start_time >= since).order_by(TimeSlot.start_time)  # type: ignore
+    return db.session.execute(stmt.execution_options(yield_per=500))
+
+
+def render_ics(rows, calendar_name, title_format, host):
+    """
+    Yields the calendar in pieces: the header, then all-day VEVENTs 200 at a time.
+    """
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+    yield (
+        "BEGIN:VCALENDAR\r\n"
+        "VERSION:2.0\r\n"
+        "PRODID:-//Research Center Dashboard//Reservations//EN\r\n"
+        "CALSCALE:GREGORIAN\r\n"
+        f"X-WR-CALNAME:{_escape(calendar_name)}\r\n"
+    )
+
+    chunk = []
+    for slot_id, start_time, name in rows:
+        day = start_time.date()
+        chunk.append(
+            "BEGIN:VEVENT\r\n"
+            f"UID:slot-{slot_id}-{day:%Y%m%d}@{host}\r\n"
+            f"DTSTAMP:{stamp}\r\n"
+            f"DTSTART;VALUE=DATE:{day:%Y%m%d}\r\n"
+            f"DTEND;VALUE=DATE:{day + timedelta(days=1):%Y%m%d}\r\n"
+            f"SUMMARY:{_escape(title_format.format(name=name))}\r\n"
+            "TRANSP:OPAQUE\r\n"
+            "END:VEVENT\r\n"
+        )
+        if len(chunk) >= 200:
+            yield "".join(chunk)
+            chunk = []
+
+    chunk.append("END:VCALENDAR\r\n")
+    yield "".join(chunk)
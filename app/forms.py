@@ -7,8 +7,11 @@ from wtforms import (
     IntegerField,
     FloatField,
     BooleanField,
+    DateField,
+    SelectMultipleField,
 )
-from wtforms.validators import DataRequired, Email, Length, EqualTo, ValidationError
+from wtforms.validators import DataRequired, Email, Length, EqualTo, Optional, ValidationError
+from datetime import date
 from app.models import User
 
 # --- Authentication Forms ---
@@ -117,3 +120,22 @@ class ServerForm(FlaskForm):
     gpu_model = StringField("GPU Model")
 
     submit = SubmitField("Save Server")
+
+
+class MaintenanceForm(FlaskForm):
+    # Choices (the servers) are filled in by the view
+    servers = SelectMultipleField("Servers", coerce=int, validators=[DataRequired()])
+    start_day = DateField("First Day", validators=[DataRequired()])
+    end_day = DateField("Last Day", validators=[DataRequired()])
+    reason = StringField("Reason", validators=[Optional(), Length(max=200)])
+    relocate = BooleanField("Move affected reservations to another free server when possible")
+
+    submit = SubmitField("Block Days")
+
+    def validate_start_day(self, field):
+        if field.data < date.today():
+            raise ValidationError("Maintenance can't start in the past.")
+
+    def validate_end_day(self, field):
+        if self.start_day.data and field.data < self.start_day.data:
+            raise ValidationError("The last day must not be before the first day.")
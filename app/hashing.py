@@ -0,0 +1,124 @@
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from flask import current_app
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+from app.metrics import PASSWORD_HASH_DURATION
+
+# Process pool used for CPU-bound hashing (created lazily, one per worker process)
+_executor = None
+_executor_lock = threading.Lock()
+_slots = None
+
+# Simple latency counters, keyed by operation ("hash" / "verify"); the distribution
+# goes to the password_hash_duration_seconds histogram on /metrics
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def _get_executor():
+    """
+    Returns the shared process pool, creating it on first use.
+    Returns None when PASSWORD_HASH_WORKERS is 0 (hash inline instead).
+    """
+    global _executor, _slots
+
+    workers = current_app.config.get("PASSWORD_HASH_WORKERS", 0)
+    if workers <= 0:
+        return None
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=workers)
+            # Bound the queue: at most QUEUE_SIZE jobs waiting or running at once
+            queue_size = current_app.config.get("PASSWORD_HASH_QUEUE_SIZE", workers * 4)
+            _slots = threading.BoundedSemaphore(queue_size)
+    return _executor
+
+
+def _run(operation, func, *args):
+    """
+    Runs func(*args) on the process pool (or inline) and records its latency.
+    """
+    started = time.perf_counter()
+    executor = _get_executor()
+
+    if executor is None:
+        result = func(*args)
+    else:
+        timeout = current_app.config.get("PASSWORD_HASH_TIMEOUT", 10)
+        # Wait for a free slot so a login burst can't queue unbounded work
+        if not _slots.acquire(timeout=timeout):  # type: ignore
+            raise TimeoutError("Password hashing queue is full.")
+        try:
+            result = executor.submit(func, *args).result(timeout=timeout)
+        finally:
+            _slots.release()  # type: ignore
+
+    _record(operation, time.perf_counter() - started)
+    return result
+
+
+def _record(operation, seconds):
+    PASSWORD_HASH_DURATION.observe(seconds, operation)
+    with _stats_lock:
+        entry = _stats.setdefault(operation, {"count": 0, "total": 0.0, "max": 0.0})
+        entry["count"] += 1
+        entry["total"] += seconds
+        entry["max"] = max(entry["max"], seconds)
+
+
+def hash_password(password):
+    """
+    Hashes a password with the method configured in PASSWORD_HASH_METHOD.
+    """
+    method = current_app.config["PASSWORD_HASH_METHOD"]
+    return _run("hash", generate_password_hash, password or "", method)
+
+
+def verify_password(pwhash, password):
+    """
+    Checks a password against a stored hash. Returns True if it matches.
+    """
+    return _run("verify", check_password_hash, pwhash, password or "")
+
+
+def _canonical_method(method):
+    """
+    Spells out the defaults Werkzeug fills in, so 'pbkdf2:sha256' compares equal
+    to the 'pbkdf2:sha256:1000000' prefix it actually stores.
+    """
+    name, *args = method.split(":")
+    if name == "scrypt" and not args:
+        args = ["32768", "8", "1"]
+    elif name == "pbkdf2":
+        args = (args or ["sha256"])[:2]
+        if len(args) == 1:
+            args.append(str(DEFAULT_PBKDF2_ITERATIONS))
+    return ":".join([name, *args])
+
+
+def needs_rehash(pwhash):
+    """
+    True if the stored hash was made with a different method/cost than the current policy.
+    Werkzeug hashes look like 'scrypt:32768:8:1$salt$hash'.
+    """
+    method = current_app.config["PASSWORD_HASH_METHOD"]
+    return _canonical_method(pwhash.split("$", 1)[0]) != _canonical_method(method)
+
+
+def get_hash_stats():
+    """
+    Returns a snapshot of hashing latency: count, average and max seconds per operation.
+    """
+    with _stats_lock:
+        return {
+            op: {
+                "count": entry["count"],
+                "avg_seconds": entry["total"] / entry["count"] if entry["count"] else 0.0,
+                "max_seconds": entry["max"],
+            }
+            for op, entry in _stats.items()
+        }
@@ -0,0 +1,410 @@
+from calendar import monthrange
+from collections import Counter
+from datetime import date, timedelta
+
+from flask import current_app
+from sqlalchemy import bindparam, insert, select
+from sqlalchemy.orm import joinedload
+
+from app.extensions import audit_sink, db
+from app.models import AuditAction, AuditLog, MaintenanceWindow, Server, TimeSlot, User, WaitlistEntry, user_server
+from app.analytics import record_bookings
+from app.bookings import check_limits, lock_quota, lock_server_days
+from app.events import queue_day_change
+from app.feeds import bump_version
+from app.quota import adjust_used_quotas
+from app.slots import day_start, sparse_storage
+
+# Maintenance windows: days on which a server can't be booked. Starting windows on any
+# number of servers is one transaction of set-based statements, instead of one
+# force-cancel (and one audit commit) per reservation:
+#   1. the window rows are inserted, with bookings on those servers held off;
+#   2. the reservations on the blocked days are locked and read with one SELECT;
+#   3. with relocate, each is moved to the same day on another server its owner is
+#      assigned to, if one is free (planned in memory from 4 queries) and the move
+#      stays within the owner's limits there (check_limits, as a booking would);
+#   4. one UPDATE (dense) / DELETE (sparse) clears the blocked days, the moves are one
+#      executemany, each counter table gets one statement, the waitlist for the days goes;
+#   5. the audit entries for all of it are written with a single multi-row INSERT.
+# Cancelled days are not offered to the waitlist: nobody can have them. book_slot
+# refuses blocked days and the calendars show them (blocked_days, blocked_servers).
+
+
+def _month_range(year, month):
+    return date(year, month, 1), date(year, month, monthrange(year, month)[1])
+
+
+def _overlaps(table, first, last):
+    return (table.c.start_day <= last) & (table.c.end_day >= first)
+
+
+# --- Reading ---
+
+
+def windows_query(server_id, year, month):
+    """
+    (start_day, end_day) of the server's windows that touch the month. Plain Core, so
+    the async availability view (app/asgi.py) runs it too.
+    """
+    table = MaintenanceWindow.__table__
+    first, last = _month_range(year, month)
+    return select(table.c.start_day, table.c.end_day).where(table.c.server_id == server_id, _overlaps(table, first, last))
+
+
+def month_days(windows, year, month):
+    """
+    Days of the month inside any of the (start_day, end_day) windows.
+    """
+    first, last = _month_range(year, month)
+    days = set()
+    for start_day, end_day in windows:
+        start, end = max(start_day, first), min(end_day, last)
+        if start <= end:
+            days.update(range(start.day, end.day + 1))
+    return days
+
+
+def blocked_days(server_id, year, month):
+    return month_days(db.session.execute(windows_query(server_id, year, month)).all(), year, month)
+
+
+def is_blocked(server_id, day):
+    table = MaintenanceWindow.__table__
+    return db.session.execute(
+        select(table.c.id).where(table.c.server_id == server_id, _overlaps(table, day, day)).limit(1)
+    ).first() is not None
+
+
+def blocked_servers(year, month):
+    """
+    {day: [server name, ...]} for the admin calendar, from one query.
+    """
+    table = MaintenanceWindow.__table__
+    first, last = _month_range(year, month)
+    rows = db.session.execute(
+        select(table.c.start_day, table.c.end_day, Server.name)
+        .join(Server, Server.id == table.c.server_id)
+        .where(_overlaps(table, first, last))
+        .order_by(Server.name)
+    ).all()
+
+    by_day = {}
+    for start_day, end_day, name in rows:
+        for day in month_days([(start_day, end_day)], year, month):
+            names = by_day.setdefault(day, [])
+            if name not in names:
+                names.append(name)
+    return by_day
+
+
+def current_windows():
+    """
+    Windows that have not ended yet, soonest first.
+    """
+    return (
+        MaintenanceWindow.query.options(joinedload(MaintenanceWindow.server), joinedload(MaintenanceWindow.created_by))
+        .filter(MaintenanceWindow.end_day >= date.today())  # type: ignore
+        .order_by(MaintenanceWindow.start_day.asc(), MaintenanceWindow.server_id.asc())  # type: ignore
+        .all()
+    )
+
+
+# --- Starting and ending ---
+
+
+def _visible_days(start_day, end_day):
+    """
+    The days of a window that open calendars can show as bookable (today up to the
+    booking horizon): the ones whose cells must be redrawn when it starts or ends.
+    """
+    today = date.today()
+    last = min(end_day, today + timedelta(days=current_app.config.get("SLOT_BOOKING_HORIZON_DAYS", 30)))
+    day = max(start_day, today)
+    while day <= last:
+        yield day
+        day += timedelta(days=1)
+
+
+def _write_audit(entries):
+    """
+    Inserts the audit rows (dicts with the same keys) with one statement and returns
+    their events, to be emitted to the JSONL stream after the commit (as log_action does).
+    Details are cut to the column's length: names can make them longer, and one
+    oversized row would fail the whole INSERT on PostgreSQL.
+    """
+    if not entries:
+        return []
+    limit = AuditLog.__table__.c.details.type.length
+    for entry in entries:
+        if entry["details"]:
+            entry["details"] = entry["details"][:limit]
+    logs = db.session.scalars(insert(AuditLog).returning(AuditLog, sort_by_parameter_order=True), entries).all()
+    return [log.to_event() for log in logs]
+
+
+def _plan_relocations(reservations, blocked_ids):
+    """
+    Picks a new home for each reservation: the same day on another server its owner is
+    assigned to, free and not blocked itself, where the owner's monthly and weekly
+    limits allow one more day (counting the moves planned before it); servers with
+    the same GPU model first. Greedy in day order. Returns {slot id: (server id, free slot id)}; the slot id is
+    None in sparse storage, where the row still has to be inserted.
+    """
+    if not reservations:
+        return {}
+    slots = TimeSlot.__table__
+    windows = MaintenanceWindow.__table__
+    first = min(r.start_time for r in reservations)
+    after = max(r.start_time for r in reservations) + timedelta(days=1)
+
+    options = {}
+    for user_id, server_id in db.session.execute(
+        select(user_server.c.user_id, user_server.c.server_id).where(
+            user_server.c.user_id.in_({r.reserved_by_user_id for r in reservations}),
+            user_server.c.server_id.notin_(blocked_ids),
+        )
+    ):
+        options.setdefault(user_id, []).append(server_id)
+    target_ids = {server_id for server_ids in options.values() for server_id in server_ids}
+    if not target_ids:
+        return {}
+
+    gpu_models = dict(db.session.execute(select(Server.id, Server.gpu_model).where(Server.id.in_(target_ids | set(blocked_ids)))).all())
+
+    # Rows on the candidate servers: taken days, and free rows to move into (dense storage)
+    taken, free_rows = set(), {}
+    for slot_id, server_id, start_time, owner_id in db.session.execute(
+        select(slots.c.id, slots.c.server_id, slots.c.start_time, slots.c.reserved_by_user_id)
+        .where(slots.c.server_id.in_(target_ids), slots.c.start_time >= first, slots.c.start_time < after)
+        .with_for_update()
+    ):
+        if owner_id is None:
+            free_rows[(server_id, start_time)] = slot_id
+        else:
+            taken.add((server_id, start_time))
+
+    last = (after - timedelta(days=1)).date()
+    for server_id, start_day, end_day in db.session.execute(
+        select(windows.c.server_id, windows.c.start_day, windows.c.end_day).where(
+            windows.c.server_id.in_(target_ids), _overlaps(windows, first.date(), last)
+        )
+    ):
+        day = max(start_day, first.date())
+        while day <= min(end_day, last):
+            taken.add((server_id, day_start(day)))
+            day += timedelta(days=1)
+
+    # Sparse storage: any day up to the booking horizon can get a row
+    horizon = day_start(date.today() + timedelta(days=current_app.config.get("SLOT_BOOKING_HORIZON_DAYS", 30)))
+    sparse = sparse_storage()
+
+    plan, planned_days = {}, {}
+    for reservation in sorted(reservations, key=lambda r: (r.start_time, r.id)):
+        owner = reservation.reserved_by_user_id
+        model = gpu_models.get(reservation.server_id)
+        candidates = sorted(options.get(owner, ()), key=lambda s: (gpu_models.get(s) != model, s))
+        for server_id in candidates:
+            key = (server_id, reservation.start_time)
+            if key in taken or (key not in free_rows and not (sparse and reservation.start_time < horizon)):
+                continue
+            # Same quota lock as a booking, so a parallel one can't take the last day too
+            lock_quota(owner, server_id)
+            pending = planned_days.setdefault((owner, server_id), [])
+            if check_limits(owner, server_id, reservation.start_time, pending):
+                continue
+            if key in free_rows:
+                plan[reservation.id] = (server_id, free_rows.pop(key))
+            else:
+                plan[reservation.id] = (server_id, None)
+            taken.add(key)
+            pending.append(reservation.start_time)
+            break
+    return plan
+
+
+def start_maintenance(server_ids, start_day, end_day, admin_id, reason=None, relocate=False):
+    """
+    Blocks start_day..end_day on the given servers and clears their reservations on
+    those days, moving them to another server first if relocate is set. Commits.
+    Returns {"windows", "cancelled", "relocated"} counts.
+    """
+    server_ids = sorted(set(server_ids))
+    slots = TimeSlot.__table__
+    in_windows = (
+        slots.c.server_id.in_(server_ids)
+        & (slots.c.start_time >= day_start(start_day))
+        & (slots.c.start_time < day_start(end_day + timedelta(days=1)))
+        & slots.c.reserved_by_user_id.isnot(None)
+    )
+
+    # 1. The windows (bookings on these servers wait until the commit, then see them)
+    lock_server_days(server_ids, exclusive=True)
+    db.session.execute(
+        insert(MaintenanceWindow),
+        [
+            {"server_id": server_id, "start_day": start_day, "end_day": end_day, "reason": reason, "created_by_id": admin_id}
+            for server_id in server_ids
+        ],
+    )
+
+    # 2. The reservations they hit (a cancel in progress finishes first)
+    affected = db.session.execute(
+        select(slots.c.id, slots.c.server_id, slots.c.start_time, slots.c.reserved_by_user_id).where(in_windows).with_for_update()
+    ).all()
+
+    # 3. Where they can go
+    plan = _plan_relocations(affected, server_ids) if relocate else {}
+
+    # 4. Set-based changes: clear the days, move what can be moved
+    if sparse_storage():
+        db.session.execute(slots.delete().where(in_windows))
+    else:
+        db.session.execute(slots.update().where(in_windows).values(reserved_by_user_id=None))
+
+    owners = {r.id: r.reserved_by_user_id for r in affected}
+    start_times = {r.id: r.start_time for r in affected}
+    moves = [(slot_id, server_id, target_id) for slot_id, (server_id, target_id) in plan.items()]
+    updates = [{"k_id": target_id, "owner": owners[slot_id]} for slot_id, _, target_id in moves if target_id is not None]
+    if updates:
+        db.session.execute(
+            slots.update().where(slots.c.id == bindparam("k_id")).values(reserved_by_user_id=bindparam("owner")), updates
+        )
+    inserts = [
+        {
+            "server_id": server_id,
+            "start_time": start_times[slot_id],
+            "end_time": start_times[slot_id] + timedelta(seconds=86399),
+            "reserved_by_user_id": owners[slot_id],
+        }
+        for slot_id, server_id, target_id in moves
+        if target_id is None
+    ]
+    new_ids = iter(
+        db.session.scalars(slots.insert().returning(slots.c.id, sort_by_parameter_order=True), inserts).all() if inserts else ()
+    )
+    moved = {slot_id: (server_id, target_id if target_id is not None else next(new_ids)) for slot_id, server_id, target_id in moves}
+
+    # Counters, feed versions and live calendars
+    rollups, quotas = Counter(), Counter()
+    for r in affected:
+        day = r.start_time
+        rollups[(r.server_id, r.reserved_by_user_id, day.year, day.month)] -= 1
+        quotas[(r.reserved_by_user_id, r.server_id, day)] -= 1
+        if r.id in moved:
+            server_id, new_id = moved[r.id]
+            rollups[(server_id, r.reserved_by_user_id, day.year, day.month)] += 1
+            quotas[(r.reserved_by_user_id, server_id, day)] += 1
+            queue_day_change(db.session, server_id, day, True, new_id)
+    record_bookings(rollups)
+    adjust_used_quotas(quotas)
+
+    waitlist = WaitlistEntry.__table__
+    db.session.execute(
+        waitlist.delete().where(
+            waitlist.c.server_id.in_(server_ids), waitlist.c.day >= start_day, waitlist.c.day <= end_day
+        )
+    )
+
+    if affected:
+        for server_id in sorted(set(server_ids) | {server_id for server_id, _ in moved.values()}):
+            bump_version("server", server_id)
+        for user_id in sorted(set(owners.values())):
+            bump_version("user", user_id)
+    slot_ids = {(r.server_id, r.start_time.date()): r.id for r in affected}
+    for server_id in server_ids:
+        for day in _visible_days(start_day, end_day):
+            queue_day_change(db.session, server_id, day, False, slot_ids.get((server_id, day)))
+
+    # 5. Audit: a summary per server plus one entry per reservation, one INSERT
+    names = dict(db.session.execute(select(Server.id, Server.name).where(Server.id.in_(server_ids + [s for s, _ in moved.values()]))).all())
+    usernames = dict(db.session.execute(select(User.id, User.username).where(User.id.in_(set(owners.values())))).all()) if owners else {}
+    per_server = Counter((r.server_id, r.id in moved) for r in affected)
+    note = f" Reason: {reason}" if reason else ""
+
+    entries = [
+        {
+            "user_id": admin_id,
+            "action": AuditAction.MAINTENANCE_START,
+            "details": (
+                f"Maintenance on {names.get(server_id)} from {start_day} to {end_day}: "
+                f"{per_server[(server_id, False)]} reservations cancelled, {per_server[(server_id, True)]} moved.{note}"
+            ),
+            "server_id": server_id,
+            "slot_id": None,
+            "target_user_id": None,
+            "day": start_day,
+        }
+        for server_id in server_ids
+    ]
+    for r in affected:
+        owner, day = r.reserved_by_user_id, r.start_time.date()
+        if r.id in moved:
+            server_id, new_id = moved[r.id]
+            entries.append({
+                "user_id": admin_id,
+                "action": AuditAction.MAINTENANCE_RELOCATE,
+                "details": f"Maintenance: moved {usernames.get(owner)} from {names.get(r.server_id)} to {names.get(server_id)} on {day}",
+                "server_id": server_id,
+                "slot_id": new_id,
+                "target_user_id": owner,
+                "day": day,
+            })
+        else:
+            entries.append({
+                "user_id": admin_id,
+                "action": AuditAction.ADMIN_REVOKE,
+                "details": f"Maintenance: revoked reservation for {usernames.get(owner)} on {names.get(r.server_id)} on {day}",
+                "server_id": r.server_id,
+                "slot_id": r.id,
+                "target_user_id": owner,
+                "day": day,
+            })
+    events = _write_audit(entries)
+
+    db.session.commit()
+    for event in events:
+        audit_sink.emit(event)
+    return {"windows": len(server_ids), "cancelled": len(affected) - len(moved), "relocated": len(moved)}
+
+
+def end_maintenance(window_ids, admin_id):
+    """
+    Ends windows early: one that has begun is cut back to yesterday (its past days stay
+    on record), one that hasn't is deleted. Cancelled reservations don't come back.
+    Commits. Returns the number of windows ended.
+    """
+    table = MaintenanceWindow.__table__
+    today = date.today()
+    rows = db.session.execute(
+        select(table.c.id, table.c.server_id, table.c.start_day, table.c.end_day, Server.name)
+        .join(Server, Server.id == table.c.server_id)
+        .where(table.c.id.in_(window_ids), table.c.end_day >= today)
+    ).all()
+    if not rows:
+        return 0
+
+    ids = [row.id for row in rows]
+    db.session.execute(table.update().where(table.c.id.in_(ids), table.c.start_day < today).values(end_day=today - timedelta(days=1)))
+    db.session.execute(table.delete().where(table.c.id.in_(ids), table.c.start_day >= today))
+
+    for row in rows:
+        for day in _visible_days(row.start_day, row.end_day):
+            queue_day_change(db.session, row.server_id, day, False)
+
+    events = _write_audit([
+        {
+            "user_id": admin_id,
+            "action": AuditAction.MAINTENANCE_END,
+            "details": f"Ended maintenance on {row.name} (was {row.start_day} to {row.end_day})",
+            "server_id": row.server_id,
+            "slot_id": None,
+            "target_user_id": None,
+            "day": max(row.start_day, today),
+        }
+        for row in rows
+    ])
+
+    db.session.commit()
+    for event in events:
+        audit_sink.emit(event)
+    return len(rows)
@@ -0,0 +1,338 @@
+import hmac
+import ipaddress
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+
+from flask import Response, current_app, g, request
+
+# Runtime metrics in the Prometheus text format, without extra dependencies.
+# Counters and histograms are sharded per thread: a request only ever touches its
+# own thread's dict, so recording a value takes no lock. Shards are summed when
+# /metrics is scraped; shards of finished threads are folded into a retired total,
+# on scrape and every RETIRE_EVERY new shards (servers that start a thread per
+# request would otherwise pile up shards between scrapes).
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+RETIRE_EVERY = 64
+
+_registry = []
+_collectors = []
+
+
+class _Sharded:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards = []   # (thread, shard)
+        self._retired = {}
+        self._created = 0   # Shards created since dead ones were last retired
+        self._lock = threading.Lock()  # Only taken when a thread creates its shard, or on scrape
+        _registry.append(self)
+
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = {}
+            with self._lock:
+                self._created += 1
+                if self._created >= RETIRE_EVERY:
+                    self._retire_dead()
+                self._shards.append((threading.current_thread(), shard))
+            self._local.shard = shard
+            return shard
+
+    def _retire_dead(self):
+        # Caller holds the lock; a finished thread never writes to its shard again
+        alive = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                alive.append((thread, shard))
+            else:
+                for key, values in shard.items():
+                    self._merge(self._retired, key, values)
+        self._shards = alive
+        self._created = 0
+
+    def _merge(self, total, key, values):
+        raise NotImplementedError
+
+    def collect(self):
+        """
+        Returns {label values: merged value} across all threads.
+        """
+        with self._lock:
+            self._retire_dead()
+
+            total = {}
+            for key, values in self._retired.items():
+                self._merge(total, key, values)
+            for _, shard in self._shards:
+                for key, values in dict(shard).items():  # dict() copies atomically under the GIL
+                    self._merge(total, key, values)
+        return total
+
+
+class Counter(_Sharded):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def _merge(self, total, key, value):
+        total[key] = total.get(key, 0) + value
+
+    def samples(self):
+        for labels, value in sorted(self.collect().items()):
+            yield self.name, dict(zip(self.labelnames, labels)), value
+
+
+class Histogram(_Sharded):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        shard = self._shard()
+        entry = shard.get(labels)
+        if entry is None:
+            # [count per bucket..., +Inf bucket, sum]
+            entry = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        entry[bisect_left(self.buckets, value)] += 1
+        entry[-1] += value
+
+    def _merge(self, total, key, values):
+        entry = total.get(key)
+        if entry is None:
+            total[key] = list(values)
+        else:
+            for i, v in enumerate(values):
+                entry[i] += v
+
+    def samples(self):
+        for labels, entry in sorted(self.collect().items()):
+            base = dict(zip(self.labelnames, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), entry[:-1]):
+                cumulative += count
+                yield self.name + "_bucket", {**base, "le": _format_value(bound)}, cumulative
+            yield self.name + "_sum", base, entry[-1]
+            yield self.name + "_count", base, cumulative
+
+
+class Gauge:
+    """
+    A value that is set rather than accumulated (last write wins, no sharding needed).
+    """
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        _registry.append(self)
+
+    def set(self, value, *labels):
+        self._values[labels] = value
+
+    def samples(self):
+        for labels, value in sorted(self._values.items()):
+            yield self.name, dict(zip(self.labelnames, labels)), value
+
+
+def collector(func):
+    """
+    Registers a function called on every scrape; it yields
+    (name, kind, help, [(labels dict, value), ...]) for values read from elsewhere.
+    """
+    _collectors.append(func)
+    return func
+
+
+# --- Metrics recorded by the app ---
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Request latency by endpoint.", ["endpoint", "method"]
+)
+REQUESTS = Counter("http_requests_total", "Requests by endpoint and status code.", ["endpoint", "method", "status"])
+BOOKINGS = Counter(
+    "booking_requests_total",
+    "Outcome of every booking/cancel request (booked, cancelled, quota, weekly_limit, taken, ...).",
+    ["outcome"],
+)
+JOB_DURATION = Histogram(
+    "scheduler_job_duration_seconds", "Background job run time.", ["job"],
+    buckets=(0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0),
+)
+JOB_LAST_RUN = Gauge("scheduler_job_last_run_timestamp_seconds", "When the job last finished (unix time).", ["job"])
+BACKUPS = Counter("backup_runs_total", "Database backups by result.", ["status"])
+BACKUP_DURATION = Gauge("backup_last_duration_seconds", "Run time of the last successful backup.")
+BACKUP_SIZE = Gauge("backup_last_size_bytes", "Size of the last successful backup file.")
+BACKUP_LAST_RUN = Gauge("backup_last_success_timestamp_seconds", "When the last successful backup finished (unix time).")
+COMPRESSION_BYTES = Counter(
+    "http_response_compression_bytes_total", "Size of gzip-compressed responses before and after.", ["stage"]
+)
+PASSWORD_HASH_DURATION = Histogram(
+    "password_hash_duration_seconds", "Password hash/verify time, including the wait for a pool slot.", ["operation"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+TELEMETRY_SAMPLES = Counter("telemetry_samples_total", "Server agent samples by outcome (stored, skipped).", ["outcome"])
+
+
+def timed_job(func):
+    """
+    Decorator for scheduler jobs: records run time and completion time.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            JOB_DURATION.observe(time.perf_counter() - started, func.__name__)
+            JOB_LAST_RUN.set(time.time(), func.__name__)
+
+    return wrapper
+
+
+@collector
+def _pool_stats():
+    from app.extensions import db
+
+    samples = {"checked_out": [], "checked_in": [], "overflow": [], "size": []}
+    for bind, engine in db.engines.items():
+        pool = engine.pool
+        if not hasattr(pool, "checkedout"):
+            continue  # StaticPool / NullPool have nothing to report
+        labels = {"bind": bind or "default"}
+        samples["checked_out"].append((labels, pool.checkedout()))
+        samples["checked_in"].append((labels, pool.checkedin()))
+        samples["overflow"].append((labels, pool.overflow()))
+        samples["size"].append((labels, pool.size()))
+
+    for stat, values in samples.items():
+        yield f"db_pool_{stat}", "gauge", f"Connection pool {stat.replace('_', ' ')} connections.", values
+
+
+@collector
+def _app_stats():
+    from app.extensions import event_broker
+    from app.hashing import get_hash_stats
+    from app.quota import get_reconcile_stats
+
+    hashes = get_hash_stats()  # Count and average: password_hash_duration_seconds
+    yield "password_hash_max_seconds", "gauge", "Slowest password hash/verify call.", [
+        ({"operation": op}, stats["max_seconds"]) for op, stats in sorted(hashes.items())
+    ]
+    yield "quota_reconcile_corrected_total", "counter", "used_quota rows repaired by reconciliation.", [
+        ({}, get_reconcile_stats()["total_corrected"])
+    ]
+    yield "sse_clients", "gauge", "Connected live-calendar clients.", [({}, event_broker.client_count())]
+
+
+# --- Exposition ---
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def render():
+    """
+    All metrics in the Prometheus text exposition format.
+    """
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+    for func in _collectors:
+        try:
+            for name, kind, help_text, values in func():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in values:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        except Exception as e:
+            # A broken collector must not take the whole endpoint down
+            print(f"Metrics collector {func.__name__} failed: {e}")
+    return "\n".join(lines) + "\n"
+
+
+def _is_loopback(address):
+    try:
+        return ipaddress.ip_address(address or "").is_loopback
+    except ValueError:
+        return False
+
+
+class Metrics:
+    """
+    Times every request and serves GET /metrics.
+    With METRICS_TOKEN set, scrapers must send 'Authorization: Bearer <token>';
+    without it, only requests from the local machine are answered, or none at all
+    with METRICS_REQUIRE_TOKEN (production: behind a proxy on the same host every
+    request comes from the local machine).
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not app.config.get("METRICS_ENABLED", True):
+            return
+
+        app.before_request(self._start_timer)
+        app.after_request(self._record)
+        app.add_url_rule("/metrics", "metrics", self._metrics_view)
+
+    @staticmethod
+    def _start_timer():
+        g._request_started = time.perf_counter()
+
+    @staticmethod
+    def _record(response):
+        started = g.pop("_request_started", None)
+        if started is not None:
+            endpoint = request.endpoint or "unmatched"
+            REQUEST_LATENCY.observe(time.perf_counter() - started, endpoint, request.method)
+            REQUESTS.inc(endpoint, request.method, str(response.status_code))
+        return response
+
+    @staticmethod
+    def _metrics_view():
+        token = current_app.config.get("METRICS_TOKEN")
+        if token:
+            sent = request.headers.get("Authorization", "").encode()
+            if not hmac.compare_digest(sent, f"Bearer {token}".encode()):
+                return Response("Unauthorized\n", status=401, mimetype="text/plain")
+        elif current_app.config.get("METRICS_REQUIRE_TOKEN"):
+            return Response("Forbidden: set METRICS_TOKEN to enable metrics\n", status=403, mimetype="text/plain")
+        elif not _is_loopback(request.remote_addr):
+            return Response("Forbidden: set METRICS_TOKEN to scrape from another host\n", status=403, mimetype="text/plain")
+        return Response(render(), mimetype="text/plain; version=0.0.4")
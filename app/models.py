@@ -1,3 +1,4 @@
+import enum
 from datetime import datetime
 from flask_login import UserMixin
 from app.extensions import db, login_manager
@@ -6,10 +7,11 @@ from app.extensions import db, login_manager
 # This links Users to Servers with extra data
 user_server = db.Table(
     "user_server",
-    db.Column("user_id", db.Integer, db.ForeignKey("user.id"), primary_key=True),
-    db.Column("server_id", db.Integer, db.ForeignKey("server.id"), primary_key=True),
+    db.Column("user_id", db.Integer, db.ForeignKey("user.id", ondelete="CASCADE"), primary_key=True),
+    db.Column("server_id", db.Integer, db.ForeignKey("server.id", ondelete="CASCADE"), primary_key=True),
     db.Column("MAX_QUOTA", db.Integer, default=360),
     db.Column("used_quota", db.Integer, default=0),
+    db.Column("quota_month", db.Integer),  # Month used_quota counts (YYYYMM); see app/quota.py
     db.Column("Access_StartDate", db.DateTime, default=datetime.now),
 )
 
@@ -96,25 +98,29 @@ class Server(db.Model):
 
 
 class TimeSlot(db.Model):
+    # One row per server and day (see app/slots.py for the dense/sparse storage modes)
+    __table_args__ = (db.Index("uq_time_slot_server_day", "server_id", "start_time", unique=True),)
+
     id = db.Column(db.Integer, primary_key=True)
     start_time = db.Column(db.DateTime, nullable=False)
     end_time = db.Column(db.DateTime, nullable=False)
 
     # Link to Server
-    server_id = db.Column(db.Integer, db.ForeignKey("server.id"), nullable=False)
+    server_id = db.Column(db.Integer, db.ForeignKey("server.id", ondelete="CASCADE"), nullable=False)
 
     # Relationships
     # Note: We don't define 'server' or 'reserved_by_user' in __init__ because they are relationships,
     # but we accept the IDs or objects if needed. Usually, we just pass the IDs.
+    # passive_deletes: deleting a parent never loads these rows; see app/deletion.py
 
     server = db.relationship(
-        "Server", backref=db.backref("time_slots", lazy=True, cascade="all, delete")
+        "Server", backref=db.backref("time_slots", lazy=True, cascade="all, delete", passive_deletes=True)
     )
 
     # Link to User (Reservation)
-    reserved_by_user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=True)
+    reserved_by_user_id = db.Column(db.Integer, db.ForeignKey("user.id", ondelete="SET NULL"), nullable=True)
     reserved_by_user = db.relationship(
-        "User", backref=db.backref("reservations", lazy=True)
+        "User", backref=db.backref("reservations", lazy=True, passive_deletes=True)
     )
 
     def __init__(self, start_time, end_time, server_id, reserved_by_user_id=None):
@@ -124,28 +130,284 @@ class TimeSlot(db.Model):
         self.reserved_by_user_id = reserved_by_user_id
 
 
+class AuditAction(str, enum.Enum):
+    """
+    Every kind of event the audit log records.
+    """
+    BOOK_SLOT = "BOOK_SLOT"
+    CANCEL_SLOT = "CANCEL_SLOT"
+    WAITLIST_ASSIGN = "WAITLIST_ASSIGN"
+    ADMIN_REVOKE = "ADMIN_REVOKE"
+    CREATE_USER = "CREATE_USER"
+    DELETE_USER = "DELETE_USER"
+    DELETE_SERVER = "DELETE_SERVER"
+    MAINTENANCE_START = "MAINTENANCE_START"
+    MAINTENANCE_RELOCATE = "MAINTENANCE_RELOCATE"
+    MAINTENANCE_END = "MAINTENANCE_END"
+
+    def __str__(self):
+        return self.value
+
+
 class AuditLog(db.Model):
+    """
+    Append-only event record: rows are inserted by log_action and never updated.
+    The typed columns make events queryable; 'details' stays as the readable summary.
+    """
+    __table_args__ = (db.Index("ix_audit_log_action_timestamp", "action", "timestamp"),)
+
     id = db.Column(db.Integer, primary_key=True)
-    timestamp = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    timestamp = db.Column(db.DateTime, nullable=False, default=datetime.now, index=True)
 
     # Who performed the action?
-    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=True)
-    user = db.relationship("User", backref="logs")
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id", ondelete="SET NULL"), nullable=True)
+    user = db.relationship("User", backref=db.backref("logs", passive_deletes=True))
 
     # What happened?
-    action = db.Column(db.String(50), nullable=False)
+    action = db.Column(db.Enum(AuditAction, native_enum=False, length=50), nullable=False)
     details = db.Column(db.String(255), nullable=True)
 
-    def __init__(self, user_id, action, details):
+    # What did it happen to? Plain ids (no foreign keys): the history outlives deleted rows
+    server_id = db.Column(db.Integer, nullable=True, index=True)
+    slot_id = db.Column(db.Integer, nullable=True)
+    target_user_id = db.Column(db.Integer, nullable=True, index=True)
+    day = db.Column(db.Date, nullable=True)
+
+    def __init__(self, user_id, action, details, server_id=None, slot_id=None, target_user_id=None, day=None):
         # We don't need to set timestamp in __init__ because it has a default=datetime.now
         self.user_id = user_id
         self.action = action
         self.details = details
+        self.server_id = server_id
+        self.slot_id = slot_id
+        self.target_user_id = target_user_id
+        self.day = day
+
+    def to_event(self):
+        """
+        The record as a flat dict, as written to the JSONL event stream.
+        """
+        return {
+            "id": self.id,
+            "timestamp": self.timestamp.isoformat(),
+            "action": str(self.action),
+            "user_id": self.user_id,
+            "server_id": self.server_id,
+            "slot_id": self.slot_id,
+            "target_user_id": self.target_user_id,
+            "day": self.day.isoformat() if self.day else None,
+            "details": self.details,
+        }
 
     def __repr__(self):
         return f"Log('{self.action}', '{self.timestamp}')"
 
 
+class UsageRollup(db.Model):
+    """
+    Precomputed booked days per (month, server, user).
+    Kept up to date on book/cancel and rebuilt nightly from TimeSlot.
+    """
+
+    year = db.Column(db.Integer, primary_key=True)
+    month = db.Column(db.Integer, primary_key=True)
+    server_id = db.Column(db.Integer, db.ForeignKey("server.id", ondelete="CASCADE"), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id", ondelete="CASCADE"), primary_key=True)
+    booked_days = db.Column(db.Integer, nullable=False, default=0)
+
+    def __init__(self, year, month, server_id, user_id, booked_days=0):
+        self.year = year
+        self.month = month
+        self.server_id = server_id
+        self.user_id = user_id
+        self.booked_days = booked_days
+
+    def __repr__(self):
+        return f"<UsageRollup {self.year}-{self.month} S{self.server_id} U{self.user_id}>"
+
+
+class WaitlistEntry(db.Model):
+    """
+    A user waiting for a (server, day) that is currently reserved by someone else.
+    The oldest eligible entry gets the slot automatically when it is released.
+    """
+
+    __table_args__ = (
+        db.UniqueConstraint("user_id", "server_id", "day"),
+        db.Index("ix_waitlist_server_day", "server_id", "day", "created_at"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id", ondelete="CASCADE"), nullable=False)
+    server_id = db.Column(db.Integer, db.ForeignKey("server.id", ondelete="CASCADE"), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+
+    user = db.relationship("User", backref=db.backref("waitlist_entries", lazy="dynamic", passive_deletes=True))
+    server = db.relationship("Server")
+
+    def __init__(self, user_id, server_id, day):
+        self.user_id = user_id
+        self.server_id = server_id
+        self.day = day
+
+    def __repr__(self):
+        return f"<WaitlistEntry U{self.user_id} S{self.server_id} {self.day}>"
+
+
+class DeletionJob(db.Model):
+    """
+    A background deletion of a server or user (app/deletion.py). Its progress lives
+    here, so any worker can report it, and a job cut off by a restart is picked up
+    again once its heartbeat goes stale.
+    """
+
+    __table_args__ = (db.Index("ix_deletion_job_target", "kind", "target_id"),)
+
+    id = db.Column(db.String(12), primary_key=True)
+    kind = db.Column(db.String(10), nullable=False)  # 'server' / 'user'
+    target_id = db.Column(db.Integer, nullable=False)
+    label = db.Column(db.String(150), nullable=False)
+    requested_by_id = db.Column(db.Integer, nullable=True)  # Plain id, like AuditLog.target_user_id
+    state = db.Column(db.String(10), nullable=False, default="queued")  # queued / running / done / failed
+    step = db.Column(db.String(50), nullable=True)
+    rows = db.Column(db.JSON, nullable=False, default=dict)  # {table: rows deleted or updated}
+    started = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    heartbeat = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    finished = db.Column(db.DateTime, nullable=True)
+    seconds = db.Column(db.Float, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+
+    def __init__(self, id, kind, target_id, label, requested_by_id=None):
+        self.id = id
+        self.kind = kind
+        self.target_id = target_id
+        self.label = label
+        self.requested_by_id = requested_by_id
+        self.state = "queued"
+        self.rows = {}
+
+    def to_dict(self):
+        """
+        The job as served by admin.deletion_status.
+        """
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "target_id": self.target_id,
+            "label": self.label,
+            "state": self.state,
+            "step": self.step,
+            "rows": dict(self.rows or {}),
+            "started": self.started.isoformat(timespec="seconds"),
+            "finished": self.finished.isoformat(timespec="seconds") if self.finished else None,
+            "seconds": self.seconds,
+            "error": self.error,
+        }
+
+    def __repr__(self):
+        return f"<DeletionJob {self.id} {self.kind} {self.target_id} {self.state}>"
+
+
+class SlotArchive(db.Model):
+    """
+    Compacted history: one row per server and past month, replacing that month's
+    TimeSlot rows. owners[day - 1] is the id of the user who had the day, or null.
+    Written by app/archive.py; never changes once the month is compacted.
+    """
+
+    server_id = db.Column(db.Integer, db.ForeignKey("server.id", ondelete="CASCADE"), primary_key=True)
+    year = db.Column(db.Integer, primary_key=True)
+    month = db.Column(db.Integer, primary_key=True)
+    owners = db.Column(db.JSON, nullable=False)
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+
+    def __init__(self, server_id, year, month, owners):
+        self.server_id = server_id
+        self.year = year
+        self.month = month
+        self.owners = owners
+
+    def __repr__(self):
+        return f"<SlotArchive S{self.server_id} {self.year}-{self.month}>"
+
+
+class MaintenanceWindow(db.Model):
+    """
+    Days start_day..end_day (inclusive) on which a server can't be booked. The
+    reservations on those days were cancelled or moved when the window was started;
+    see app/maintenance.py.
+    """
+
+    __table_args__ = (db.Index("ix_maintenance_window_server_days", "server_id", "start_day", "end_day"),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    server_id = db.Column(db.Integer, db.ForeignKey("server.id", ondelete="CASCADE"), nullable=False)
+    start_day = db.Column(db.Date, nullable=False)
+    end_day = db.Column(db.Date, nullable=False)
+    reason = db.Column(db.String(200), nullable=True)
+    created_by_id = db.Column(db.Integer, db.ForeignKey("user.id", ondelete="SET NULL"), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+
+    server = db.relationship("Server")
+    created_by = db.relationship("User")
+
+    def __init__(self, server_id, start_day, end_day, reason=None, created_by_id=None):
+        self.server_id = server_id
+        self.start_day = start_day
+        self.end_day = end_day
+        self.reason = reason
+        self.created_by_id = created_by_id
+
+    def __repr__(self):
+        return f"<MaintenanceWindow S{self.server_id} {self.start_day}..{self.end_day}>"
+
+
+class ReservationVersion(db.Model):
+    """
+    Change counter per server and per user ('server' / 'user' scope), bumped in the
+    same transaction as every booking change. The .ics feeds use it as their ETag.
+    """
+
+    scope = db.Column(db.String(10), primary_key=True)
+    key = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    def __init__(self, scope, key, version=0):
+        self.scope = scope
+        self.key = key
+        self.version = version
+
+    def __repr__(self):
+        return f"<ReservationVersion {self.scope} {self.key} v{self.version}>"
+
+
+class ServerTelemetry(db.Model):
+    """
+    Utilization history of one server as three fixed-size ring buffers (flat arrays of
+    doubles, little-endian): the last raw samples, per-minute and per-hour rollups.
+    The newest sample is copied into plain columns for list pages. See app/telemetry.py.
+    """
+
+    server_id = db.Column(db.Integer, db.ForeignKey("server.id", ondelete="CASCADE"), primary_key=True)
+    last_sample_at = db.Column(db.DateTime)
+    gpu = db.Column(db.Float)
+    cpu = db.Column(db.Float)
+    ram = db.Column(db.Float)
+    raw_head = db.Column(db.Integer, nullable=False, default=0)
+    raw = db.Column(db.LargeBinary)
+    minutes = db.Column(db.LargeBinary)
+    hours = db.Column(db.LargeBinary)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+
+    def __init__(self, server_id):
+        self.server_id = server_id
+        self.raw_head = 0
+
+    def __repr__(self):
+        return f"<ServerTelemetry S{self.server_id} {self.last_sample_at}>"
+
+
 # --- User Loader Helper ---
 @login_manager.user_loader
 def load_user(user_id):
@@ -0,0 +1,162 @@
+import cProfile
+import itertools
+import pstats
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from flask import current_app, g, request
+from flask_login import current_user
+
+# On-demand request profiling. An admin adds ?_profile=1 to any URL, or
+# PROFILER_SAMPLE_RATE picks a share of all requests. That request runs under
+# cProfile; the summary (top functions, time per area) goes into a bounded ring
+# buffer shown at /admin/profiles. Only one request is profiled at a time: the
+# profiler hooks are per thread, and a second trace would only add noise.
+
+# Where the time went, by the file (or built-in) that spent it; first match wins
+AREAS = (
+    ("Password hashing", ("app/hashing.py", "werkzeug/security.py", "hashlib", "concurrent/futures")),
+    ("SQL", ("sqlalchemy/engine", "sqlalchemy/pool", "sqlalchemy/dialects", "sqlite3", "psycopg")),
+    ("ORM", ("sqlalchemy/orm",)),
+    ("SQL compile", ("sqlalchemy/sql",)),
+    ("Jinja", ("jinja2", "markupsafe", "app/templates")),
+    ("App", ("/app/",)),
+    ("Flask/Werkzeug", ("flask/", "flask_", "werkzeug/")),
+)
+
+
+class RequestProfiler:
+    """
+    Profiles selected requests and keeps the last PROFILER_KEEP results.
+    """
+
+    def __init__(self, app=None):
+        self._profiles = deque(maxlen=20)
+        self._lock = threading.Lock()
+        self._busy = threading.Lock()  # Held while a request is being profiled
+        self._ids = itertools.count(1)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not app.config.get("PROFILER_ENABLED", True):
+            return
+
+        self._profiles = deque(maxlen=app.config.get("PROFILER_KEEP", 20))
+        app.before_request(self._start)
+        app.after_request(self._stop)
+        app.teardown_request(self._discard)
+
+    # --- Request hooks ---
+
+    def _wanted(self):
+        if request.endpoint in (None, "static", "assets", "metrics"):
+            return False
+        param = current_app.config.get("PROFILER_QUERY_PARAM", "_profile")
+        if request.args.get(param) and current_user.is_authenticated and current_user.is_admin:
+            return True
+        rate = current_app.config.get("PROFILER_SAMPLE_RATE", 0.0)
+        return rate > 0 and random.random() < rate
+
+    def _start(self):
+        if not self._wanted() or not self._busy.acquire(blocking=False):
+            return
+        profile = cProfile.Profile()
+        g._profile = (profile, time.perf_counter())
+        profile.enable()
+
+    def _stop(self, response):
+        started = g.pop("_profile", None)
+        if started is None:
+            return response
+
+        profile, started_at = started
+        profile.disable()
+        self._busy.release()
+
+        duration = time.perf_counter() - started_at
+        entry = self._summarize(profile, duration, response.status_code)
+        with self._lock:
+            self._profiles.append(entry)
+        response.headers["X-Profile-Id"] = str(entry["id"])
+        return response
+
+    def _discard(self, exc):
+        # The request failed before after_request ran
+        started = g.pop("_profile", None)
+        if started is not None:
+            started[0].disable()
+            self._busy.release()
+
+    # --- Results ---
+
+    def _summarize(self, profile, duration, status):
+        top_n = current_app.config.get("PROFILER_TOP_FUNCTIONS", 40)
+        stats = pstats.Stats(profile)
+
+        functions = []
+        areas = dict.fromkeys([name for name, _ in AREAS] + ["Other"], 0.0)
+        for (filename, line, name), (_, calls, own, cumulative, _) in stats.stats.items():  # type: ignore
+            functions.append(
+                {
+                    "function": name,
+                    "location": f"{_short_path(filename)}:{line}",
+                    "calls": calls,
+                    "own": own,
+                    "cumulative": cumulative,
+                }
+            )
+            areas[_area(filename, name)] += own
+
+        functions.sort(key=lambda f: f["cumulative"], reverse=True)
+        return {
+            "id": next(self._ids),
+            "timestamp": datetime.now(),
+            "method": request.method,
+            "path": request.full_path.rstrip("?"),
+            "endpoint": request.endpoint,
+            "status": status,
+            "user": current_user.username if current_user.is_authenticated else None,
+            "duration": duration,
+            "function_calls": stats.total_calls,  # type: ignore
+            "areas": sorted(areas.items(), key=lambda a: a[1], reverse=True),
+            "functions": functions[:top_n],
+        }
+
+    def recent(self):
+        """
+        Stored profiles, newest first.
+        """
+        with self._lock:
+            return list(reversed(self._profiles))
+
+    def get(self, profile_id):
+        with self._lock:
+            for entry in self._profiles:
+                if entry["id"] == profile_id:
+                    return entry
+        return None
+
+    def clear(self):
+        with self._lock:
+            self._profiles.clear()
+
+
+def _area(filename, name):
+    # Built-ins have no file ('~'); their name says e.g. "method 'execute' of 'sqlite3.Cursor'"
+    path = filename.replace("\\", "/") if filename != "~" else name
+    for area, markers in AREAS:
+        if any(marker in path for marker in markers):
+            return area
+    return "Other"
+
+
+def _short_path(filename):
+    path = filename.replace("\\", "/")
+    for marker in ("site-packages/", "/app/"):
+        if marker in path:
+            return ("app/" if marker == "/app/" else "") + path.split(marker, 1)[1]
+    return path
@@ -0,0 +1,273 @@
+import math
+import threading
+import time
+from calendar import monthrange
+from collections import defaultdict
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import bindparam, case, func
+
+from app.extensions import db
+from app.models import TimeSlot, User, user_server
+
+# Stats from the last used_quota reconciliation run
+_reconcile_stats = {"runs": 0, "last_corrected": 0, "total_corrected": 0, "last_run": None}
+
+# Allowances per (year, month): {"built": timestamp, "allowances": {(user_id, server_id): days}}
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def compute_allowances(year, month):
+    """
+    Computes the monthly allowance (in days) for EVERY user/server assignment at once.
+
+    Each user asks for QUOTA_BASE_MONTHLY * ratio days. When a server's total demand is
+    larger than its capacity (days in the month) every request on that server is scaled
+    down by the same factor. MAX_QUOTA on the assignment acts as a cap when set (> 0).
+    Admins (ratio 0) are unlimited and don't count towards demand.
+    """
+    base = current_app.config.get("QUOTA_BASE_MONTHLY", 8)
+    default_ratio = current_app.config.get("QUOTA_DEFAULT_RATIO", 0.5)
+    capacity = monthrange(year, month)[1]
+
+    # 1. One query for all assignments
+    rows = db.session.execute(
+        db.select(
+            user_server.c.user_id,
+            user_server.c.server_id,
+            user_server.c.MAX_QUOTA,
+            User.ratio,
+        ).join(User, User.id == user_server.c.user_id)
+    ).all()
+
+    # 2. Column-wise arrays, grouped by server
+    by_server = defaultdict(lambda: ([], [], []))  # user_ids, requests, caps
+    for user_id, server_id, cap, ratio in rows:
+        ratio = default_ratio if ratio is None else ratio
+        user_ids, requests, caps = by_server[server_id]
+        user_ids.append(user_id)
+        requests.append(base * ratio if ratio > 0 else None)  # None = unlimited
+        caps.append(cap or 0)
+
+    # 3. Scale each server's requests by capacity / demand
+    allowances = {}
+    for server_id, (user_ids, requests, caps) in by_server.items():
+        demand = sum(r for r in requests if r is not None)
+        scale = min(1.0, capacity / demand) if demand else 1.0
+
+        for user_id, request, cap in zip(user_ids, requests, caps):
+            days = capacity if request is None else max(1, math.floor(request * scale))
+            if cap > 0:
+                days = min(days, cap)
+            allowances[(user_id, server_id)] = days
+
+    return allowances
+
+
+def get_allowances(year, month):
+    """
+    Cached wrapper around compute_allowances(). The cache expires after QUOTA_CACHE_TTL
+    seconds so other worker processes pick up assignment changes too.
+    """
+    ttl = current_app.config.get("QUOTA_CACHE_TTL", 300)
+    now = time.time()
+
+    with _cache_lock:
+        entry = _cache.get((year, month))
+        if entry and now - entry["built"] < ttl:
+            return entry["allowances"]
+
+    allowances = compute_allowances(year, month)
+    with _cache_lock:
+        _cache[(year, month)] = {"built": now, "allowances": allowances}
+    return allowances
+
+
+def invalidate_allowances():
+    """
+    Drops cached allowances. Call after assignments, ratios or caps change.
+    """
+    with _cache_lock:
+        _cache.clear()
+
+
+def monthly_allowance(user_id, server_id, year, month):
+    """
+    Days per month the user may book on this server (0 if not assigned).
+    """
+    return get_allowances(year, month).get((user_id, server_id), 0)
+
+
+def weekly_allowance(monthly):
+    """
+    Days per week (Sun-Sat): a quarter of the monthly allowance, at least one day.
+    """
+    return max(1, math.ceil(monthly / 4))
+
+
+# --- Materialized Usage Counter (user_server.used_quota) ---
+# used_quota holds the number of days booked in the month stored next to it (quota_month,
+# YYYYMM). It is updated in the same transaction as each booking/cancellation and
+# repaired nightly by reconcile_used_quota(). A counter left over from an earlier month
+# is never read: the bookings are counted instead, and the next update of the row
+# recounts and restamps it. So a new month needs no reset job at midnight.
+
+
+def _is_current_month(day):
+    now = datetime.now()
+    return day.year == now.year and day.month == now.month
+
+
+def _month_key(day):
+    return day.year * 100 + day.month
+
+
+def _month_bounds(day):
+    month_start = datetime(day.year, day.month, 1)
+    month_end = datetime(day.year + 1, 1, 1) if day.month == 12 else datetime(day.year, day.month + 1, 1)
+    return month_start, month_end
+
+
+def _adjusted(day, delta):
+    """
+    New used_quota for an UPDATE of user_server: counter + delta if it counts day's month,
+    otherwise a recount of that month's bookings (which already include the change).
+    """
+    month_start, month_end = _month_bounds(day)
+    recount = (
+        db.select(func.count(TimeSlot.id))
+        .where(
+            TimeSlot.server_id == user_server.c.server_id,  # type: ignore
+            TimeSlot.reserved_by_user_id == user_server.c.user_id,
+            TimeSlot.start_time >= month_start,  # type: ignore
+            TimeSlot.start_time < month_end,  # type: ignore
+        )
+        .scalar_subquery()
+    )
+    return case(
+        (user_server.c.quota_month == _month_key(day), func.coalesce(user_server.c.used_quota, 0) + delta),
+        else_=recount,
+    )
+
+
+def adjust_used_quota(user_id, server_id, day, delta):
+    """
+    Adds delta (+1 book / -1 cancel) to the assignment's counter if 'day' is in the
+    current month. Does NOT commit.
+    """
+    if not _is_current_month(day):
+        return
+
+    db.session.flush()  # A stale counter is recounted: the slot change has to be visible
+    db.session.execute(
+        user_server.update()
+        .where(user_server.c.user_id == user_id, user_server.c.server_id == server_id)
+        .values(used_quota=_adjusted(day, delta), quota_month=_month_key(day))
+    )
+
+
+def adjust_used_quotas(deltas):
+    """
+    adjust_used_quota for many changes at once: {(user_id, server_id, day): delta},
+    applied with one executemany UPDATE. Does NOT commit.
+    """
+    totals = {}
+    for (user_id, server_id, day), delta in deltas.items():
+        if _is_current_month(day):
+            totals[(user_id, server_id)] = totals.get((user_id, server_id), 0) + delta
+
+    params = [{"k_user": user_id, "k_server": server_id, "delta": delta} for (user_id, server_id), delta in totals.items() if delta]
+    if params:
+        now = datetime.now()
+        db.session.flush()
+        db.session.execute(
+            user_server.update()
+            .where(user_server.c.user_id == bindparam("k_user"), user_server.c.server_id == bindparam("k_server"))
+            .values(used_quota=_adjusted(now, bindparam("delta")), quota_month=_month_key(now)),
+            params,
+        )
+
+
+def month_usage(user_id, server_id, day):
+    """
+    Days booked by the user on this server in day's month.
+    Current month: a single row read of used_quota. Other months, or a counter that
+    still counts an earlier month: COUNT over TimeSlot.
+    """
+    if _is_current_month(day):
+        row = db.session.execute(
+            db.select(user_server.c.used_quota, user_server.c.quota_month).where(
+                user_server.c.user_id == user_id, user_server.c.server_id == server_id
+            )
+        ).first()
+        if row is None:
+            return 0
+        if row.quota_month == _month_key(day):
+            return row.used_quota or 0
+
+    month_start, month_end = _month_bounds(day)
+    return TimeSlot.query.filter(
+        TimeSlot.server_id == server_id,  # type: ignore
+        TimeSlot.reserved_by_user_id == user_id,
+        TimeSlot.start_time >= month_start,  # type: ignore
+        TimeSlot.start_time < month_end,  # type: ignore
+    ).count()
+
+
+def reconcile_used_quota():
+    """
+    Recounts current-month bookings for all assignments in one GROUP BY and rewrites
+    the used_quota values that drifted, in one bulk UPDATE. Returns rows corrected.
+    """
+    now = datetime.now()
+    month_start, month_end = _month_bounds(now)
+    month = _month_key(now)
+
+    # 1. True counts for this month, one GROUP BY
+    rows = db.session.execute(
+        db.select(TimeSlot.server_id, TimeSlot.reserved_by_user_id, func.count(TimeSlot.id))
+        .where(
+            TimeSlot.reserved_by_user_id.isnot(None),  # type: ignore
+            TimeSlot.start_time >= month_start,  # type: ignore
+            TimeSlot.start_time < month_end,  # type: ignore
+        )
+        .group_by(TimeSlot.server_id, TimeSlot.reserved_by_user_id)
+    ).all()
+    counts = {(user_id, server_id): count for server_id, user_id, count in rows}
+
+    # 2. Compare with the stored counters
+
+    assignments = db.session.execute(
+        db.select(user_server.c.user_id, user_server.c.server_id, user_server.c.used_quota, user_server.c.quota_month)
+    ).all()
+
+    fixes = []
+    for user_id, server_id, used, used_month in assignments:
+        expected = counts.get((user_id, server_id), 0)
+        if used != expected or used_month != month:
+            fixes.append({"u": user_id, "s": server_id, "q": expected})
+
+    # 3. Repair drifted rows with a single executemany UPDATE
+    if fixes:
+        db.session.execute(
+            user_server.update()
+            .where(user_server.c.user_id == bindparam("u"), user_server.c.server_id == bindparam("s"))
+            .values(used_quota=bindparam("q"), quota_month=month),
+            fixes,
+        )
+    db.session.commit()
+
+    _reconcile_stats["runs"] += 1
+    _reconcile_stats["last_corrected"] = len(fixes)
+    _reconcile_stats["total_corrected"] += len(fixes)
+    _reconcile_stats["last_run"] = now.isoformat(timespec="seconds")
+    return len(fixes)
+
+
+def get_reconcile_stats():
+    """
+    Returns a copy of the reconciliation metrics (runs, rows corrected, last run time).
+    """
+    return dict(_reconcile_stats)
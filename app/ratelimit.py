@@ -0,0 +1,161 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+# --- Storage Backends ---
+# Each key keeps a sliding-window counter: (window_start, current_count, previous_count).
+# The estimate weights the previous window by how much of it still overlaps "now",
+# so a check is O(1) no matter how many attempts were made.
+
+
+def _estimate(window_start, current, previous, window, now):
+    elapsed = now - window_start
+    if elapsed >= 2 * window:
+        return 0.0
+    if elapsed >= window:
+        # The "current" window is now the previous one
+        return current * (1 - (elapsed - window) / window)
+    return previous * (1 - elapsed / window) + current
+
+
+def _roll(window_start, current, previous, window, now):
+    """
+    Moves a counter forward so that 'now' falls inside its current window.
+    """
+    elapsed = now - window_start
+    if elapsed >= 2 * window:
+        return now - (now % window), 0, 0
+    if elapsed >= window:
+        return window_start + window, 0, current
+    return window_start, current, previous
+
+
+class MemoryStore:
+    """
+    Per-process store. Keeps at most max_keys counters, evicting the least recently used.
+    """
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._counters = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key, window, now):
+        with self._lock:
+            entry = self._counters.pop(key, None) or (now - (now % window), 0, 0)
+            start, current, previous = _roll(*entry, window, now)
+            self._counters[key] = (start, current + 1, previous)
+
+            while len(self._counters) > self.max_keys:
+                self._counters.popitem(last=False)
+
+    def peek(self, key, window, now):
+        with self._lock:
+            entry = self._counters.get(key)
+            if entry is None:
+                return 0.0
+            self._counters.move_to_end(key)
+            return _estimate(*entry, window, now)
+
+
+class SQLiteStore:
+    """
+    Shared store for multi-worker deployments: all workers on a host point at the same file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limit ("
+            " key TEXT PRIMARY KEY, window_start REAL, current INTEGER, previous INTEGER)"
+        )
+
+    def _connect(self):
+        # One connection per thread; sqlite3 connections can't be shared across threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def hit(self, key, window, now):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT window_start, current, previous FROM rate_limit WHERE key = ?", (key,)
+            ).fetchone()
+            start, current, previous = _roll(*(row or (now - (now % window), 0, 0)), window, now)
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_limit VALUES (?, ?, ?, ?)",
+                (key, start, current + 1, previous),
+            )
+            # Keep the table bounded: drop counters that can no longer affect any estimate
+            if row is None:
+                conn.execute("DELETE FROM rate_limit WHERE window_start < ?", (now - 2 * window,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def peek(self, key, window, now):
+        row = self._connect().execute(
+            "SELECT window_start, current, previous FROM rate_limit WHERE key = ?", (key,)
+        ).fetchone()
+        return _estimate(*row, window, now) if row else 0.0
+
+
+# --- Limiter ---
+
+
+class LoginRateLimiter:
+    """
+    Throttles failed logins per client IP and per username.
+    Call is_limited() before touching the database, and hit() after a failed attempt.
+    """
+
+    def __init__(self, app=None):
+        self.store = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.window = app.config.get("LOGIN_RATE_WINDOW", 300)
+        self.ip_limit = app.config.get("LOGIN_RATE_LIMIT_IP", 30)
+        self.user_limit = app.config.get("LOGIN_RATE_LIMIT_USER", 5)
+
+        storage_uri = app.config.get("RATELIMIT_STORAGE_URI", "memory://")
+
+        if storage_uri.startswith("sqlite:///"):
+            path = storage_uri.replace("sqlite:///", "")
+            if not os.path.isabs(path):
+                path = os.path.join(app.instance_path, path)
+                os.makedirs(app.instance_path, exist_ok=True)
+            self.store = SQLiteStore(path)
+        else:
+            self.store = MemoryStore(app.config.get("RATELIMIT_MAX_KEYS", 100000))
+
+    def _keys(self, ip, username):
+        return [
+            ("ip:" + (ip or "unknown"), self.ip_limit),
+            ("user:" + (username or "").strip().lower(), self.user_limit),
+        ]
+
+    def is_limited(self, ip, username):
+        now = time.time()
+        for key, limit in self._keys(ip, username):
+            if self.store.peek(key, self.window, now) >= limit:  # type: ignore
+                return True
+        return False
+
+    def hit(self, ip, username):
+        now = time.time()
+        for key, _ in self._keys(ip, username):
+            self.store.hit(key, self.window, now)  # type: ignore
@@ -1,22 +1,34 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, Response, abort, current_app
 from flask_login import login_required, current_user
-from werkzeug.security import generate_password_hash
 from datetime import datetime
 from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
 
 from app import db
-from app.models import User, Server, user_server, TimeSlot, AuditLog
-from app.forms import AddUserForm, EditUserForm, ServerForm
+from app.models import User, Server, user_server, TimeSlot, AuditLog, AuditAction
+from app.forms import AddUserForm, EditUserForm, MaintenanceForm, ServerForm
+
+from app.utils import backup_database, calculate_user_quota_stats, log_action
+from app.hashing import hash_password
+from app.analytics import get_occupancy, month_report, server_filter_options
+from app.quota import invalidate_allowances
+from app.bookings import lock_slot, release
+from app.archive import archived_slots, is_archived_month
+from app.deletion import get_job, list_jobs, pending_targets, start_deletion
+from app.extensions import event_broker, request_profiler
+from app.events import month_topic
+from app.calendar_grid import month_grid, render_grid
+from app.feeds import bump_renamed
+from app.telemetry import agent_token, fleet_status, server_telemetry
+from app.maintenance import blocked_servers, current_windows, end_maintenance, start_maintenance
 
-from app.tasks import generate_time_slots
-from app.utils import calculate_user_quota_stats, backup_database, log_action
-
-from calendar import monthcalendar
-from sqlalchemy import extract
 from datetime import datetime, timedelta
 
 admin_bp = Blueprint("admin", __name__)
 
+# Padding cell for days outside the month
+ADMIN_CALENDAR_BLANK_CELL = '<div class="day-cell bg-light border-0 opacity-25"></div>'
+
 
 # --- Middleware: Protect all admin routes ---
 @admin_bp.before_request
@@ -42,13 +54,18 @@ def dashboard():
 @admin_bp.route("/users")
 def list_users():
     users = User.query.all()
-    return render_template("admin/list_users.html", users=users)
+    return render_template("admin/list_users.html", users=users, deleting=pending_targets("user"))
 
 
 @admin_bp.route("/users/add", methods=["GET", "POST"])
 def add_user():
     form = AddUserForm()
     if form.validate_on_submit():
+        try:
+            password = hash_password(form.password.data)
+        except TimeoutError:
+            flash("The server is busy right now. Please try again in a moment.", "warning")
+            return render_template("admin/add_user.html", form=form), 503
 
         # 1. Determine if this user is an Admin based on the dropdown
         is_admin_role = form.position.data == "Admin"
@@ -62,7 +79,7 @@ def add_user():
         new_user = User(
             username=form.username.data,
             email=form.email.data,
-            password=generate_password_hash(form.password.data or ""),
+            password=password,
             position=form.position.data,
             resource_needed=form.resource_needed.data,
             ratio=user_ratio,
@@ -71,10 +88,12 @@ def add_user():
 
         try:
             db.session.add(new_user)
+            db.session.flush()  # Assigns new_user.id
             log_action(
                 current_user.id,
-                "CREATE_USER",
+                AuditAction.CREATE_USER,
                 f"Created user {new_user.username} as {new_user.position}",
+                target_user_id=new_user.id,
             )
             db.session.commit()
             flash(
@@ -97,24 +116,19 @@ def delete_user(user_id):
     if user.id == current_user.id:
         flash("You cannot delete your own account while logged in.", "danger")
     else:
-        try:
-            # Check if we are deleting an admin (optional warning in logs)
-            if user.is_admin:
-                print(
-                    f"Warning: Admin user {user.username} is being deleted by {current_user.username}"
-                )
-
-            db.session.delete(user)
-            log_action(
-                current_user.id,
-                "DELETE_USER",
-                f"Deleted user {user.username} (ID: {user_id})",
+        # Check if we are deleting an admin (optional warning in logs)
+        if user.is_admin:
+            print(
+                f"Warning: Admin user {user.username} is being deleted by {current_user.username}"
             )
-            db.session.commit()
-            flash(f"User {user.username} has been permanently deleted.", "success")
-        except Exception as e:
-            db.session.rollback()
-            flash(f"Error deleting user: {str(e)}", "danger")
+
+        # Reservations, waitlist entries and audit trail are handled in the background;
+        # the job writes the audit entry once the user is gone
+        start_deletion(current_app._get_current_object(), "user", user_id, user.username, current_user.id)  # type: ignore
+        flash(
+            f"Deleting user {user.username}: future reservations are released and the history is detached in the background.",
+            "success",
+        )
 
     return redirect(url_for("admin.list_users"))
 
@@ -128,7 +142,16 @@ def edit_user(user_id):
     form = EditUserForm(original_username=user.username, original_email=user.email)
 
     if form.validate_on_submit():
+        # Hash first: a busy hashing pool turns the request away before anything changes
+        try:
+            password = hash_password(form.password.data) if form.password.data else None
+        except TimeoutError:
+            flash("The server is busy right now. Please try again in a moment.", "warning")
+            return render_template("admin/edit_user.html", form=form, user=user), 503
+
         # 1. Update Basic Info
+        if form.username.data != user.username:
+            bump_renamed("user", user.id)  # Feeds show the username
         user.username = form.username.data
         user.email = form.email.data
         user.position = form.position.data
@@ -142,12 +165,13 @@ def edit_user(user_id):
         user.ratio = 0.0 if is_admin_role else ratio_map.get(form.position.data, 0.5)
 
         # 3. Update Password (ONLY if the field was filled out)
-        if form.password.data:
-            user.password = generate_password_hash(form.password.data)
+        if password:
+            user.password = password
             flash(f"Password for {user.username} has been reset.", "info")
 
         try:
             db.session.commit()
+            invalidate_allowances()  # Ratio may have changed
             flash(f"User {user.username} updated successfully.", "success")
             return redirect(url_for("admin.list_users"))
         except Exception as e:
@@ -172,6 +196,8 @@ def edit_server(server_id):
     form = ServerForm()
 
     if form.validate_on_submit():
+        if form.name.data != server.name:
+            bump_renamed("server", server.id)  # Feeds show the server name
         server.name = form.name.data
         server.ip_address = form.ip_address.data
         server.location = form.location.data
@@ -202,7 +228,13 @@ def edit_server(server_id):
         form.cpu_model.data = server.cpu_model
         form.gpu_model.data = server.gpu_model
 
-    return render_template("admin/edit_server.html", form=form, server=server)
+    return render_template(
+        "admin/edit_server.html",
+        form=form,
+        server=server,
+        telemetry=server_telemetry(server.id),
+        agent_token=agent_token(server.id),
+    )
 
 
 # --- Server Management ---
@@ -211,7 +243,12 @@ def edit_server(server_id):
 @admin_bp.route("/servers")
 def list_servers():
     servers = Server.query.all()
-    return render_template("admin/list_servers.html", servers=servers)
+    return render_template(
+        "admin/list_servers.html",
+        servers=servers,
+        deleting=pending_targets("server"),
+        telemetry=fleet_status([s.id for s in servers]),
+    )
 
 
 @admin_bp.route("/servers/create", methods=["GET", "POST"])
@@ -236,9 +273,9 @@ def create_server():
         # Trigger Task: Generate slots immediately for this new server
         # (Pass 'current_app._get_current_object()' if using threaded tasks,
         # but for simple setup, just calling the function works)
-        from flask import current_app
+        from app.tasks import generate_time_slots
 
-        generate_time_slots(current_app, new_server.id, days_ahead=30)
+        generate_time_slots(current_app, new_server.id, days_ahead=30)  # No-op in sparse slot storage
 
         flash(f"Server {new_server.name} initialized with time slots.", "success")
         return redirect(url_for("admin.list_servers"))
@@ -249,12 +286,27 @@ def create_server():
 @admin_bp.route("/servers/delete/<int:server_id>", methods=["POST"])
 def delete_server(server_id):
     server = Server.query.get_or_404(server_id)
-    db.session.delete(server)  # Cascade will handle TimeSlots
-    db.session.commit()
-    flash(f"Server {server.name} deleted.", "success")
+    # TimeSlots and the rest are removed in chunks by a background job (app/deletion.py),
+    # which writes the audit entry once the server is gone
+    start_deletion(current_app._get_current_object(), "server", server_id, server.name, current_user.id)  # type: ignore
+    flash(f"Deleting server {server.name} and its reservations in the background.", "success")
     return redirect(url_for("admin.list_servers"))
 
 
+@admin_bp.route("/deletions")
+@admin_bp.route("/deletions/<job_id>")
+def deletion_status(job_id=None):
+    """
+    Progress of background deletions as JSON: one job, or the recent ones.
+    """
+    if job_id is None:
+        return jsonify(list_jobs())
+    job = get_job(job_id)
+    if job is None:
+        abort(404)
+    return jsonify(job)
+
+
 @admin_bp.route("/servers/<int:server_id>/assign", methods=["GET", "POST"])
 def assign_users(server_id):
     server = Server.query.get_or_404(server_id)
@@ -280,6 +332,7 @@ def assign_users(server_id):
             )
             db.session.execute(stmt)
             db.session.commit()
+            invalidate_allowances()
             flash(f"User {user.username} assigned to {server.name}", "success")
         else:
             flash("User not found.", "danger")
@@ -308,19 +361,13 @@ def unassign_user(server_id, user_id):
     if user in server.users:
         server.users.remove(user)
         db.session.commit()
+        invalidate_allowances()
         flash(f"Removed {user.username} from {server.name}", "warning")
 
     return redirect(url_for("admin.assign_users", server_id=server.id))
 
 
 # --- Master Reservation List ---
-# app/routes/admin.py
-
-from calendar import monthcalendar
-from sqlalchemy import extract
-from datetime import datetime, timedelta
-
-
 @admin_bp.route("/reservations", defaults={"year": None, "month": None})
 @admin_bp.route("/reservations/<int:year>/<int:month>")
 @login_required
@@ -331,17 +378,17 @@ def list_reservations(year, month):
         year = now.year
         month = now.month
 
-    # Navigation Logic
-    current_date = datetime(year, month, 1)
-    prev_date = current_date - timedelta(days=1)
-    next_date = current_date + timedelta(days=32)
+    # Navigation Logic (static per month, cached)
+    grid = month_grid(year, month)
+    month_start = datetime(year, month, 1)
+    next_date = datetime(grid.next_year, grid.next_month, 1)
 
     # Fetch ALL reserved slots for this specific month
     # We join with Server and User to make accessing their names easy
     slots = (
         TimeSlot.query.filter(
-            extract("year", TimeSlot.start_time) == year,  # type: ignore
-            extract("month", TimeSlot.start_time) == month,  # type: ignore
+            TimeSlot.start_time >= month_start,  # type: ignore
+            TimeSlot.start_time < next_date,  # type: ignore
             TimeSlot.reserved_by_user_id != (None),  # noqa: E711
         )
         .join(Server)
@@ -352,6 +399,10 @@ def list_reservations(year, month):
 
     # Group slots by Day Number for the calendar template
     # Format: { 24: [SlotA, SlotB], 25: [SlotC] }
+    if is_archived_month(year, month):
+        # Compacted months live in SlotArchive (see app/archive.py)
+        slots += archived_slots(year, month)
+
     reservations_by_day = {}
     for slot in slots:
         day = slot.start_time.day
@@ -359,49 +410,218 @@ def list_reservations(year, month):
             reservations_by_day[day] = []
         reservations_by_day[day].append(slot)
 
-    # Get the matrix of weeks [ [0,0,1,2...], [3,4,5...] ]
-    month_days = monthcalendar(year, month)
+    # Cached skeleton + per-day cells
+    grid_html = render_grid(
+        year,
+        month,
+        "admin/_reservation_cell.html",
+        ADMIN_CALENDAR_BLANK_CELL,
+        reservations_by_day=reservations_by_day,
+        maintenance_by_day=blocked_servers(year, month),
+    )
 
     return render_template(
         "admin/reservations.html",
-        reservations_by_day=reservations_by_day,
-        month_days=month_days,
+        grid_html=grid_html,
         year=year,
         month=month,
-        current_month_name=current_date.strftime("%B"),
-        prev_month=prev_date.month,
-        prev_year=prev_date.year,
-        next_month=next_date.month,
-        next_year=next_date.year,
+        current_month_name=grid.month_name,
+        prev_month=grid.prev_month,
+        prev_year=grid.prev_year,
+        next_month=grid.next_month,
+        next_year=grid.next_year,
+    )
+
+
+@admin_bp.route("/reservations/<int:year>/<int:month>/stream")
+def reservations_stream(year, month):
+    """
+    Server-Sent Events stream of slot changes on every server for one month.
+    """
+    sub = event_broker.subscribe(month_topic(year, month))
+    return Response(
+        event_broker.stream(sub),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 
 # --- Force Cancel Route ---
 @admin_bp.route("/reservations/cancel/<int:slot_id>", methods=["POST"])
 def force_cancel_reservation(slot_id):
-    slot = TimeSlot.query.get_or_404(slot_id)
+    slot = lock_slot(slot_id)
+    if slot is None:
+        abort(404)
 
     if slot.reserved_by_user:
         user_name = slot.reserved_by_user.username
+        revoked_user_id = slot.reserved_by_user_id
         date_str = slot.start_time.strftime("%Y-%m-%d")
 
-        # Admin Override: Remove the user
-        slot.reserved_by_user_id = None
+        # Admin Override: Remove the user (the next user on the waitlist gets the day, if any)
+        new_owner = release(slot)
         log_action(
             current_user.id,
-            "ADMIN_REVOKE",
+            AuditAction.ADMIN_REVOKE,
             f"Revoked reservation for {user_name} on {date_str}",
+            slot=slot,
+            target_user_id=revoked_user_id,
         )
+        if new_owner:
+            log_action(
+                new_owner.id,
+                AuditAction.WAITLIST_ASSIGN,
+                f"Waitlist: {new_owner.username} received {slot.server.name} for {date_str}",
+                slot=slot,
+            )
         db.session.commit()
 
         flash(
             f"ADMIN OVERRIDE: Reservation for {user_name} on {date_str} has been cancelled.",
             "warning",
         )
+        if new_owner:
+            flash(f"The day was reassigned to {new_owner.username} from the waitlist.", "info")
 
     return redirect(url_for("admin.list_reservations"))
 
 
+# --- Maintenance Windows ---
+@admin_bp.route("/maintenance", methods=["GET", "POST"])
+def maintenance():
+    """
+    Blocks a date range on one or more servers (see app/maintenance.py).
+    """
+    form = MaintenanceForm()
+    form.servers.choices = [
+        (server.id, f"{server.name} ({server.location})" if server.location else server.name)
+        for server in Server.query.order_by(Server.name.asc()).all()  # type: ignore
+    ]
+
+    if form.validate_on_submit():
+        try:
+            result = start_maintenance(
+                form.servers.data,
+                form.start_day.data,
+                form.end_day.data,
+                current_user.id,
+                reason=form.reason.data or None,
+                relocate=form.relocate.data,
+            )
+        except IntegrityError:
+            # Sparse storage: someone booked a day a reservation was being moved to
+            db.session.rollback()
+            flash("A booking changed one of the affected days at the same moment. Please try again.", "danger")
+        else:
+            flash(
+                f"Blocked {form.start_day.data} to {form.end_day.data} on {result['windows']} server(s): "
+                f"{result['cancelled']} reservation(s) cancelled, {result['relocated']} moved to another server.",
+                "warning",
+            )
+            return redirect(url_for("admin.maintenance"))
+
+    return render_template("admin/maintenance.html", form=form, windows=current_windows(), today=datetime.now().date())
+
+
+@admin_bp.route("/maintenance/end", methods=["POST"])
+def end_maintenance_windows():
+    window_ids = request.form.getlist("window_id", type=int)
+    ended = end_maintenance(window_ids, current_user.id) if window_ids else 0
+    if ended:
+        flash(f"Ended {ended} maintenance window(s). The days can be booked again.", "success")
+    else:
+        flash("No maintenance window selected.", "warning")
+    return redirect(url_for("admin.maintenance"))
+
+
+# --- Utilization Analytics ---
+@admin_bp.route("/analytics")
+def analytics():
+    now = datetime.now()
+    year = request.args.get("year", now.year, type=int)
+    month = request.args.get("month", now.month, type=int)
+
+    report = month_report(year, month)
+    current_date = datetime(year, month, 1)
+    prev_date = current_date - timedelta(days=1)
+    next_date = current_date + timedelta(days=32)
+
+    return render_template(
+        "admin/analytics.html",
+        report=report,
+        current_month_name=current_date.strftime("%B"),
+        prev_month=prev_date.month,
+        prev_year=prev_date.year,
+        next_month=next_date.month,
+        next_year=next_date.year,
+    )
+
+
+@admin_bp.route("/heatmap")
+def heatmap():
+    """
+    Server x day occupancy for one month, filterable by location and GPU model.
+    """
+    now = datetime.now()
+    year = request.args.get("year", now.year, type=int)
+    month = request.args.get("month", now.month, type=int)
+    location = request.args.get("location") or None
+    gpu_model = request.args.get("gpu_model") or None
+    if not 1 <= month <= 12 or not 1 < year < 9999:  # The grid links the months on either side
+        abort(404)
+
+    grid = month_grid(year, month)
+    occupancy = get_occupancy(year, month, location, gpu_model)
+    locations, gpu_models = server_filter_options()
+
+    return render_template(
+        "admin/heatmap.html",
+        occupancy=occupancy,
+        server_count=len(occupancy["servers"]),
+        locations=locations,
+        gpu_models=gpu_models,
+        current_month_name=grid.month_name,
+        prev_month=grid.prev_month,
+        prev_year=grid.prev_year,
+        next_month=grid.next_month,
+        next_year=grid.next_year,
+    )
+
+
+@admin_bp.route("/analytics.json")
+def analytics_json():
+    now = datetime.now()
+    year = request.args.get("year", now.year, type=int)
+    month = request.args.get("month", now.month, type=int)
+    return jsonify(month_report(year, month))
+
+
+# --- Request Profiles ---
+@admin_bp.route("/profiles")
+def list_profiles():
+    return render_template(
+        "admin/profiles.html",
+        profiles=request_profiler.recent(),
+        param=current_app.config.get("PROFILER_QUERY_PARAM", "_profile"),
+        sample_rate=current_app.config.get("PROFILER_SAMPLE_RATE", 0.0),
+    )
+
+
+@admin_bp.route("/profiles/<int:profile_id>")
+def view_profile(profile_id):
+    profile = request_profiler.get(profile_id)
+    if profile is None:
+        flash("That profile is no longer in the buffer.", "warning")
+        return redirect(url_for("admin.list_profiles"))
+    return render_template("admin/profile_detail.html", profile=profile)
+
+
+@admin_bp.route("/profiles/clear", methods=["POST"])
+def clear_profiles():
+    request_profiler.clear()
+    return redirect(url_for("admin.list_profiles"))
+
+
 @admin_bp.route("/backup", methods=["POST"])
 def create_backup():
     filename, error = backup_database()
@@ -446,6 +666,7 @@ def manage_server_users(server_id):
             if user not in server.users:
                 server.users.append(user)
                 db.session.commit()
+                invalidate_allowances()
                 flash(f"{user.username} added to {server.name}.", "success")
             else:
                 flash(f"{user.username} is already assigned to this server.", "warning")
@@ -474,6 +695,7 @@ def remove_user_from_server(server_id, user_id):
     if user in server.users:
         server.users.remove(user)
         db.session.commit()
+        invalidate_allowances()
         flash(f"Removed {user.username} from {server.name}.", "success")
 
     return redirect(url_for("admin.manage_server_users", server_id=server_id))
@@ -1,10 +1,10 @@
 # app/routes/auth.py
 from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_user, logout_user, login_required, current_user
-from werkzeug.security import check_password_hash, generate_password_hash
 from app.models import User
 from app.forms import LoginForm, ChangePasswordForm
-from app.extensions import db
+from app.extensions import db, login_limiter
+from app.hashing import hash_password, verify_password, needs_rehash
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -17,10 +17,29 @@ def login():
 
     form = LoginForm()
     if form.validate_on_submit():
+        # Throttle before any DB lookup or hash work
+        if login_limiter.is_limited(request.remote_addr, form.username.data):
+            flash('Too many failed login attempts. Please wait a few minutes and try again.', 'danger')
+            return render_template('auth/login.html', form=form), 429
+
         user = User.query.filter_by(username=form.username.data).first()
         
         # Security Check: Verify user exists AND password is correct
-        if user and check_password_hash(user.password, form.password.data or ""):
+        try:
+            valid = user is not None and verify_password(user.password, form.password.data)
+        except TimeoutError:
+            flash('The server is busy right now. Please try again in a moment.', 'warning')
+            return render_template('auth/login.html', form=form), 503
+
+        if valid:
+            # Upgrade old hashes to the current policy while we have the plain password
+            if needs_rehash(user.password):
+                try:
+                    user.password = hash_password(form.password.data)
+                    db.session.commit()
+                except TimeoutError:
+                    pass  # Keep the old hash; the next login tries again
+
             login_user(user)
             flash(f'Welcome back, {user.username}!', 'success')
             
@@ -31,6 +50,7 @@ def login():
             else:
                 return redirect(next_page) if next_page else redirect(url_for('main.dashboard'))
         else:
+            login_limiter.hit(request.remote_addr, form.username.data)
             flash('Login Unsuccessful. Please check username and password', 'danger')
 
     return render_template('auth/login.html', form=form)
@@ -47,14 +67,18 @@ def logout():
 def change_password():
     form = ChangePasswordForm()
     if form.validate_on_submit():
-        if check_password_hash(current_user.password, form.old_password.data or ""):
-            # Hash the new password before saving
-            hashed_password = generate_password_hash(form.new_password.data or "")
-            current_user.password = hashed_password
-            db.session.commit()
-            flash('Your password has been updated!', 'success')
-            return redirect(url_for('main.profile'))
-        else:
-            flash('Incorrect current password.', 'danger')
+        try:
+            if verify_password(current_user.password, form.old_password.data):
+                # Hash the new password before saving
+                hashed_password = hash_password(form.new_password.data)
+                current_user.password = hashed_password
+                db.session.commit()
+                flash('Your password has been updated!', 'success')
+                return redirect(url_for('main.profile'))
+            else:
+                flash('Incorrect current password.', 'danger')
+        except TimeoutError:
+            flash('The server is busy right now. Please try again in a moment.', 'warning')
+            return render_template('auth/change_password.html', form=form), 503
             
     return render_template('auth/change_password.html', form=form)
\ No newline at end of file
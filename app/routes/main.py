@@ -1,10 +1,14 @@
 # app/routes/main.py
-from flask import Blueprint, render_template, redirect, url_for
+from flask import Blueprint, render_template, redirect, url_for, request, jsonify
 from flask_login import login_required, current_user
 from app.models import Server, TimeSlot
 from datetime import datetime
 from sqlalchemy import desc
 from app.utils import calculate_user_quota_stats
+from app.feeds import feed_token
+from app.extensions import db
+from app.metrics import TELEMETRY_SAMPLES
+from app.telemetry import ingest, parse_samples, read_agent_token
 
 main_bp = Blueprint('main', __name__)
 
@@ -36,7 +40,8 @@ def dashboard():
     return render_template('main/dashboard.html', 
                           servers=assigned_servers, 
                           stats=server_stats,
-                          reservations=upcoming_reservations)
+                          reservations=upcoming_reservations,
+                          feed_url=url_for('reservations.ics_feed', token=feed_token(current_user.id), _external=True))
 
 @main_bp.route('/profile')
 @login_required
@@ -51,4 +56,29 @@ def profile():
             'stats': stats
         })
         
-    return render_template('main/profile.html', server_details=server_details)
\ No newline at end of file
+    return render_template('main/profile.html', server_details=server_details)
+
+
+@main_bp.route('/telemetry/samples', methods=['POST'])
+def telemetry_samples():
+    """
+    Ingestion endpoint for the utilization agents (see app/telemetry.py).
+    The agent authenticates with 'Authorization: Bearer <agent token>' of its server.
+    """
+    # 1. Which server is reporting
+    auth = request.headers.get('Authorization', '')
+    server_id = read_agent_token(auth[len('Bearer '):]) if auth.startswith('Bearer ') else None
+    if server_id is None:
+        return jsonify(error='Invalid agent token'), 401
+    if db.session.get(Server, server_id) is None:
+        return jsonify(error='Unknown server'), 404
+
+    # 2. Validate and store the batch
+    try:
+        samples, dropped = parse_samples(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    stored = ingest(server_id, samples)
+    if dropped:
+        TELEMETRY_SAMPLES.inc('skipped', amount=dropped)
+    return jsonify(stored=stored, skipped=dropped)
@@ -1,14 +1,25 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask import Blueprint, render_template, redirect, url_for, flash, request, Response, abort, current_app, jsonify, stream_with_context
 from flask_login import login_required, current_user
-from datetime import datetime, timedelta, date
-from sqlalchemy import extract
+from datetime import datetime
 from app import db
-from app.models import Server, TimeSlot
-from app.utils import calculate_user_quota_stats, log_action
-from calendar import monthcalendar
+from app.models import AuditAction, Server, TimeSlot, User, WaitlistEntry, user_server
+from app.utils import log_action
+from app.bookings import check_limits, lock_quota, lock_server_days, reserve, release
+from app.slots import create_slot, lock_day, open_days
+from app.archive import archived_slots, is_archived_month
+from app.availability import archive_query, assignment_query, build_availability, slots_query, usernames_query
+from app.extensions import event_broker
+from app.events import server_topic
+from app.calendar_grid import month_grid, render_grid
+from app.metrics import BOOKINGS
+from app.feeds import feed_rows, feed_token, feed_window_start, get_version, read_token, render_ics
+from app.telemetry import server_telemetry
+from app.maintenance import blocked_days, is_blocked
 
 reservations_bp = Blueprint("reservations", __name__)
-MONTHLY_LIMIT = 8
+
+# Padding cell for days outside the month
+CALENDAR_BLANK_CELL = '<div class="card border-0 bg-light opacity-25"></div>'
 
 
 @reservations_bp.route("/reserve", methods=["GET"])
@@ -46,53 +57,168 @@ def calendar(server_id):
         return redirect(url_for("reservations.calendar", server_id=server.id))
     # --------------------------------------------
 
-    # Navigation logic
-    current_date = datetime(year, month, 1)
-    prev_date = current_date - timedelta(days=1)
-    
-    # Logic to get next month date
-    # (Even though user can't reach it via UI, we calculate it for template logic safety)
-    if month == 12:
-        next_date = datetime(year + 1, 1, 1)
-    else:
-        next_date = datetime(year, month + 1, 1)
+    # Navigation logic (static per month, cached)
+    grid = month_grid(year, month)
+    next_date = datetime(grid.next_year, grid.next_month, 1)
 
     # Fetch slots
     slots = TimeSlot.query.filter(
         TimeSlot.server_id == server.id,  # type: ignore
-        extract("year", TimeSlot.start_time) == year,  # type: ignore
-        extract("month", TimeSlot.start_time) == month,  # type: ignore
+        TimeSlot.start_time >= requested_date_start,  # type: ignore
+        TimeSlot.start_time < next_date,  # type: ignore
     ).all()
 
-    # Create dictionary for lookup
+    # Create dictionary for lookup (days without a row may still be free, see open_days)
     days_data = {slot.start_time.day: slot for slot in slots}
+    if is_archived_month(year, month):
+        # Compacted months live in SlotArchive (see app/archive.py)
+        for slot in archived_slots(year, month, server.id):
+            days_data.setdefault(slot.start_time.day, slot)
+
+    # Days this user is waiting for
+    waitlisted_days = {
+        entry.day.day
+        for entry in WaitlistEntry.query.filter(
+            WaitlistEntry.user_id == current_user.id,
+            WaitlistEntry.server_id == server.id,
+            WaitlistEntry.day >= requested_date_start.date(),  # type: ignore
+            WaitlistEntry.day < next_date.date(),  # type: ignore
+        )
+    }
 
-    # Get the matrix of weeks
-    month_days = monthcalendar(year, month)
+    # Cached skeleton + per-day cells
+    grid_html = render_grid(
+        year,
+        month,
+        "reservations/_day_cell.html",
+        CALENDAR_BLANK_CELL,
+        days_data=days_data,
+        open_days=open_days(year, month, today.date()),
+        maintenance_days=blocked_days(server.id, year, month),
+        waitlisted_days=waitlisted_days,
+        today=today.date(),
+        server_id=server.id,
+    )
 
     return render_template(
         "reservations/calendar.html",
         server=server,
-        days_data=days_data,
-        month_days=month_days,
+        grid_html=grid_html,
         year=year,
         month=month,
-        current_month_name=current_date.strftime("%B"),
-        prev_month=prev_date.month,
-        prev_year=prev_date.year,
-        next_month=next_date.month,
-        next_year=next_date.year,
+        current_month_name=grid.month_name,
+        prev_month=grid.prev_month,
+        prev_year=grid.prev_year,
+        next_month=grid.next_month,
+        next_year=grid.next_year,
+        feed_url=url_for("reservations.ics_feed", token=feed_token(current_user.id, server.id), _external=True),
+        telemetry=server_telemetry(server.id, year, month),
+        reserved_days={day for day, slot in days_data.items() if slot.reserved_by_user_id},
     )
 
 
-@reservations_bp.route("/reserve/book/<int:slot_id>", methods=["POST"])
+@reservations_bp.route("/reserve/<int:server_id>/<int:year>/<int:month>/day/<int:day>")
 @login_required
-def book_slot(slot_id):
-    slot = TimeSlot.query.get_or_404(slot_id)
-    target_date = slot.start_time
+def day_cell(server_id, year, month, day):
+    """
+    Renders a single calendar cell (used by the live-update script).
+    """
+    server = Server.query.get_or_404(server_id)
+    if server not in current_user.servers:
+        abort(403)
+
+    try:
+        day_start = datetime(year, month, day)
+    except ValueError:
+        abort(404)
+    slot = TimeSlot.query.filter(
+        TimeSlot.server_id == server.id,  # type: ignore
+        TimeSlot.start_time == day_start,  # type: ignore
+    ).first()
+    waiting = WaitlistEntry.query.filter_by(
+        user_id=current_user.id, server_id=server.id, day=day_start.date()
+    ).first()
+
+    return render_template(
+        "reservations/_day_cell.html",
+        day=day,
+        days_data={day: slot} if slot else {},
+        open_days=open_days(year, month),
+        maintenance_days={day} if is_blocked(server.id, day_start.date()) else set(),
+        waitlisted_days={day} if waiting else set(),
+        today=datetime.now().date(),
+        server_id=server.id,
+        year=year,
+        month=month,
+    )
+
+
+@reservations_bp.route("/reserve/<int:server_id>/<int:year>/<int:month>/availability.json")
+@login_required
+def availability(server_id, year, month):
+    """
+    The month's days as JSON. Served by an async view instead in ASGI mode (app/asgi.py).
+    """
+    if not db.session.execute(assignment_query(current_user.id, server_id)).first():
+        abort(403)
+
+    slot_rows = db.session.execute(slots_query(server_id, year, month)).all()
+    archived_owners, usernames = None, {}
+    if is_archived_month(year, month):
+        archived_owners = db.session.execute(archive_query(server_id, year, month)).scalar()
+        owner_ids = {owner_id for owner_id in archived_owners or () if owner_id}
+        if owner_ids:
+            usernames = dict(db.session.execute(usernames_query(owner_ids)).all())
+
+    return jsonify(
+        build_availability(
+            server_id, year, month, current_user.id, slot_rows, archived_owners, usernames, open_days(year, month),
+            blocked_days(server_id, year, month),
+        )
+    )
+
+
+@reservations_bp.route("/reserve/<int:server_id>/<int:year>/<int:month>/stream")
+@login_required
+def stream(server_id, year, month):
+    """
+    Server-Sent Events stream of slot changes for one server and month.
+    """
+    server = Server.query.get_or_404(server_id)
+    if server not in current_user.servers:
+        abort(403)
+
+    sub = event_broker.subscribe(server_topic(server.id, year, month))
+    return Response(
+        event_broker.stream(sub),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@reservations_bp.route("/reserve/<int:server_id>/book/<int:year>/<int:month>/<int:day>", methods=["POST"])
+@login_required
+def book_slot(server_id, year, month, day):
+    """
+    Books a free day, or cancels the user's own reservation of it.
+    """
+    server = Server.query.get_or_404(server_id)
+    try:
+        target_date = datetime(year, month, day)
+    except ValueError:
+        abort(404)
+
+    # Row lock: concurrent requests for the same day are handled one after another
+    # (after the shared maintenance lock: a window being started on this server goes first)
+    lock_server_days([server.id])
+    slot = lock_day(server.id, target_date)
+    if slot is None and day not in open_days(year, month):
+        BOOKINGS.inc("not_found")
+        abort(404)
 
     # 1. Check Access
-    if slot.server not in current_user.servers:
+    if server not in current_user.servers:
+        BOOKINGS.inc("access_denied")
         flash("Access Denied.", "danger")
         return redirect(url_for("main.dashboard"))
 
@@ -100,11 +226,12 @@ def book_slot(slot_id):
     today_now = datetime.now()
     # Check if target date is in a future month relative to today
     if target_date.year > today_now.year or (target_date.year == today_now.year and target_date.month > today_now.month):
+        BOOKINGS.inc("future_month")
         flash("Booking Failed: Reservations are only open for the current month.", "danger")
         return redirect(
             url_for(
                 "reservations.calendar",
-                server_id=slot.server_id,
+                server_id=server.id,
                 year=today_now.year,
                 month=today_now.month,
             )
@@ -112,7 +239,7 @@ def book_slot(slot_id):
     # ----------------------------------------------------
 
     # 2. Check if already taken (and handle cancellation)
-    if slot.reserved_by_user_id:
+    if slot and slot.reserved_by_user_id:
         if slot.reserved_by_user_id == current_user.id:
 
             # Prevent cancelling past/current reservations
@@ -120,98 +247,187 @@ def book_slot(slot_id):
             slot_date = slot.start_time.date()
 
             if slot_date < today_date:
+                BOOKINGS.inc("cancel_past")
                 flash("You cannot cancel a reservation that has already passed.", "danger")
             elif slot_date == today_date:
+                BOOKINGS.inc("cancel_today")
                 flash("You cannot cancel a reservation for the current day.", "warning")
             else:
-                # Cancel logic
-                slot.reserved_by_user_id = None
+                # Cancel logic (the next user on the waitlist gets the day, if any)
+                new_owner = release(slot)
                 log_action(
                     current_user.id,
-                    "CANCEL_SLOT",
-                    f"Cancelled reservation for {slot.server.name} on {target_date.strftime('%Y-%m-%d')}",
+                    AuditAction.CANCEL_SLOT,
+                    f"Cancelled reservation for {server.name} on {target_date.strftime('%Y-%m-%d')}",
+                    slot=slot,
                 )
+                if new_owner:
+                    log_action(
+                        new_owner.id,
+                        AuditAction.WAITLIST_ASSIGN,
+                        f"Waitlist: {new_owner.username} received {server.name} for {target_date.strftime('%Y-%m-%d')}",
+                        slot=slot,
+                    )
                 db.session.commit()
+                BOOKINGS.inc("cancelled_reassigned" if new_owner else "cancelled")
                 flash("Reservation Cancelled. Quota restored.", "info")
 
         else:
+            BOOKINGS.inc("taken")
             flash("This day is already reserved.", "danger")
 
         return redirect(
             url_for(
                 "reservations.calendar",
-                server_id=slot.server_id,
+                server_id=server.id,
                 year=target_date.year,
                 month=target_date.month,
             )
         )
 
-    # 3. Monthly Limit Check (Hard limit: 8 days per month)
-    monthly_count = TimeSlot.query.filter(
-        TimeSlot.server_id == slot.server_id,  # type: ignore
-        TimeSlot.reserved_by_user_id == current_user.id,
-        extract("year", TimeSlot.start_time) == target_date.year,  # type: ignore
-        extract("month", TimeSlot.start_time) == target_date.month,  # type: ignore
-    ).count()
+    # Days under a maintenance window can't be booked (see app/maintenance.py)
+    if is_blocked(server.id, target_date.date()):
+        BOOKINGS.inc("maintenance")
+        flash("This day is blocked for server maintenance.", "warning")
+        return redirect(url_for("reservations.calendar", server_id=server.id, year=year, month=month))
 
-    if monthly_count >= MONTHLY_LIMIT:
-        flash(
-            f"Monthly Quota Reached: You cannot book more than {MONTHLY_LIMIT} days per month. (Used: {monthly_count}/8)",
-            "danger",
-        )
+    # 3. Monthly & Weekly Limit Checks (held under a per-user/server lock until the commit)
+    lock_quota(current_user.id, server.id)
+    blocked = check_limits(current_user.id, server.id, target_date)
+    if blocked:
+        reason, message = blocked
+        BOOKINGS.inc(reason)
+        flash(message, "danger" if reason == "quota" else "warning")
         return redirect(
             url_for(
                 "reservations.calendar",
-                server_id=slot.server_id,
+                server_id=server.id,
                 year=target_date.year,
                 month=target_date.month,
             )
         )
 
-    # 4. Weekly Limit Check (Hard limit: 2 days per week, starting Sunday)
-    days_to_subtract = (target_date.weekday() + 1) % 7
-    start_of_week = target_date - timedelta(days=days_to_subtract)
-    end_of_week = start_of_week + timedelta(days=6)
-
-    start_of_week = start_of_week.replace(hour=0, minute=0, second=0)
-    end_of_week = end_of_week.replace(hour=23, minute=59, second=59)
-
-    weekly_count = TimeSlot.query.filter(
-        TimeSlot.server_id == slot.server_id,  # type: ignore
-        TimeSlot.reserved_by_user_id == current_user.id,
-        TimeSlot.start_time >= start_of_week,  # type: ignore
-        TimeSlot.start_time <= end_of_week,  # type: ignore
-    ).count()
-
-    if weekly_count >= 2:
-        flash(
-            f"Weekly Limit Reached: You can only book 2 days per week (Sun-Sat).",
-            "warning",
-        )
-        return redirect(
-            url_for(
-                "reservations.calendar",
-                server_id=slot.server_id,
-                year=target_date.year,
-                month=target_date.month,
-            )
-        )
+    # 4. Book the slot (sparse storage: insert the day's row first)
+    if slot is None:
+        slot = create_slot(server.id, target_date)
+        if slot is None or slot.reserved_by_user_id:
+            # Someone else booked the same free day a moment earlier
+            BOOKINGS.inc("taken")
+            flash("This day is already reserved.", "danger")
+            return redirect(url_for("reservations.calendar", server_id=server.id, year=year, month=month))
 
-    # 5. Book the slot
-    slot.reserved_by_user_id = current_user.id
+    reserve(slot, current_user.id)
     log_action(
         current_user.id,
-        "BOOK_SLOT",
-        f"Reserved {slot.server.name} for {target_date.strftime('%Y-%m-%d')}",
+        AuditAction.BOOK_SLOT,
+        f"Reserved {server.name} for {target_date.strftime('%Y-%m-%d')}",
+        slot=slot,
     )
     db.session.commit()
+    BOOKINGS.inc("booked")
     flash(f"Successfully reserved {target_date.strftime('%Y-%m-%d')}", "success")
 
     return redirect(
         url_for(
             "reservations.calendar",
-            server_id=slot.server_id,
+            server_id=server.id,
             year=target_date.year,
             month=target_date.month,
         )
-    )
\ No newline at end of file
+    )
+
+
+@reservations_bp.route("/reserve/waitlist/<int:slot_id>", methods=["POST"])
+@login_required
+def toggle_waitlist(slot_id):
+    """
+    Joins (or leaves) the waitlist for a day someone else has reserved.
+    """
+    slot = TimeSlot.query.get_or_404(slot_id)
+    target_date = slot.start_time
+    redirect_url = url_for(
+        "reservations.calendar",
+        server_id=slot.server_id,
+        year=target_date.year,
+        month=target_date.month,
+    )
+
+    if slot.server not in current_user.servers:
+        flash("Access Denied.", "danger")
+        return redirect(url_for("main.dashboard"))
+
+    entry = WaitlistEntry.query.filter_by(
+        user_id=current_user.id, server_id=slot.server_id, day=target_date.date()
+    ).first()
+
+    if entry:
+        db.session.delete(entry)
+        db.session.commit()
+        flash(f"You left the waitlist for {target_date.strftime('%Y-%m-%d')}.", "info")
+        return redirect(redirect_url)
+
+    # Only days that are taken by someone else and can still be released
+    if not slot.reserved_by_user_id or slot.reserved_by_user_id == current_user.id:
+        flash("This day is not reserved by another user.", "warning")
+    elif target_date.date() <= datetime.now().date():
+        flash("You can only join the waitlist for upcoming days.", "warning")
+    else:
+        db.session.add(WaitlistEntry(current_user.id, slot.server_id, target_date.date()))
+        db.session.commit()
+        flash(
+            f"You joined the waitlist for {target_date.strftime('%Y-%m-%d')}. "
+            "If it is released, it will be booked for you automatically.",
+            "success",
+        )
+
+    return redirect(redirect_url)
+
+
+@reservations_bp.route("/feeds/<token>.ics")
+def ics_feed(token):
+    """
+    Subscribable iCalendar feed (no login: the signed token identifies the user).
+    Answers 304 while the reservation version in the ETag is unchanged.
+    """
+    ids = read_token(token)
+    if ids is None:
+        abort(404)
+    user_id, server_id = ids
+
+    user = db.session.get(User, user_id)
+    if user is None:
+        abort(404)
+    if server_id is not None:
+        server = db.session.get(Server, server_id)
+        assigned = db.session.execute(
+            db.select(user_server.c.user_id).where(
+                user_server.c.user_id == user_id, user_server.c.server_id == server_id
+            )
+        ).first()
+        if server is None or not (assigned or user.is_admin):
+            abort(404)
+
+    # The feed window starts ICS_FEED_PAST_DAYS ago, so it moves once a day as well
+    today = datetime.now().date()
+    if server_id is None:
+        etag = f"user-{user_id}-v{get_version('user', user_id)}-{today:%Y%m%d}"
+    else:
+        etag = f"server-{server_id}-v{get_version('server', server_id)}-{today:%Y%m%d}"
+
+    max_age = current_app.config.get("ICS_FEED_MAX_AGE", 300)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        since = feed_window_start(today)
+        if server_id is None:
+            rows = feed_rows(user_id=user_id, since=since)
+            body = render_ics(rows, f"My reservations ({user.username})", "{name}", request.host)
+        else:
+            rows = feed_rows(server_id=server_id, since=since)
+            body = render_ics(rows, f"{server.name} bookings", f"{server.name}: {{name}}", request.host)
+        response = Response(stream_with_context(body), mimetype="text/calendar")
+        response.headers["Content-Disposition"] = "inline; filename=reservations.ics"
+
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = f"private, max-age={max_age}"
+    return response
@@ -0,0 +1,240 @@
+import random
+import time
+from array import array
+from datetime import datetime, timedelta
+
+import click
+from flask.cli import with_appcontext
+
+# Synthetic data generator for reproducing production-scale problems locally.
+# Every table is produced by a generator and written with chunked executemany
+# INSERTs, so memory stays flat no matter how many rows are generated.
+
+# (position, ratio, share of users)
+POSITIONS = [
+    ("UG", 0.25, 0.35),
+    ("PG", 0.5, 0.30),
+    ("TA", 1.0, 0.15),
+    ("RA", 1.5, 0.12),
+    ("Professor", 2.0, 0.08),
+]
+GPU_MODELS = ["A100", "H100", "L40S", "RTX 4090", "V100"]
+LOCATIONS = ["Lab A", "Lab B", "Lab C", "Data Center 1", "Data Center 2"]
+
+
+def _chunked_insert(table, rows, chunk_size, label):
+    """
+    Streams rows from a generator into the table, committing every chunk.
+    Returns the number of rows written.
+    """
+    from app.extensions import db
+
+    started = time.perf_counter()
+    total = 0
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            db.session.execute(table.insert(), chunk)
+            db.session.commit()
+            total += len(chunk)
+            chunk = []
+            click.echo(f"\r  {label}: {total:,} rows", nl=False)
+    if chunk:
+        db.session.execute(table.insert(), chunk)
+        db.session.commit()
+        total += len(chunk)
+
+    elapsed = time.perf_counter() - started
+    click.echo(f"\r  {label}: {total:,} rows in {elapsed:.1f}s ({total / max(elapsed, 1e-9):,.0f} rows/s)")
+    return total
+
+
+def _month_start(day):
+    return day.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def seed_database(
+    n_users,
+    n_servers,
+    months,
+    servers_per_user=3,
+    booking_rate=0.6,
+    extra_logs=1,
+    chunk_size=10000,
+    prefix="seed",
+    seed=42,
+):
+    """
+    Generates users, servers, assignments, daily TimeSlots for the last 'months' months
+    (the rest of the current month is left free; sparse slot storage only gets the
+    reserved days) and an AuditLog trail.
+    Must run inside an app context. Returns row counts per table.
+    """
+    from app.extensions import db
+    from app.models import AuditLog, Server, TimeSlot, User, user_server
+    from app.analytics import rebuild_rollups
+    from app.slots import sparse_storage
+    from app.quota import reconcile_used_quota
+    from werkzeug.security import generate_password_hash
+
+    rng = random.Random(seed)
+    servers_per_user = min(servers_per_user, n_servers)
+    db.create_all()
+
+    # SQLite: trade durability for speed while bulk loading
+    if db.engine.dialect.name == "sqlite":
+        db.session.execute(db.text("PRAGMA synchronous=OFF"))
+        db.session.execute(db.text("PRAGMA journal_mode=WAL"))
+
+    password = generate_password_hash("seed-password")  # One hash reused for every user
+    totals = {}
+
+    # 1. Users. Ratios are kept in a compact float array (4 bytes per user)
+    ratios = array("f")
+    cumulative = []
+    share_total = 0.0
+    for position, ratio, share in POSITIONS:
+        share_total += share
+        cumulative.append((share_total, position, ratio))
+
+    def users():
+        for i in range(n_users):
+            roll = rng.random() * share_total
+            position, ratio = next((p, r) for limit, p, r in cumulative if roll <= limit)
+            ratios.append(ratio)
+            yield {"username": f"{prefix}_user{i}", "email": f"{prefix}_user{i}@example.com",
+                   "password": password, "position": position, "ratio": ratio,
+                   "resource_needed": "GPU", "is_admin": False}
+
+    totals["user"] = _chunked_insert(User.__table__, users(), chunk_size, "users")
+    first_user_id = db.session.execute(
+        db.select(User.id).where(User.username == f"{prefix}_user0")
+    ).scalar()
+
+    # 2. Servers
+    def servers():
+        for i in range(n_servers):
+            yield {"name": f"{prefix}-gpu{i:05d}", "ip_address": f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}",
+                   "location": LOCATIONS[i % len(LOCATIONS)], "hdd_size": 4000, "ssd_size": 2000,
+                   "ram_size": rng.choice([128, 256, 512]), "vram_size": rng.choice([24, 48, 80]),
+                   "cpu_model": "AMD EPYC", "gpu_model": rng.choice(GPU_MODELS)}
+
+    totals["server"] = _chunked_insert(Server.__table__, servers(), chunk_size, "servers")
+    first_server_id = db.session.execute(
+        db.select(Server.id).where(Server.name == f"{prefix}-gpu00000")
+    ).scalar()
+
+    # 3. Assignments, computed arithmetically so nothing has to be kept in memory:
+    #    user u works on servers (u + j * stride) % n_servers for j < servers_per_user
+    stride = max(1, n_servers // max(servers_per_user, 1))
+
+    def assignments():
+        for u in range(n_users):
+            for j in range(servers_per_user):
+                yield {"user_id": first_user_id + u, "server_id": first_server_id + (u + j * stride) % n_servers,
+                       "MAX_QUOTA": 0, "used_quota": 0}
+
+    totals["user_server"] = _chunked_insert(user_server, assignments(), chunk_size, "assignments")
+
+    def random_user_for(server_index):
+        """
+        Picks an assigned user for the server, favouring higher ratios (rejection sampling).
+        """
+        while True:
+            j = rng.randrange(servers_per_user)
+            base = (server_index - j * stride) % n_servers
+            if base >= n_users:
+                return None
+            u = base + n_servers * rng.randrange((n_users - 1 - base) // n_servers + 1)
+            if rng.random() * 2.0 <= ratios[u]:
+                return u
+
+    # 4. Slots + audit trail, generated day by day for every server
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    first_day = _month_start(today)
+    for _ in range(months):
+        first_day = _month_start(first_day - timedelta(days=1))
+    month_end = _month_start(today.replace(day=28) + timedelta(days=4))
+
+    logs_written = [0]
+    store_free_days = not sparse_storage()
+
+    def slots_and_logs():
+        day = first_day
+        while day < month_end:
+            # Busier on weekdays and in the middle of term
+            rate = booking_rate * (1.0 if day.weekday() < 5 else 0.5) * (0.7 if day.month in (7, 8, 12) else 1.0)
+            for s in range(n_servers):
+                owner = None
+                if day <= today and n_users and rng.random() < rate:
+                    u = random_user_for(s)
+                    owner = None if u is None else first_user_id + u
+                if owner or store_free_days:
+                    yield "slot", {"start_time": day, "end_time": day + timedelta(seconds=86399),
+                                   "server_id": first_server_id + s, "reserved_by_user_id": owner}
+                if owner:
+                    stamp = day - timedelta(days=rng.randint(0, 20), minutes=rng.randint(0, 1439))
+                    yield "log", {"timestamp": stamp, "user_id": owner, "action": "BOOK_SLOT",
+                                  "details": f"Reserved {prefix}-gpu{s:05d} for {day:%Y-%m-%d}",
+                                  "server_id": first_server_id + s, "day": day.date()}
+                    for _ in range(extra_logs):
+                        # Earlier booking attempts by someone else that were cancelled
+                        other = random_user_for(s)
+                        if other is not None:
+                            yield "log", {"timestamp": stamp - timedelta(hours=1), "user_id": first_user_id + other,
+                                          "action": "CANCEL_SLOT",
+                                          "details": f"Cancelled reservation for {prefix}-gpu{s:05d} on {day:%Y-%m-%d}",
+                                          "server_id": first_server_id + s, "day": day.date()}
+            day += timedelta(days=1)
+
+    def slot_rows():
+        # Slots and logs come from one generator: slots are streamed to the caller,
+        # logs are flushed to AuditLog every chunk_size rows along the way
+        pending_logs = []
+        for kind, row in slots_and_logs():
+            if kind == "slot":
+                yield row
+                continue
+            pending_logs.append(row)
+            if len(pending_logs) >= chunk_size:
+                db.session.execute(AuditLog.__table__.insert(), pending_logs)
+                logs_written[0] += len(pending_logs)
+                pending_logs = []
+        if pending_logs:
+            db.session.execute(AuditLog.__table__.insert(), pending_logs)
+            logs_written[0] += len(pending_logs)
+
+    totals["time_slot"] = _chunked_insert(TimeSlot.__table__, slot_rows(), chunk_size, "time slots")
+    db.session.commit()
+    totals["audit_log"] = logs_written[0]
+    click.echo(f"  audit logs: {logs_written[0]:,} rows")
+
+    # 5. Derived tables
+    click.echo("  rebuilding usage rollups and quota counters...")
+    rebuild_rollups()
+    reconcile_used_quota()
+
+    return totals
+
+
+@click.command("seed")
+@click.option("--users", default=1000, show_default=True, help="Number of users.")
+@click.option("--servers", default=50, show_default=True, help="Number of servers.")
+@click.option("--months", default=12, show_default=True, help="Months of booking history.")
+@click.option("--servers-per-user", default=3, show_default=True)
+@click.option("--booking-rate", default=0.6, show_default=True, help="Share of past server-days that are booked.")
+@click.option("--extra-logs", default=1, show_default=True, help="Extra audit rows per booking (cancelled attempts).")
+@click.option("--chunk-size", default=10000, show_default=True, help="Rows per INSERT batch.")
+@click.option("--prefix", default="seed", show_default=True, help="Prefix for generated names (must be unused).")
+@click.option("--seed", "random_seed", default=42, show_default=True, help="Random seed.")
+@with_appcontext
+def seed_command(users, servers, months, servers_per_user, booking_rate, extra_logs, chunk_size, prefix, random_seed):
+    """Fill the database with synthetic users, servers, bookings and audit logs."""
+    started = time.perf_counter()
+    totals = seed_database(
+        users, servers, months,
+        servers_per_user=servers_per_user, booking_rate=booking_rate, extra_logs=extra_logs,
+        chunk_size=chunk_size, prefix=prefix, seed=random_seed,
+    )
+    click.echo(f"Done in {time.perf_counter() - started:.1f}s: " + ", ".join(f"{k}={v:,}" for k, v in totals.items()))
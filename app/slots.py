@@ -0,0 +1,151 @@
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy.exc import IntegrityError
+
+from app.extensions import db
+from app.models import TimeSlot
+
+# Slot storage modes (SLOT_STORAGE):
+#   dense  - tasks.generate_time_slots creates a TimeSlot row for every server-day
+#            ahead of time; a day can be booked if its row exists.
+#   sparse - only reserved days have a row (unique per server and day). Free days
+#            are synthesized from the booking horizon, a row is inserted when a day
+#            is booked and deleted again when it is released.
+# Reads work the same in both modes, so a database can be converted at any time.
+
+
+def sparse_storage():
+    return current_app.config.get("SLOT_STORAGE", "dense") == "sparse"
+
+
+def day_start(day):
+    return datetime(day.year, day.month, day.day)
+
+
+def open_days(year, month, today=None):
+    """
+    Days of the month that can be booked without an existing row (sparse mode):
+    today up to SLOT_BOOKING_HORIZON_DAYS ahead. Empty set in dense mode.
+    """
+    if not sparse_storage():
+        return set()
+
+    today = today or datetime.now().date()
+    horizon = today + timedelta(days=current_app.config.get("SLOT_BOOKING_HORIZON_DAYS", 30))
+    first = datetime(year, month, 1).date()
+    last = (datetime(year, month, 28) + timedelta(days=4)).replace(day=1).date()
+    start, end = max(first, today), min(last, horizon)
+    return {start.day + i for i in range((end - start).days)} if start < end else set()
+
+
+def lock_day(server_id, day):
+    """
+    The slot row for the server and day, locked FOR UPDATE, or None if there is none.
+    """
+    return (
+        TimeSlot.query.filter_by(server_id=server_id, start_time=day_start(day))
+        .with_for_update()
+        .first()
+    )
+
+
+def create_slot(server_id, day):
+    """
+    Inserts the row for a free day (sparse mode) inside a savepoint. If a concurrent
+    booking inserted it first, the unique key rejects ours and the winner's row is
+    returned instead, locked, so the caller sees it as taken (None if it is gone again).
+    """
+    start = day_start(day)
+    try:
+        with db.session.begin_nested():
+            slot = TimeSlot(start_time=start, end_time=start + timedelta(seconds=86399), server_id=server_id)
+            db.session.add(slot)
+        return slot
+    except IntegrityError:
+        return lock_day(server_id, day)
+
+
+def discard_if_empty(slot):
+    """
+    Sparse mode: deletes a row nobody holds any more. Dense mode keeps it as a free day.
+    """
+    if sparse_storage() and slot.reserved_by_user_id is None:
+        db.session.delete(slot)
+
+
+# --- Migration ---
+
+slots_cli = AppGroup("slots", help="Slot storage maintenance.")
+
+
+def _table_stats():
+    total = db.session.query(db.func.count(TimeSlot.id)).scalar()
+    reserved = db.session.query(db.func.count(TimeSlot.id)).filter(TimeSlot.reserved_by_user_id.isnot(None)).scalar()  # type: ignore
+    return total, reserved
+
+
+def convert_to_sparse(chunk_size=10000):
+    """
+    Deletes every unreserved TimeSlot row in chunks (one short transaction each) and
+    adds the unique (server_id, start_time) index. Returns the number of rows deleted.
+    """
+    table = TimeSlot.__table__
+    deleted = 0
+    while True:
+        ids = db.select(table.c.id).where(table.c.reserved_by_user_id.is_(None)).limit(chunk_size)
+        result = db.session.execute(table.delete().where(table.c.id.in_(ids.scalar_subquery())))
+        db.session.commit()
+        if not result.rowcount:
+            break
+        deleted += result.rowcount
+        click.echo(f"\r  deleted {deleted:,} empty rows", nl=False)
+    click.echo("")
+
+    # Reserved rows should already be one per server-day; refuse to guess if not
+    duplicates = db.session.execute(
+        db.select(table.c.server_id, table.c.start_time)
+        .group_by(table.c.server_id, table.c.start_time)
+        .having(db.func.count() > 1)
+        .limit(5)
+    ).all()
+    if duplicates:
+        raise click.ClickException(f"Duplicate reservations for the same server and day, fix these first: {duplicates}")
+
+    for index in table.indexes:
+        if index.name == "uq_time_slot_server_day":
+            index.create(db.engine, checkfirst=True)
+    return deleted
+
+
+@slots_cli.command("convert-sparse")
+@click.option("--chunk-size", default=10000, show_default=True, help="Rows deleted per transaction.")
+def convert_sparse_command(chunk_size):
+    """Drop empty TimeSlot rows and add the unique (server, day) key."""
+    started = time.perf_counter()
+    before, reserved = _table_stats()
+    click.echo(f"time_slot: {before:,} rows, {reserved:,} reserved")
+
+    deleted = convert_to_sparse(chunk_size)
+
+    after, _ = _table_stats()
+    click.echo(f"Deleted {deleted:,} rows in {time.perf_counter() - started:.1f}s; {after:,} rows left.")
+    if db.engine.dialect.name == "sqlite":
+        click.echo("Run VACUUM to return the freed pages to the file system.")
+    if not sparse_storage():
+        click.echo("Now set SLOT_STORAGE=sparse, or free days will not be bookable.")
+
+
+@slots_cli.command("compact")
+@click.option("--chunk-size", default=5000, show_default=True, help="Rows deleted per transaction.")
+def compact_command(chunk_size):
+    """Move months older than SLOT_ARCHIVE_AFTER_MONTHS into the archive table."""
+    from app.archive import archive_cutoff, compact_history
+
+    started = time.perf_counter()
+    click.echo(f"Compacting months before {archive_cutoff():%Y-%m}")
+    months, deleted = compact_history(chunk_size)
+    click.echo(f"Archived {months:,} server-months, deleted {deleted:,} rows in {time.perf_counter() - started:.1f}s.")
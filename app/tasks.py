@@ -1,13 +1,19 @@
 from datetime import datetime, timedelta, time
-from app.extensions import db
-from app.models import Server, TimeSlot, user_server
+from app.extensions import db, get_scheduler
+from app.models import Server, TimeSlot
+from app.metrics import timed_job
 
+@timed_job
 def generate_time_slots(app, server_id, days_ahead=30):
     """
     Generates FULL DAY time slots for a specific server for X days ahead.
     Each slot runs from 00:00:00 to 23:59:59 of that day.
+    Does nothing in sparse slot storage, where free days are not stored.
     """
     with app.app_context():
+        if app.config.get("SLOT_STORAGE") == "sparse":
+            return
+
         server = Server.query.get(server_id)
         if not server:
             return
@@ -56,16 +62,108 @@ def generate_time_slots(app, server_id, days_ahead=30):
                 db.session.rollback()
                 print(f"Error generating slots: {e}")
 
-def reset_user_quotas(app):
+@timed_job
+def rebuild_usage_rollups(app):
+    """
+    Nightly job: rebuilds the utilization rollup table from TimeSlot,
+    repairing any drift from the incremental book/cancel updates.
+    """
+    from app.analytics import rebuild_rollups
+
+    with app.app_context():
+        try:
+            rows = rebuild_rollups()
+            print(f"Rebuilt {rows} usage rollup rows.")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error rebuilding usage rollups: {e}")
+
+
+@timed_job
+def reconcile_quota_counters(app):
     """
-    Resets the 'used_quota' column for all users to 0.
+    Nightly job: recounts this month's bookings and repairs drifted used_quota values.
     """
+    from app.quota import reconcile_used_quota
+
     with app.app_context():
         try:
-            stmt = user_server.update().values(used_quota=0)
-            db.session.execute(stmt)
-            db.session.commit()
-            print("All user quotas have been reset.")
+            corrected = reconcile_used_quota()
+            print(f"Quota reconciliation corrected {corrected} rows.")
         except Exception as e:
             db.session.rollback()
-            print(f"Error resetting quotas: {e}")
\ No newline at end of file
+            print(f"Error reconciling quotas: {e}")
+
+
+@timed_job
+def compact_slot_history(app):
+    """
+    Monthly job: moves completed months out of TimeSlot into the SlotArchive table.
+    """
+    from app.archive import compact_history
+
+    with app.app_context():
+        try:
+            months, deleted = compact_history(app.config.get("DELETE_CHUNK_SIZE", 5000))
+            print(f"Compacted {months} server-months ({deleted} slot rows) into the archive.")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error compacting slot history: {e}")
+
+
+@timed_job
+def resume_deletions(app):
+    """
+    Every minute: runs again the background deletions whose worker died mid-job.
+    """
+    from app.deletion import resume_abandoned
+
+    with app.app_context():
+        try:
+            resumed = resume_abandoned(app)
+            if resumed:
+                print(f"Resumed deletion jobs: {', '.join(resumed)}")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error resuming deletions: {e}")
+
+
+def register_jobs(app):
+    """
+    Registers the recurring background jobs with the scheduler.
+    """
+    scheduler = get_scheduler()
+
+    scheduler.add_job(
+        id="rebuild_usage_rollups",
+        func=rebuild_usage_rollups,
+        args=[app],
+        trigger="cron",
+        hour=2,
+        replace_existing=True,
+    )
+    scheduler.add_job(
+        id="reconcile_quota_counters",
+        func=reconcile_quota_counters,
+        args=[app],
+        trigger="cron",
+        hour=3,
+        replace_existing=True,
+    )
+    scheduler.add_job(
+        id="compact_slot_history",
+        func=compact_slot_history,
+        args=[app],
+        trigger="cron",
+        day=1,
+        hour=4,
+        replace_existing=True,
+    )
+    scheduler.add_job(
+        id="resume_deletions",
+        func=resume_deletions,
+        args=[app],
+        trigger="interval",
+        minutes=1,
+        replace_existing=True,
+    )
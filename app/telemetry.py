@@ -0,0 +1,409 @@
+import json
+import math
+import random
+import sys
+import time
+import urllib.request
+from array import array
+from collections import namedtuple
+from datetime import datetime
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from itsdangerous import BadSignature, URLSafeSerializer
+from sqlalchemy.exc import IntegrityError
+
+from app.extensions import db
+from app.metrics import TELEMETRY_SAMPLES
+from app.models import Server, ServerTelemetry
+
+# Utilization telemetry pushed by an agent on each server (POST /telemetry/samples,
+# simulated by `flask telemetry agent`). Per server, one ServerTelemetry row holds three
+# fixed-size ring buffers, each a flat array of doubles stored as a blob: the last raw
+# samples, one slot per minute and one slot per hour. A rollup slot is addressed by
+# time ((timestamp // step) % slots) and reset when a newer bucket claims it, so the
+# storage never grows and needs no cleanup job, and the pages read two blobs instead
+# of scanning samples.
+
+METRICS = ("gpu", "cpu", "ram")  # Utilization in percent
+
+Sample = namedtuple("Sample", ["timestamp", "gpu", "cpu", "ram"])
+Bucket = namedtuple("Bucket", ["start", "samples", "gpu", "cpu", "ram", "gpu_max", "cpu_max", "ram_max"])
+
+
+# --- Ring Buffers ---
+
+
+def _load(blob, length):
+    """
+    array('d') of exactly length values from a stored blob; zeros if the blob is
+    missing or was written with another size (the ring starts over).
+    """
+    data = array("d")
+    if blob and len(blob) == length * data.itemsize:
+        data.frombytes(blob)
+        if sys.byteorder == "big":
+            data.byteswap()
+        return data
+    return array("d", bytes(length * data.itemsize))
+
+
+def _dump(data):
+    if sys.byteorder == "big":
+        data = array("d", data)
+        data.byteswap()
+    return data.tobytes()
+
+
+class SampleRing:
+    """
+    The last `slots` raw samples in arrival order; the oldest is overwritten.
+    Slot layout: timestamp, then one value per metric (timestamp 0 = empty).
+    """
+
+    WIDTH = 1 + len(METRICS)
+
+    def __init__(self, slots, blob=None, head=0):
+        self.slots = slots
+        self.data = _load(blob, slots * self.WIDTH)
+        self.head = head % slots if blob and len(blob) == len(self.data) * self.data.itemsize else 0
+
+    def append(self, sample):
+        offset = self.head * self.WIDTH
+        self.data[offset:offset + self.WIDTH] = array("d", sample)
+        self.head = (self.head + 1) % self.slots
+
+    def samples(self):
+        """
+        Stored samples, oldest first.
+        """
+        result = []
+        for slot in list(range(self.head, self.slots)) + list(range(self.head)):
+            offset = slot * self.WIDTH
+            if self.data[offset]:
+                result.append(Sample(*self.data[offset:offset + self.WIDTH]))
+        return result
+
+    def to_bytes(self):
+        return _dump(self.data)
+
+
+class RollupRing:
+    """
+    One slot per `step` seconds covering the last slots * step seconds. Slot layout:
+    bucket start, sample count, the sum of each metric, the max of each metric.
+    """
+
+    WIDTH = 2 + 2 * len(METRICS)
+
+    def __init__(self, step, slots, blob=None):
+        self.step = step
+        self.slots = slots
+        self.data = _load(blob, slots * self.WIDTH)
+
+    def add(self, sample):
+        start = sample.timestamp - sample.timestamp % self.step
+        offset = int(start // self.step) % self.slots * self.WIDTH
+        current = self.data[offset]
+        if current > start:
+            return  # Older than the window: the slot already belongs to a newer bucket
+        if current < start:
+            self.data[offset:offset + self.WIDTH] = array("d", [start] + [0.0] * (self.WIDTH - 1))
+
+        n = len(METRICS)
+        self.data[offset + 1] += 1
+        for index, value in enumerate(sample[1:]):
+            self.data[offset + 2 + index] += value
+            self.data[offset + 2 + n + index] = max(self.data[offset + 2 + n + index], value)
+
+    def buckets(self, since):
+        """
+        Buckets that started after `since` (unix time), oldest first.
+        """
+        n = len(METRICS)
+        result = []
+        for offset in range(0, len(self.data), self.WIDTH):
+            start, count = self.data[offset], self.data[offset + 1]
+            if count and start > since:
+                sums = self.data[offset + 2:offset + 2 + n]
+                maxes = self.data[offset + 2 + n:offset + 2 + 2 * n]
+                result.append(Bucket(start, int(count), *(s / count for s in sums), *maxes))
+        result.sort()
+        return result
+
+    def to_bytes(self):
+        return _dump(self.data)
+
+
+def _minute_ring(blob=None):
+    return RollupRing(60, current_app.config.get("TELEMETRY_MINUTE_SLOTS", 1440), blob)
+
+
+def _hour_ring(blob=None):
+    return RollupRing(3600, current_app.config.get("TELEMETRY_HOUR_SLOTS", 720), blob)
+
+
+# --- Ingestion ---
+
+
+def parse_samples(payload, now=None):
+    """
+    Sample tuples from an agent's JSON body: {"samples": [{"ts", "gpu", "cpu", "ram"}]}
+    with ts in unix seconds (default: now) and utilization in percent (clamped to 0-100).
+    Raises ValueError for a malformed body. Samples older than the hourly history or
+    more than a minute in the future are dropped. Returns (samples, dropped).
+    """
+    now = now or time.time()
+    if not isinstance(payload, dict) or not isinstance(payload.get("samples"), list):
+        raise ValueError('Expected {"samples": [...]}')
+    items = payload["samples"]
+    max_batch = current_app.config.get("TELEMETRY_MAX_BATCH", 1000)
+    if len(items) > max_batch:
+        raise ValueError(f"At most {max_batch} samples per batch")
+
+    oldest = now - 3600 * current_app.config.get("TELEMETRY_HOUR_SLOTS", 720)
+    samples, dropped = [], 0
+    for item in items:
+        try:
+            timestamp = float(item.get("ts", now))
+            values = [float(item[metric]) for metric in METRICS]
+        except (AttributeError, KeyError, TypeError, ValueError):
+            raise ValueError(f"Each sample needs numeric {', '.join(METRICS)} (and optionally ts)")
+        if not all(math.isfinite(v) for v in values + [timestamp]):
+            raise ValueError("Sample values must be finite numbers")
+        if timestamp <= oldest or timestamp > now + 60:
+            dropped += 1
+            continue
+        samples.append(Sample(timestamp, *(min(100.0, max(0.0, v)) for v in values)))
+    return samples, dropped
+
+
+def ingest(server_id, samples):
+    """
+    Folds a batch into the server's ring buffers: one locked read and one write of the
+    server's row, in its own transaction. Returns the number of samples stored.
+    """
+    if not samples:
+        return 0
+    try:
+        _ingest(server_id, samples)
+    except IntegrityError:
+        # Another batch created the row first; it exists now
+        db.session.rollback()
+        _ingest(server_id, samples)
+    TELEMETRY_SAMPLES.inc("stored", amount=len(samples))
+    return len(samples)
+
+
+def _ingest(server_id, samples):
+    row = ServerTelemetry.query.filter_by(server_id=server_id).with_for_update().first()
+    if row is None:
+        row = ServerTelemetry(server_id)
+        db.session.add(row)
+
+    raw = SampleRing(current_app.config.get("TELEMETRY_RAW_SAMPLES", 360), row.raw, row.raw_head)
+    minutes, hours = _minute_ring(row.minutes), _hour_ring(row.hours)
+    for sample in sorted(samples):
+        raw.append(sample)
+        minutes.add(sample)
+        hours.add(sample)
+
+    newest = max(samples)
+    if row.last_sample_at is None or newest.timestamp >= row.last_sample_at.timestamp():
+        row.last_sample_at = datetime.fromtimestamp(newest.timestamp)
+        row.gpu, row.cpu, row.ram = newest.gpu, newest.cpu, newest.ram
+
+    row.raw, row.raw_head = raw.to_bytes(), raw.head
+    row.minutes, row.hours = minutes.to_bytes(), hours.to_bytes()
+    row.updated_at = datetime.now()
+    db.session.commit()
+
+
+# --- Agent Tokens ---
+
+
+def _serializer():
+    return URLSafeSerializer(current_app.config["SECRET_KEY"], salt="telemetry-agent")
+
+
+def agent_token(server_id):
+    """
+    Bearer token the agent on server_id sends. Changing SECRET_KEY revokes every token.
+    """
+    return _serializer().dumps({"server": server_id})
+
+
+def read_agent_token(token):
+    """
+    The server id a token was issued for, or None.
+    """
+    try:
+        data = _serializer().loads(token)
+    except BadSignature:
+        return None
+    return data.get("server") if isinstance(data, dict) else None
+
+
+# --- Read Side ---
+
+
+def is_online(last_sample_at, now=None):
+    if last_sample_at is None:
+        return False
+    now = now or datetime.now()
+    return (now - last_sample_at).total_seconds() < current_app.config.get("TELEMETRY_OFFLINE_AFTER", 300)
+
+
+def fleet_status(server_ids):
+    """
+    {server_id: (latest Sample, online)} from the plain columns only (no blobs).
+    """
+    if not server_ids:
+        return {}
+    table = ServerTelemetry.__table__
+    rows = db.session.execute(
+        db.select(table.c.server_id, table.c.last_sample_at, table.c.gpu, table.c.cpu, table.c.ram).where(
+            table.c.server_id.in_(server_ids), table.c.last_sample_at.isnot(None)
+        )
+    )
+    return {
+        server_id: (Sample(last_sample_at, gpu, cpu, ram), is_online(last_sample_at))
+        for server_id, last_sample_at, gpu, cpu, ram in rows
+    }
+
+
+def server_telemetry(server_id, year=None, month=None, now=None):
+    """
+    What the server and calendar pages show, or None if no agent ever reported:
+    the latest sample, the last hour by minute, the hourly history and (with year
+    and month) the average and peak GPU use per day of that month.
+    """
+    table = ServerTelemetry.__table__
+    row = db.session.execute(
+        db.select(table.c.last_sample_at, table.c.gpu, table.c.cpu, table.c.ram, table.c.minutes, table.c.hours)
+        .where(table.c.server_id == server_id)
+    ).first()
+    if row is None or row.last_sample_at is None:
+        return None
+
+    now = now or time.time()
+    minutes, hours = _minute_ring(row.minutes), _hour_ring(row.hours)
+    last_hour = minutes.buckets(now - 3600)
+    history = hours.buckets(now - 3600 * hours.slots)
+
+    daily = {}
+    if year and month:
+        totals = {}
+        for bucket in history:
+            day = datetime.fromtimestamp(bucket.start)
+            if day.year == year and day.month == month:
+                weight, total, peak = totals.get(day.day, (0, 0.0, 0.0))
+                totals[day.day] = (weight + bucket.samples, total + bucket.gpu * bucket.samples, max(peak, bucket.gpu_max))
+        daily = {day: (total / weight, peak) for day, (weight, total, peak) in totals.items()}
+
+    return {
+        "latest": Sample(row.last_sample_at, row.gpu, row.cpu, row.ram),
+        "online": is_online(row.last_sample_at),
+        "last_hour": last_hour,
+        "history": history,
+        "history_days": hours.slots // 24,
+        "daily_gpu": daily,
+        "charts": {
+            "hour": {metric: chart_points(last_hour, now - 3600, 3600, metric) for metric in METRICS},
+            "history": {
+                metric: chart_points(history, now - 3600 * hours.slots, 3600 * hours.slots, metric)
+                for metric in METRICS
+            },
+        },
+    }
+
+
+def chart_points(buckets, since, span, metric, width=600, height=60):
+    """
+    SVG polyline points for one metric over [since, since + span].
+    """
+    points = []
+    for bucket in buckets:
+        x = (bucket.start - since) / span * width
+        y = height - getattr(bucket, metric) / 100 * height
+        points.append(f"{x:.1f},{y:.1f}")
+    return " ".join(points)
+
+
+# --- Simulated Agent ---
+
+telemetry_cli = AppGroup("telemetry", help="Server utilization telemetry.")
+
+
+def simulated_utilization(seed=None):
+    """
+    Endless (gpu, cpu, ram) random walk that looks like GPU jobs coming and going.
+    """
+    rng = random.Random(seed)
+    gpu, cpu, ram = rng.uniform(0, 100), rng.uniform(5, 60), rng.uniform(10, 70)
+    while True:
+        if rng.random() < 0.02:
+            gpu = rng.choice((rng.uniform(0, 5), rng.uniform(70, 100)))  # A job starts or ends
+        gpu = min(100.0, max(0.0, gpu + rng.gauss(0, 4)))
+        cpu = min(100.0, max(0.0, cpu + rng.gauss(0, 3)))
+        ram = min(100.0, max(0.0, ram + rng.gauss(0, 1)))
+        yield round(gpu, 1), round(cpu, 1), round(ram, 1)
+
+
+def _simulated_batch(walk, start, count, interval):
+    return [dict(zip(("ts",) + METRICS, (start + index * interval,) + next(walk))) for index in range(count)]
+
+
+def _post(url, token, samples, client=None):
+    body = {"samples": samples}
+    headers = {"Authorization": f"Bearer {token}"}
+    if client is not None:
+        response = client.post(url, json=body, headers=headers)
+        return response.status_code, response.get_json()
+    request = urllib.request.Request(
+        url, data=json.dumps(body).encode(), headers={**headers, "Content-Type": "application/json"}, method="POST"
+    )
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return response.status, json.loads(response.read())
+
+
+@telemetry_cli.command("agent")
+@click.argument("server_id", type=int)
+@click.option("--url", help="Push to this running app (e.g. http://localhost:5000); default: in-process.")
+@click.option("--interval", default=10, show_default=True, help="Seconds between samples.")
+@click.option("--batch", default=6, show_default=True, help="Samples per push.")
+@click.option("--backfill-hours", default=0, show_default=True, help="First push this much simulated history.")
+@click.option("--pushes", default=0, help="Stop after this many live pushes (0 = run until Ctrl+C).")
+def agent_command(server_id, url, interval, batch, backfill_hours, pushes):
+    """Simulate the utilization agent of one server."""
+    if db.session.get(Server, server_id) is None:
+        raise click.ClickException(f"No server {server_id}.")
+
+    token = agent_token(server_id)
+    client = None if url else current_app.test_client()
+    endpoint = url.rstrip("/") + "/telemetry/samples" if url else "/telemetry/samples"
+    walk = simulated_utilization(seed=server_id)
+
+    if backfill_hours:
+        count = backfill_hours * 3600 // interval
+        history = _simulated_batch(walk, time.time() - count * interval, count, interval)
+        max_batch = current_app.config.get("TELEMETRY_MAX_BATCH", 1000)
+        for offset in range(0, len(history), max_batch):
+            status, result = _post(endpoint, token, history[offset:offset + max_batch], client)
+            if status != 200:
+                raise click.ClickException(f"Backfill rejected ({status}): {result}")
+        click.echo(f"Backfilled {len(history):,} samples ({backfill_hours}h).")
+
+    sent = 0
+    try:
+        while True:
+            samples = _simulated_batch(walk, time.time() - (batch - 1) * interval, batch, interval)
+            status, result = _post(endpoint, token, samples, client)
+            sent += 1
+            click.echo(f"{datetime.now():%H:%M:%S} push {sent}: {status} {result}")
+            if pushes and sent >= pushes:
+                break
+            time.sleep(interval * batch)
+    except KeyboardInterrupt:
+        pass
@@ -1,29 +1,29 @@
 import os
 import shutil
+import subprocess
+import tempfile
+import time
 from datetime import datetime
 from flask import current_app
-from sqlalchemy import extract
+from sqlalchemy.engine import URL, make_url
 
 from app import db 
-from app.models import TimeSlot, AuditLog
+from app.models import AuditLog
+from app.extensions import audit_sink
+from app.metrics import BACKUPS, BACKUP_DURATION, BACKUP_LAST_RUN, BACKUP_SIZE
+from app.quota import monthly_allowance, month_usage
 
 
 def calculate_user_quota_stats(user, server):
     """
     Calculates the user's quota usage FOR THE CURRENT MONTH only.
-    Strict limits: Max 8 per month.
+    The limit comes from the quota policy (ratio-weighted, see app/quota.py).
     """
-    MAX_MONTHLY_LIMIT = 8  # Hard limit requested
-
     now = datetime.now()
+    MAX_MONTHLY_LIMIT = monthly_allowance(user.id, server.id, now.year, now.month)
 
-    # 1. Calculate Usage (Count reserved slots in CURRENT MONTH only)
-    used_quota = TimeSlot.query.filter(
-        TimeSlot.server_id == server.id, # type: ignore
-        TimeSlot.reserved_by_user_id == user.id,
-        extract("year", TimeSlot.start_time) == now.year, # type: ignore
-        extract("month", TimeSlot.start_time) == now.month, # type: ignore
-    ).count()
+    # 1. Usage in the CURRENT MONTH (maintained counter on user_server)
+    used_quota = month_usage(user.id, server.id, now)
 
     # 2. Calculate Percentage
     usage_percent = 0
@@ -41,15 +41,36 @@ def calculate_user_quota_stats(user, server):
 
 def backup_database():
     """
-    Creates a timestamped copy of the SQLite database in a 'backups' folder.
+    Creates a timestamped backup of the database in a 'backups' folder:
+    a file copy for SQLite, a pg_dump archive for PostgreSQL.
     Returns the filename of the backup or None if failed.
     """
+    started = time.perf_counter()
+
+    db_uri = current_app.config.get("SQLALCHEMY_DATABASE_URI", "")
+    if db_uri.startswith("postgresql"):
+        filename, error = _backup_postgres(db_uri)
+    elif db_uri.startswith("sqlite:///"):
+        filename, error = _backup_sqlite(db_uri)
+    else:
+        filename, error = None, "Unsupported database, cannot create a backup."
+
+    # Metrics: duration and size of the last good backup, runs by result
+    if filename:
+        root_dir = os.path.dirname(os.path.abspath(os.path.dirname(__file__)))
+        BACKUP_DURATION.set(time.perf_counter() - started)
+        BACKUP_SIZE.set(os.path.getsize(os.path.join(root_dir, "backups", filename)))
+        BACKUP_LAST_RUN.set(time.time())
+    BACKUPS.inc("success" if filename else "failure")
+    return filename, error
+
+
+def _backup_sqlite(db_uri):
+    """
+    Copies the SQLite database file into backups/backup_<timestamp>.db.
+    """
     # 1. Get the database path from Flask config
     # URI format is usually 'sqlite:///site.db', we need just 'site.db'
-    db_uri = current_app.config.get("SQLALCHEMY_DATABASE_URI", "")
-    if not db_uri.startswith("sqlite:///"):
-        return None, "Not using SQLite, cannot backup file directly."
-
     db_path = db_uri.replace("sqlite:///", "")
 
     # Handle absolute vs relative paths
@@ -83,14 +104,67 @@ def backup_database():
         return None, str(e)
 
 
-def log_action(user_id, action, details):
+def _backup_postgres(db_uri, chunk_size=1024 * 1024):
     """
-    Records an event to the Audit Log.
+    Streams 'pg_dump --format=custom' (compressed, restore with pg_restore) into
+    backups/backup_<timestamp>.dump without holding the dump in memory.
     """
+    # pg_dump wants a plain libpq URI: drop the SQLAlchemy driver suffix (postgresql+psycopg2://).
+    # The password goes through PGPASSWORD, so it never shows up in the process list
+    url = make_url(db_uri)
+    libpq_uri = URL.create(
+        url.get_backend_name(), username=url.username, host=url.host, port=url.port, database=url.database, query=url.query
+    ).render_as_string(hide_password=False)
+    env = dict(os.environ)
+    if url.password:
+        env["PGPASSWORD"] = str(url.password)
+
+    root_dir = os.path.dirname(os.path.abspath(os.path.dirname(__file__)))
+    backup_dir = os.path.join(root_dir, "backups")
+    os.makedirs(backup_dir, exist_ok=True)
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    backup_filename = f"backup_{timestamp}.dump"
+    destination_path = os.path.join(backup_dir, backup_filename)
+    command = [current_app.config.get("PG_DUMP_PATH", "pg_dump"), "--format=custom", "--no-password", "--dbname", libpq_uri]
+
     try:
-        log = AuditLog(user_id=user_id, action=action, details=details)
-        db.session.add(log)
-        db.session.commit()
+        # stderr goes to a temp file so a chatty pg_dump can't block on a full pipe
+        with open(destination_path, "wb") as out, tempfile.TemporaryFile() as errors:
+            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=errors, env=env)
+            for chunk in iter(lambda: process.stdout.read(chunk_size), b""):
+                out.write(chunk)
+            process.wait()
+            errors.seek(0)
+            stderr = errors.read().decode(errors="replace")
     except Exception as e:
-        print(f"Logging Failed: {e}")
-        # We don't want logging errors to crash the main app, so we just print it
+        if os.path.exists(destination_path):
+            os.remove(destination_path)
+        return None, str(e)
+
+    if process.returncode != 0:
+        os.remove(destination_path)
+        return None, stderr.strip() or f"pg_dump exited with status {process.returncode}"
+    return backup_filename, None
+
+
+def log_action(user_id, action, details=None, slot=None, server_id=None, target_user_id=None):
+    """
+    Records an event to the Audit Log (action is an AuditAction).
+    Pass the slot for booking events: its server, id and day are stored as columns.
+    Doesn't commit: the entry is part of the caller's transaction, so it is saved or
+    rolled back together with the change it records, and a failure reaches the caller.
+    After the commit the event is also appended to the JSONL event stream.
+    """
+    log = AuditLog(
+        user_id=user_id,
+        action=action,
+        details=details,
+        server_id=slot.server_id if slot else server_id,
+        slot_id=slot.id if slot else None,
+        target_user_id=target_user_id,
+        day=slot.start_time.date() if slot else None,
+    )
+    db.session.add(log)
+    db.session.flush()
+    audit_sink.queue(db.session, log.to_event())  # Before the commit expires the attributes
@@ -0,0 +1,7 @@
+import os
+from app.asgi import create_asgi_app
+
+# ASGI entry point: uvicorn asgi:app --workers 1
+config_name = os.getenv('FLASK_CONFIG') or 'default'
+
+app = create_asgi_app(config_name)
@@ -0,0 +1,235 @@
+"""
+Concurrency limits of the two serving modes: run.py (threaded Werkzeug server) vs
+asgi.py under uvicorn (async availability/SSE views, Flask in a thread pool).
+
+Seeds a throwaway SQLite database, starts each server in a subprocess, then for
+every --streams level opens that many idle live-calendar streams (SSE) and, while
+they are held open, fires --requests availability.json requests with --concurrency
+in flight. Reports streams accepted, availability p50/p95/p99 and req/s, and the
+server's thread count and RSS with the streams open.
+
+Needs the optional ASGI packages (pip install a2wsgi aiosqlite uvicorn).
+
+Usage:
+    python benchmarks/bench_async_serving.py [--streams 0,100,500] [--requests 500]
+        [--concurrency 32] [--users 200] [--servers 10] [--months 2]
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from bench_hot_paths import git_commit, percentile, seed_database  # noqa: E402
+
+# run.py's server (app.run: threaded Werkzeug) on a free local port
+SYNC_CHILD = "from run import app; app.run(host='127.0.0.1', port={port})"
+
+
+# --- Servers ---
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(mode, port, env):
+    if mode == "sync":
+        cmd = [sys.executable, "-c", SYNC_CHILD.format(port=port)]
+    else:
+        cmd = [sys.executable, "-m", "uvicorn", "asgi:app", "--port", str(port), "--log-level", "warning"]
+    proc = subprocess.Popen(
+        cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True
+    )
+
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f"{mode} server did not start on port {port}")
+
+
+def process_stats(pid):
+    """
+    (threads, RSS in MB) of a server and its child processes (run.py's reloader runs
+    the app in a child), from /proc. Linux only; (None, None) elsewhere.
+    """
+    threads, rss_kb = 0, 0
+    pids = [pid]
+    try:
+        while pids:
+            current = pids.pop()
+            with open(f"/proc/{current}/status") as f:
+                fields = dict(line.split(":", 1) for line in f)
+            threads += int(fields["Threads"])
+            rss_kb += int(fields["VmRSS"].split()[0])
+            with open(f"/proc/{current}/task/{current}/children") as f:
+                pids.extend(int(child) for child in f.read().split())
+    except OSError:
+        return None, None
+    return threads, round(rss_kb / 1024, 1)
+
+
+# --- Client (plain asyncio sockets, so the client is never the bottleneck) ---
+
+
+async def open_stream(port, path, cookie, timeout=10):
+    """
+    Opens an SSE stream and waits for the response headers. Returns the writer (kept
+    open by the caller) or None if the server did not answer in time.
+    """
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection("127.0.0.1", port), timeout)
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\nCookie: {cookie}\r\n\r\n".encode())
+        await writer.drain()
+        status = await asyncio.wait_for(reader.readline(), timeout)
+        return writer if b" 200 " in status else None
+    except (OSError, asyncio.TimeoutError):
+        return None
+
+
+async def fetch(port, path, cookie, timeout=30):
+    reader, writer = await asyncio.wait_for(asyncio.open_connection("127.0.0.1", port), timeout)
+    try:
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\nCookie: {cookie}\r\nConnection: close\r\n\r\n".encode())
+        await writer.drain()
+        response = await asyncio.wait_for(reader.read(), timeout)
+        return int(response.split(b" ", 2)[1])
+    finally:
+        writer.close()
+
+
+async def run_level(port, pid, ids, cookie, streams, n_requests, concurrency):
+    today = datetime.now()
+    base = f"/reserve/{ids['server_id']}/{today.year}/{today.month}"
+
+    writers = await asyncio.gather(*(open_stream(port, f"{base}/stream", cookie) for _ in range(streams)))
+    accepted = sum(1 for w in writers if w is not None)
+
+    latencies, errors = [], 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                status = await fetch(port, f"{base}/availability.json", cookie)
+            except (OSError, asyncio.TimeoutError, IndexError, ValueError):
+                status = 0
+            latencies.append(time.perf_counter() - started)
+            if status != 200:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(n_requests)))
+    wall = time.perf_counter() - started
+
+    threads, rss = process_stats(pid)  # Streams still open
+    for writer in writers:
+        if writer is not None:
+            writer.close()
+    await asyncio.sleep(1)  # Let the server notice the closed streams
+    return accepted, latencies, errors, wall, threads, rss
+
+
+# --- Main ---
+
+
+def session_cookie(app, user_id):
+    serializer = app.session_interface.get_signing_serializer(app)
+    token = serializer.dumps({"_user_id": str(user_id), "_fresh": True})
+    return f"{app.config['SESSION_COOKIE_NAME']}={token}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--streams", default="0,100,500", help="comma-separated idle SSE stream counts")
+    parser.add_argument("--requests", type=int, default=500, help="availability requests per level")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--servers", type=int, default=10)
+    parser.add_argument("--months", type=int, default=2)
+    parser.add_argument("--modes", default="sync,asgi")
+    parser.add_argument("--output", help="where to save the JSON results")
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix="bench_async_serving_")
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tmp_dir, "bench.db")
+    os.environ["SECRET_KEY"] = "bench-async-serving"
+
+    from app import create_app
+
+    app = create_app("default", background_services=False)
+    started = time.perf_counter()
+    ids = seed_database(app, args.users, args.servers, args.months)
+    print(f"Seeded {ids['totals']} in {time.perf_counter() - started:.1f}s")
+    cookie = session_cookie(app, ids["user_id"])
+
+    levels = [int(n) for n in args.streams.split(",")]
+    results = {}
+    print(f"\n{'mode':<6}{'streams':>8}{'accepted':>10}{'p50':>9}{'p95':>9}{'p99':>9}{'req/s':>9}"
+          f"{'errors':>8}{'threads':>9}{'RSS MB':>8}")
+    for mode in args.modes.split(","):
+        port = free_port()
+        proc = start_server(mode, port, dict(os.environ))
+        results[mode] = []
+        try:
+            for streams in levels:
+                accepted, latencies, errors, wall, threads, rss = asyncio.run(
+                    run_level(port, proc.pid, ids, cookie, streams, args.requests, args.concurrency)
+                )
+                result = {
+                    "streams": streams,
+                    "accepted": accepted,
+                    "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+                    "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+                    "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+                    "throughput_rps": round(len(latencies) / wall, 1),
+                    "errors": errors,
+                    "threads": threads,
+                    "rss_mb": rss,
+                }
+                results[mode].append(result)
+                print(f"{mode:<6}{streams:>8}{accepted:>10}{result['p50_ms']:>9.2f}{result['p95_ms']:>9.2f}"
+                      f"{result['p99_ms']:>9.2f}{result['throughput_rps']:>9.1f}{errors:>8}"
+                      f"{threads if threads is not None else '-':>9}{rss if rss is not None else '-':>8}")
+        finally:
+            os.killpg(proc.pid, signal.SIGTERM)  # Whole group: run.py's reloader child too
+            proc.wait(timeout=30)
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "params": vars(args),
+        "dataset": ids["totals"],
+        "results": results,
+    }
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"async_serving_{report['commit'] or 'nogit'}_{datetime.now():%Y%m%d_%H%M%S}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nSaved results to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Bytes on the wire per page, with and without compression.
+
+Seeds a throwaway SQLite database, builds the fingerprinted static assets into a
+temporary directory, then fetches the main pages through the Flask test client
+with and without Accept-Encoding: gzip. Reports HTML bytes (identity vs gzip),
+the time the compression adds per response, the size of every static asset as
+served (identity, gzip, br) and the total a cold page load transfers.
+
+Usage:
+    python benchmarks/bench_compression.py [--users 500] [--servers 20] [--months 6]
+        [--requests 50] [--output results.json]
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from bench_hot_paths import git_commit, make_client, percentile, seed_database  # noqa: E402
+
+ASSET_URL = re.compile(r'(?:href|src)="(/(?:assets|static)/[^"]+)"')
+
+
+def pages(ids):
+    server_id = ids["server_id"]
+    return {
+        "admin.list_reservations": ("admin", "/admin/reservations"),
+        "admin.list_users": ("admin", "/admin/users"),
+        "admin.list_servers": ("admin", "/admin/servers"),
+        "admin.view_logs": ("admin", "/admin/logs"),
+        "admin.assign_users": ("admin", f"/admin/servers/{server_id}/assign"),
+        "reservations.calendar": ("user", f"/reserve/{server_id}"),
+        "main.dashboard": ("user", "/dashboard"),
+    }
+
+
+def timed_get(client, path, encoding, requests):
+    headers = {"Accept-Encoding": encoding} if encoding else {}
+    times, response = [], None
+    for _ in range(requests):
+        started = time.perf_counter()
+        response = client.get(path, headers=headers)
+        times.append(time.perf_counter() - started)
+        if response.status_code != 200:
+            raise RuntimeError(f"GET {path} returned {response.status_code}")
+    return response, times
+
+
+def asset_sizes(client, urls):
+    """{url: {encoding: bytes sent}} for each asset a page references."""
+    sizes = {}
+    for url in urls:
+        sizes[url] = {}
+        for encoding in ("identity", "gzip", "br"):
+            response = client.get(url, headers={"Accept-Encoding": encoding})
+            sent = response.headers.get("Content-Encoding", "identity")
+            if sent == encoding:
+                sizes[url][encoding] = len(response.get_data())
+    return sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--servers", type=int, default=20)
+    parser.add_argument("--months", type=int, default=6)
+    parser.add_argument("--requests", type=int, default=50, help="timed requests per page and encoding")
+    parser.add_argument("--output", help="where to save the JSON results")
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix="bench_compression_")
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tmp_dir, "bench.db")
+    os.environ["SECRET_KEY"] = "bench-compression"
+
+    from app import create_app
+    from app.assets import build_assets
+
+    app = create_app("default", background_services=False)
+    app.config["ASSETS_BUILD_DIR"] = os.path.join(tmp_dir, "dist")
+    started = time.perf_counter()
+    build_assets(app.static_folder, app.config["ASSETS_BUILD_DIR"])
+    print(f"Built static assets in {time.perf_counter() - started:.1f}s")
+
+    started = time.perf_counter()
+    ids = seed_database(app, args.users, args.servers, args.months)
+    print(f"Seeded {ids['totals']} in {time.perf_counter() - started:.1f}s")
+    clients = {"user": make_client(app, ids["user_id"]), "admin": make_client(app, ids["admin_id"])}
+
+    results, asset_urls = {}, set()
+    print(f"\n{'page':<28}{'identity B':>12}{'gzip B':>10}{'ratio':>8}{'p50 id ms':>11}{'p50 gz ms':>11}{'+ms':>7}")
+    for name, (who, path) in pages(ids).items():
+        client = clients[who]
+        timed_get(client, path, None, 3)  # Warm up
+        plain, plain_times = timed_get(client, path, None, args.requests)
+        packed, packed_times = timed_get(client, path, "gzip", args.requests)
+        asset_urls.update(ASSET_URL.findall(plain.get_data(as_text=True)))
+
+        result = {
+            "path": path,
+            "identity_bytes": len(plain.get_data()),
+            "gzip_bytes": len(packed.get_data()),
+            "content_encoding": packed.headers.get("Content-Encoding", "identity"),
+            "p50_identity_ms": round(percentile(plain_times, 50) * 1000, 2),
+            "p50_gzip_ms": round(percentile(packed_times, 50) * 1000, 2),
+        }
+        result["ratio"] = round(result["identity_bytes"] / max(result["gzip_bytes"], 1), 1)
+        results[name] = result
+        print(f"{name:<28}{result['identity_bytes']:>12,}{result['gzip_bytes']:>10,}{result['ratio']:>7.1f}x"
+              f"{result['p50_identity_ms']:>11.2f}{result['p50_gzip_ms']:>11.2f}"
+              f"{result['p50_gzip_ms'] - result['p50_identity_ms']:>+7.2f}")
+
+    assets = asset_sizes(clients["user"], sorted(asset_urls))
+    print(f"\n{'asset':<66}{'identity B':>12}{'gzip B':>10}{'br B':>10}")
+    for url, sizes in assets.items():
+        columns = [f"{sizes[e]:,}" if e in sizes else "-" for e in ("identity", "gzip", "br")]
+        print(f"{url:<66}{columns[0]:>12}{columns[1]:>10}{columns[2]:>10}")
+
+    # Cold load: the page plus every asset it references, best encoding available
+    def best(sizes, order):
+        return next(sizes[e] for e in order if e in sizes)
+
+    static_identity = sum(sizes["identity"] for sizes in assets.values())
+    static_best = sum(best(sizes, ("br", "gzip", "identity")) for sizes in assets.values())
+    cold = {
+        name: {
+            "identity_bytes": result["identity_bytes"] + static_identity,
+            "compressed_bytes": result["gzip_bytes"] + static_best,
+        }
+        for name, result in results.items()
+    }
+    print(f"\nCold page load (HTML + assets): {static_identity:,} B of assets uncompressed, {static_best:,} B compressed")
+    for name, sizes in cold.items():
+        print(f"{name:<28}{sizes['identity_bytes']:>12,} -> {sizes['compressed_bytes']:>10,} B")
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "params": vars(args),
+        "dataset": ids["totals"],
+        "pages": results,
+        "assets": assets,
+        "cold_load": cold,
+    }
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"compression_{report['commit'] or 'nogit'}_{datetime.now():%Y%m%d_%H%M%S}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nSaved results to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Startup profile: import time (python -X importtime) and create_app() boot time.
+
+Each run is appended to benchmarks/results/startup_history.jsonl together with the
+current git commit, so cold-start cost can be compared over time.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 5] [--top 15]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+# Runs in a fresh interpreter so nothing is already imported
+CHILD = """
+import json, time
+t0 = time.perf_counter()
+from app import create_app
+t1 = time.perf_counter()
+app = create_app("default", background_services={background})
+t2 = time.perf_counter()
+print(json.dumps({{"import_s": t1 - t0, "create_app_s": t2 - t1}}))
+import os; os._exit(0)
+"""
+
+
+def run_child(background, importtime=False):
+    env = dict(os.environ)
+    env["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "startup.db")
+    cmd = [sys.executable]
+    if importtime:
+        cmd += ["-X", "importtime"]
+    cmd += ["-c", CHILD.format(background=background)]
+
+    proc = subprocess.run(cmd, cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    timings = json.loads(proc.stdout.strip().splitlines()[-1])
+    return timings, proc.stderr
+
+
+def parse_importtime(stderr):
+    """
+    Returns [(module, self_us, cumulative_us, depth)] from -X importtime output.
+    """
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        modules.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return modules
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True
+        ).stdout.strip()
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    # 1. Boot time with and without background services
+    boot = {}
+    for background in (False, True):
+        samples = [run_child(background)[0] for _ in range(args.runs)]
+        boot["with_background" if background else "without_background"] = {
+            "import_s": statistics.median(s["import_s"] for s in samples),
+            "create_app_s": statistics.median(s["create_app_s"] for s in samples),
+        }
+
+    # 2. Import profile (one run is enough, it is deterministic in shape)
+    _, stderr = run_child(False, importtime=True)
+    modules = parse_importtime(stderr)
+    top_level = [m for m in modules if m[3] == 0]
+    total_import_us = sum(m[2] for m in top_level)
+    slowest = sorted(top_level, key=lambda m: m[2], reverse=True)[: args.top]
+    project = sorted((m for m in modules if m[0] == "app" or m[0].startswith("app.")), key=lambda m: m[1], reverse=True)
+
+    print(f"Total import time: {total_import_us / 1000:.1f} ms")
+    for mode, result in boot.items():
+        print(
+            f"{mode:<20} import {result['import_s'] * 1000:8.1f} ms   create_app {result['create_app_s'] * 1000:8.1f} ms"
+        )
+
+    print("\nSlowest top-level imports:")
+    for name, _, cumulative, _ in slowest:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    print("\nProject modules (self time):")
+    for name, self_us, _, _ in project[: args.top]:
+        print(f"  {self_us / 1000:8.1f} ms  {name}")
+
+    # 3. Keep a history for comparisons between commits
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    record = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": sys.version.split()[0],
+        "total_import_ms": round(total_import_us / 1000, 1),
+        "boot": boot,
+        "slowest_imports": [{"module": m[0], "cumulative_ms": round(m[2] / 1000, 1)} for m in slowest],
+    }
+    with open(os.path.join(RESULTS_DIR, "startup_history.jsonl"), "a") as f:
+        f.write(json.dumps(record) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""reconcile used_quota
+
+month_usage now trusts user_server.used_quota, which older versions never
+kept up to date. Recount this month's bookings into it once, as
+app.quota.reconcile_used_quota does nightly.
+
+Revision ID: 35e5268981ff
+Revises: ea7e3c05a0cc
+Create Date: 2026-10-19 01:01:57.991426
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '35e5268981ff'
+down_revision = 'ea7e3c05a0cc'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    user_server = sa.table(
+        'user_server',
+        sa.column('user_id', sa.Integer),
+        sa.column('server_id', sa.Integer),
+        sa.column('used_quota', sa.Integer),
+    )
+    time_slot = sa.table(
+        'time_slot',
+        sa.column('id', sa.Integer),
+        sa.column('start_time', sa.DateTime),
+        sa.column('server_id', sa.Integer),
+        sa.column('reserved_by_user_id', sa.Integer),
+    )
+
+    now = datetime.now()
+    month_start = datetime(now.year, now.month, 1)
+    month_end = datetime(now.year + 1, 1, 1) if now.month == 12 else datetime(now.year, now.month + 1, 1)
+
+    booked = (
+        sa.select(sa.func.count(time_slot.c.id))
+        .where(
+            time_slot.c.server_id == user_server.c.server_id,
+            time_slot.c.reserved_by_user_id == user_server.c.user_id,
+            time_slot.c.start_time >= month_start,
+            time_slot.c.start_time < month_end,
+        )
+        .scalar_subquery()
+    )
+    op.execute(user_server.update().values(used_quota=booked))
+
+
+def downgrade():
+    # The recount is still correct for the older code
+    pass
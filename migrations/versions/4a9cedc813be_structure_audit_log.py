@@ -0,0 +1,41 @@
+"""structure audit_log
+
+Revision ID: 4a9cedc813be
+Revises: b23f89d557f1
+Create Date: 2026-10-19 01:04:53.711659
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4a9cedc813be'
+down_revision = 'b23f89d557f1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing rows keep NULL in the new columns; 'action' stays a VARCHAR(50)
+    with op.batch_alter_table('audit_log', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('server_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('slot_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('target_user_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('day', sa.Date(), nullable=True))
+        batch_op.create_index('ix_audit_log_timestamp', ['timestamp'], unique=False)
+        batch_op.create_index('ix_audit_log_action_timestamp', ['action', 'timestamp'], unique=False)
+        batch_op.create_index('ix_audit_log_server_id', ['server_id'], unique=False)
+        batch_op.create_index('ix_audit_log_target_user_id', ['target_user_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('audit_log', schema=None) as batch_op:
+        batch_op.drop_index('ix_audit_log_target_user_id')
+        batch_op.drop_index('ix_audit_log_server_id')
+        batch_op.drop_index('ix_audit_log_action_timestamp')
+        batch_op.drop_index('ix_audit_log_timestamp')
+        batch_op.drop_column('day')
+        batch_op.drop_column('target_user_id')
+        batch_op.drop_column('slot_id')
+        batch_op.drop_column('server_id')
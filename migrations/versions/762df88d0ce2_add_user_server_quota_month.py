@@ -0,0 +1,26 @@
+"""add user_server quota_month
+
+Revision ID: 762df88d0ce2
+Revises: e63801e10e4c
+Create Date: 2026-10-19 01:24:14.125310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '762df88d0ce2'
+down_revision = 'e63801e10e4c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Left NULL: every counter counts as stale and is recounted on its next use
+    op.add_column('user_server', sa.Column('quota_month', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('user_server') as batch_op:
+        batch_op.drop_column('quota_month')
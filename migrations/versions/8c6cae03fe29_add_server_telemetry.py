@@ -0,0 +1,39 @@
+"""add server_telemetry
+
+Revision ID: 8c6cae03fe29
+Revises: d990f31bab41
+Create Date: 2026-10-19 01:12:44.439108
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c6cae03fe29'
+down_revision = 'd990f31bab41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Starts empty: the first batch an agent pushes creates the server's row
+    op.create_table(
+        'server_telemetry',
+        sa.Column('server_id', sa.Integer(), nullable=False),
+        sa.Column('last_sample_at', sa.DateTime(), nullable=True),
+        sa.Column('gpu', sa.Float(), nullable=True),
+        sa.Column('cpu', sa.Float(), nullable=True),
+        sa.Column('ram', sa.Float(), nullable=True),
+        sa.Column('raw_head', sa.Integer(), nullable=False),
+        sa.Column('raw', sa.LargeBinary(), nullable=True),
+        sa.Column('minutes', sa.LargeBinary(), nullable=True),
+        sa.Column('hours', sa.LargeBinary(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['server_id'], ['server.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('server_id'),
+    )
+
+
+def downgrade():
+    op.drop_table('server_telemetry')
@@ -0,0 +1,84 @@
+"""deletion jobs and on delete rules
+
+Adds the deletion_job table that tracks background deletions, and gives the
+foreign keys pointing at user/server their ON DELETE rules (see app/deletion.py).
+
+Revision ID: a3c636359715
+Revises: aeb5062dd7ef
+Create Date: 2026-10-19 01:08:54.687647
+
+"""
+from itertools import groupby
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c636359715'
+down_revision = 'aeb5062dd7ef'
+branch_labels = None
+depends_on = None
+
+
+# (table, column, referred table, ON DELETE rule)
+FOREIGN_KEYS = [
+    ('user_server', 'user_id', 'user', 'CASCADE'),
+    ('user_server', 'server_id', 'server', 'CASCADE'),
+    ('time_slot', 'server_id', 'server', 'CASCADE'),
+    ('time_slot', 'reserved_by_user_id', 'user', 'SET NULL'),
+    ('audit_log', 'user_id', 'user', 'SET NULL'),
+    ('usage_rollup', 'server_id', 'server', 'CASCADE'),
+    ('usage_rollup', 'user_id', 'user', 'CASCADE'),
+    ('waitlist_entry', 'user_id', 'user', 'CASCADE'),
+    ('waitlist_entry', 'server_id', 'server', 'CASCADE'),
+]
+
+
+# SQLite's constraints are unnamed: batch mode names them by this convention to drop them
+SQLITE_NAMING = {'fk': 'fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s'}
+
+
+def _replace_foreign_keys(with_rules):
+    if op.get_bind().dialect.name == 'postgresql':
+        for table, column, referred, rule in FOREIGN_KEYS:
+            name = f'{table}_{column}_fkey'  # PostgreSQL's name for an unnamed constraint
+            op.drop_constraint(name, table, type_='foreignkey')
+            op.create_foreign_key(name, table, referred, [column], ['id'], ondelete=rule if with_rules else None)
+        return
+
+    # SQLite can't alter a constraint in place: batch mode copies each table into a new one
+    for table, keys in groupby(FOREIGN_KEYS, key=lambda key: key[0]):
+        with op.batch_alter_table(table, naming_convention=SQLITE_NAMING) as batch_op:
+            for _, column, referred, rule in keys:
+                name = f'fk_{table}_{column}_{referred}'
+                batch_op.drop_constraint(name, type_='foreignkey')
+                batch_op.create_foreign_key(name, referred, [column], ['id'], ondelete=rule if with_rules else None)
+
+
+def upgrade():
+    op.create_table(
+        'deletion_job',
+        sa.Column('id', sa.String(length=12), nullable=False),
+        sa.Column('kind', sa.String(length=10), nullable=False),
+        sa.Column('target_id', sa.Integer(), nullable=False),
+        sa.Column('label', sa.String(length=150), nullable=False),
+        sa.Column('requested_by_id', sa.Integer(), nullable=True),
+        sa.Column('state', sa.String(length=10), nullable=False),
+        sa.Column('step', sa.String(length=50), nullable=True),
+        sa.Column('rows', sa.JSON(), nullable=False),
+        sa.Column('started', sa.DateTime(), nullable=False),
+        sa.Column('heartbeat', sa.DateTime(), nullable=False),
+        sa.Column('finished', sa.DateTime(), nullable=True),
+        sa.Column('seconds', sa.Float(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_deletion_job_target', 'deletion_job', ['kind', 'target_id'], unique=False)
+    _replace_foreign_keys(with_rules=True)
+
+
+def downgrade():
+    _replace_foreign_keys(with_rules=False)
+    op.drop_index('ix_deletion_job_target', table_name='deletion_job')
+    op.drop_table('deletion_job')
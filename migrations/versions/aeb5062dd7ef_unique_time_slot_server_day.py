@@ -0,0 +1,58 @@
+"""unique time_slot server day
+
+One TimeSlot row per server and day, enforced by a unique index (sparse
+storage relies on it to turn a concurrent insert into "taken"). Duplicate
+free rows left by old slot generation runs are dropped first.
+
+Revision ID: aeb5062dd7ef
+Revises: 4a9cedc813be
+Create Date: 2026-10-19 01:06:14.799942
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'aeb5062dd7ef'
+down_revision = '4a9cedc813be'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    time_slot = sa.table(
+        'time_slot',
+        sa.column('id', sa.Integer),
+        sa.column('start_time', sa.DateTime),
+        sa.column('server_id', sa.Integer),
+        sa.column('reserved_by_user_id', sa.Integer),
+    )
+    other = time_slot.alias('other')
+
+    # 1. A free row goes if the same server-day has a reserved row or an older free one
+    shadowed = sa.exists().where(
+        other.c.server_id == time_slot.c.server_id,
+        other.c.start_time == time_slot.c.start_time,
+        other.c.id != time_slot.c.id,
+        sa.or_(other.c.reserved_by_user_id.isnot(None), other.c.id < time_slot.c.id),
+    )
+    op.execute(time_slot.delete().where(time_slot.c.reserved_by_user_id.is_(None), shadowed))
+
+    # 2. Two reservations of the same day need a person to decide; refuse to guess
+    duplicates = op.get_bind().execute(
+        sa.select(time_slot.c.server_id, time_slot.c.start_time)
+        .group_by(time_slot.c.server_id, time_slot.c.start_time)
+        .having(sa.func.count() > 1)
+        .limit(5)
+    ).all()
+    if duplicates:
+        raise RuntimeError(f"Duplicate reservations for the same server and day, fix these first: {duplicates}")
+
+    # 3. Databases converted with `flask slots convert-sparse` already have it
+    if 'uq_time_slot_server_day' not in {index['name'] for index in sa.inspect(op.get_bind()).get_indexes('time_slot')}:
+        op.create_index('uq_time_slot_server_day', 'time_slot', ['server_id', 'start_time'], unique=True)
+
+
+def downgrade():
+    op.drop_index('uq_time_slot_server_day', table_name='time_slot')
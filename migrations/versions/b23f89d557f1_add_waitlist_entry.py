@@ -0,0 +1,37 @@
+"""add waitlist_entry
+
+Revision ID: b23f89d557f1
+Revises: 35e5268981ff
+Create Date: 2026-10-19 01:02:31.448850
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b23f89d557f1'
+down_revision = '35e5268981ff'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'waitlist_entry',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('server_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['server_id'], ['server.id']),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'server_id', 'day'),
+    )
+    op.create_index('ix_waitlist_server_day', 'waitlist_entry', ['server_id', 'day', 'created_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_waitlist_server_day', table_name='waitlist_entry')
+    op.drop_table('waitlist_entry')
@@ -0,0 +1,31 @@
+"""add reservation_version
+
+Revision ID: badf79ddb6ef
+Revises: a3c636359715
+Create Date: 2026-10-19 01:10:13.407604
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'badf79ddb6ef'
+down_revision = 'a3c636359715'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # No rows yet: a missing row reads as version 0 and the first change inserts it
+    op.create_table(
+        'reservation_version',
+        sa.Column('scope', sa.String(length=10), nullable=False),
+        sa.Column('key', sa.Integer(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('scope', 'key'),
+    )
+
+
+def downgrade():
+    op.drop_table('reservation_version')
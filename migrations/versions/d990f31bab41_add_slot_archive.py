@@ -0,0 +1,34 @@
+"""add slot_archive
+
+Revision ID: d990f31bab41
+Revises: badf79ddb6ef
+Create Date: 2026-10-19 01:10:26.976943
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd990f31bab41'
+down_revision = 'badf79ddb6ef'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Starts empty: `flask slots compact` (or the monthly job) fills it
+    op.create_table(
+        'slot_archive',
+        sa.Column('server_id', sa.Integer(), nullable=False),
+        sa.Column('year', sa.Integer(), nullable=False),
+        sa.Column('month', sa.Integer(), nullable=False),
+        sa.Column('owners', sa.JSON(), nullable=False),
+        sa.Column('archived_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['server_id'], ['server.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('server_id', 'year', 'month'),
+    )
+
+
+def downgrade():
+    op.drop_table('slot_archive')
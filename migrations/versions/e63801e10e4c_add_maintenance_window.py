@@ -0,0 +1,40 @@
+"""add maintenance_window
+
+Revision ID: e63801e10e4c
+Revises: 8c6cae03fe29
+Create Date: 2026-10-19 01:14:05.894465
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e63801e10e4c'
+down_revision = '8c6cae03fe29'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'maintenance_window',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('server_id', sa.Integer(), nullable=False),
+        sa.Column('start_day', sa.Date(), nullable=False),
+        sa.Column('end_day', sa.Date(), nullable=False),
+        sa.Column('reason', sa.String(length=200), nullable=True),
+        sa.Column('created_by_id', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['created_by_id'], ['user.id'], ondelete='SET NULL'),
+        sa.ForeignKeyConstraint(['server_id'], ['server.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(
+        'ix_maintenance_window_server_days', 'maintenance_window', ['server_id', 'start_day', 'end_day'], unique=False
+    )
+
+
+def downgrade():
+    op.drop_index('ix_maintenance_window_server_days', table_name='maintenance_window')
+    op.drop_table('maintenance_window')
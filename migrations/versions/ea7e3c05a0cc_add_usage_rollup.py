@@ -0,0 +1,55 @@
+"""add usage_rollup
+
+Creates the monthly rollup table and fills it from the existing bookings, so
+the analytics pages are right from the first request after the upgrade (the
+nightly rebuild only runs later).
+
+Revision ID: ea7e3c05a0cc
+Revises: f0ec0d6d25a6
+Create Date: 2026-10-19 01:01:17.153908
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'ea7e3c05a0cc'
+down_revision = 'f0ec0d6d25a6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    usage_rollup = op.create_table(
+        'usage_rollup',
+        sa.Column('year', sa.Integer(), nullable=False),
+        sa.Column('month', sa.Integer(), nullable=False),
+        sa.Column('server_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('booked_days', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['server_id'], ['server.id']),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+        sa.PrimaryKeyConstraint('year', 'month', 'server_id', 'user_id'),
+    )
+
+    # Same query as app.analytics.rebuild_rollups (the live months; there is no archive yet)
+    time_slot = sa.table(
+        'time_slot',
+        sa.column('id', sa.Integer),
+        sa.column('start_time', sa.DateTime),
+        sa.column('server_id', sa.Integer),
+        sa.column('reserved_by_user_id', sa.Integer),
+    )
+    year_col = sa.extract('year', time_slot.c.start_time)
+    month_col = sa.extract('month', time_slot.c.start_time)
+    counts = (
+        sa.select(year_col, month_col, time_slot.c.server_id, time_slot.c.reserved_by_user_id, sa.func.count(time_slot.c.id))
+        .where(time_slot.c.reserved_by_user_id.isnot(None))
+        .group_by(year_col, month_col, time_slot.c.server_id, time_slot.c.reserved_by_user_id)
+    )
+    op.execute(usage_rollup.insert().from_select(['year', 'month', 'server_id', 'user_id', 'booked_days'], counts))
+
+
+def downgrade():
+    op.drop_table('usage_rollup')
@@ -0,0 +1,91 @@
+"""baseline schema
+
+The tables as they were before migrations were added. Databases created
+earlier with db.create_all() already have them: mark those with
+`flask db stamp f0ec0d6d25a6` before running `flask db upgrade`.
+
+Revision ID: f0ec0d6d25a6
+Revises: 
+Create Date: 2026-10-19 01:01:15.412087
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f0ec0d6d25a6'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'user',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('username', sa.String(length=150), nullable=False),
+        sa.Column('email', sa.String(length=150), nullable=False),
+        sa.Column('password', sa.String(length=200), nullable=False),
+        sa.Column('ratio', sa.Float(), nullable=True),
+        sa.Column('resource_needed', sa.String(length=50), nullable=True),
+        sa.Column('position', sa.String(length=50), nullable=True),
+        sa.Column('is_admin', sa.Boolean(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('email'),
+        sa.UniqueConstraint('username'),
+    )
+    op.create_table(
+        'server',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=150), nullable=False),
+        sa.Column('ip_address', sa.String(length=50), nullable=False),
+        sa.Column('location', sa.String(length=100), nullable=True),
+        sa.Column('hdd_size', sa.Integer(), nullable=True),
+        sa.Column('ssd_size', sa.Integer(), nullable=True),
+        sa.Column('ram_size', sa.Integer(), nullable=True),
+        sa.Column('vram_size', sa.Integer(), nullable=True),
+        sa.Column('cpu_model', sa.String(length=100), nullable=True),
+        sa.Column('gpu_model', sa.String(length=100), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_table(
+        'user_server',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('server_id', sa.Integer(), nullable=False),
+        sa.Column('MAX_QUOTA', sa.Integer(), nullable=True),
+        sa.Column('used_quota', sa.Integer(), nullable=True),
+        sa.Column('Access_StartDate', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['server_id'], ['server.id']),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+        sa.PrimaryKeyConstraint('user_id', 'server_id'),
+    )
+    op.create_table(
+        'time_slot',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('start_time', sa.DateTime(), nullable=False),
+        sa.Column('end_time', sa.DateTime(), nullable=False),
+        sa.Column('server_id', sa.Integer(), nullable=False),
+        sa.Column('reserved_by_user_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['reserved_by_user_id'], ['user.id']),
+        sa.ForeignKeyConstraint(['server_id'], ['server.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_table(
+        'audit_log',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('timestamp', sa.DateTime(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('action', sa.String(length=50), nullable=False),
+        sa.Column('details', sa.String(length=255), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+
+
+def downgrade():
+    op.drop_table('audit_log')
+    op.drop_table('time_slot')
+    op.drop_table('user_server')
+    op.drop_table('server')
+    op.drop_table('user')
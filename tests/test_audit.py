@@ -0,0 +1,49 @@
+"""
+Audit entries belong to the transaction of the change they record.
+"""
+from datetime import datetime, timedelta
+from unittest import mock
+
+import pytest
+
+from conftest import make_server, make_user
+
+
+def test_log_action_commits_and_rolls_back_with_the_caller(app, session):
+    from app.extensions import audit_sink
+    from app.models import AuditAction, AuditLog
+    from app.utils import log_action
+
+    user = make_user(session)
+    with mock.patch.object(audit_sink, "emit") as emit:
+        log_action(user.id, AuditAction.CREATE_USER, "rolled back", target_user_id=user.id)
+        session.rollback()
+        assert AuditLog.query.count() == 0
+        emit.assert_not_called()
+
+        log_action(user.id, AuditAction.CREATE_USER, "kept", target_user_id=user.id)
+        session.commit()
+    assert [log.details for log in AuditLog.query] == ["kept"]
+    [(event,), _] = emit.call_args
+    assert event["details"] == "kept"
+
+
+def test_failed_audit_entry_fails_the_booking(app, session):
+    from app.bookings import reserve
+    from app.models import AuditAction, TimeSlot
+    from app.utils import log_action
+
+    server, user = make_server(session), make_user(session)
+    day = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    slot = TimeSlot(start_time=day, end_time=day + timedelta(seconds=86399), server_id=server.id)
+    session.add(slot)
+    session.commit()
+    slot_id = slot.id
+
+    reserve(slot, user.id)
+    with mock.patch.object(session, "flush", side_effect=RuntimeError("deadlock detected")):
+        with pytest.raises(RuntimeError):
+            log_action(user.id, AuditAction.BOOK_SLOT, "Reserved", slot=slot)
+    session.rollback()  # What the request teardown does with the caller's transaction
+
+    assert session.get(TimeSlot, slot_id).reserved_by_user_id is None
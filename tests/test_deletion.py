@@ -0,0 +1,89 @@
+"""
+Background deletions: job state in the deletion_job table, resuming abandoned
+jobs, and the audit entry written when a job finishes.
+"""
+import time
+from unittest import mock
+
+from conftest import make_server, make_user
+
+
+def wait_for(session, job_id, timeout=10):
+    from app.deletion import get_job
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        session.expire_all()
+        job = get_job(job_id)
+        if job["state"] in ("done", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"deletion {job_id} did not finish")
+
+
+def audit_entries(session, action):
+    from app.models import AuditLog
+
+    session.expire_all()
+    return AuditLog.query.filter_by(action=action).all()
+
+
+def test_audit_entry_is_written_when_the_job_finishes(app, session):
+    from app.deletion import start_deletion
+    from app.models import AuditAction, Server
+
+    admin = make_user(session, "root", position="Admin", ratio=0.0, is_admin=True)
+    server = make_server(session)
+    server_id, admin_id = server.id, admin.id
+
+    # Not run yet: the job is recorded, the audit log is not
+    with mock.patch("app.deletion._launch"):
+        job_id = start_deletion(app, "server", server_id, "gpu-01", admin_id)
+    assert audit_entries(session, AuditAction.DELETE_SERVER) == []
+
+    app.config["DELETE_JOB_STALE_SECONDS"] = 0
+    try:
+        from app.deletion import resume_abandoned
+
+        assert resume_abandoned(app) == [job_id]
+        job = wait_for(session, job_id)
+    finally:
+        app.config["DELETE_JOB_STALE_SECONDS"] = 120
+
+    assert job["state"] == "done" and job["rows"]["server"] == 1
+    assert session.get(Server, server_id) is None
+    [entry] = audit_entries(session, AuditAction.DELETE_SERVER)
+    assert entry.user_id == admin_id and entry.server_id == server_id
+
+
+def test_live_job_is_reused_and_claims_are_exclusive(app, session):
+    from app.deletion import _claim, start_deletion
+    from app.models import DeletionJob
+
+    server = make_server(session)
+    with mock.patch("app.deletion._launch") as launch:
+        first = start_deletion(app, "server", server.id, "gpu-01")
+        assert start_deletion(app, "server", server.id, "gpu-01") == first
+    assert launch.call_count == 1
+
+    # Two workers resuming the same abandoned job: only one wins
+    heartbeat = session.get(DeletionJob, first).heartbeat
+    assert _claim(first, heartbeat) is True
+    assert _claim(first, heartbeat) is False
+
+
+def test_failed_job_runs_again_when_deleted_again(app, session):
+    from app.deletion import start_deletion
+    from app.models import DeletionJob, User
+
+    user = make_user(session)
+    user_id = user.id
+    with mock.patch("app.deletion.delete_user_rows", side_effect=RuntimeError("disk full")):
+        job_id = start_deletion(app, "user", user_id, "alice")
+        failed = wait_for(session, job_id)
+    assert failed["state"] == "failed" and failed["error"] == "disk full"
+
+    assert start_deletion(app, "user", user_id, "alice") == job_id
+    assert wait_for(session, job_id)["state"] == "done"
+    assert session.get(User, user_id) is None
+    assert DeletionJob.query.count() == 1
@@ -0,0 +1,47 @@
+"""
+Password hashing: latency metrics and views that turn requests away while the
+hashing pool is saturated.
+"""
+from unittest import mock
+
+from conftest import login, make_user
+
+
+def test_admin_user_forms_return_503_when_hashing_is_busy(app, session):
+    from app.models import User
+
+    admin = make_user(session, "root", position="Admin", ratio=0.0, is_admin=True)
+    user = make_user(session)
+    client = login(app.test_client(), session, admin)
+    user_id = user.id
+
+    with mock.patch("app.routes.admin.hash_password", side_effect=TimeoutError("Password hashing queue is full.")):
+        response = client.post("/admin/users/add", data={
+            "username": "bob", "email": "bob@example.com", "password": "pw", "position": "PG", "resource_needed": "GPU",
+        })
+        assert response.status_code == 503
+        assert b"busy" in response.data
+
+        response = client.post(f"/admin/users/edit/{user_id}", data={
+            "username": "alice2", "email": "alice@example.com", "password": "new", "position": "PG", "resource_needed": "GPU",
+        })
+        assert response.status_code == 503
+
+    session.expire_all()
+    assert User.query.filter_by(username="bob").first() is None
+    assert session.get(User, user_id).username == "alice"
+
+
+def test_hash_and_verify_latency_goes_to_the_histogram(app):
+    from app.hashing import hash_password, verify_password
+    from app.metrics import PASSWORD_HASH_DURATION, render
+
+    def count(operation):
+        entry = PASSWORD_HASH_DURATION.collect().get((operation,))
+        return sum(entry[:-1]) if entry else 0
+
+    before = count("hash"), count("verify")
+    with app.app_context():
+        assert verify_password(hash_password("pw"), "pw")
+    assert (count("hash"), count("verify")) == (before[0] + 1, before[1] + 1)
+    assert 'password_hash_duration_seconds_bucket{operation="verify",le="+Inf"}' in render()
@@ -0,0 +1,77 @@
+"""
+Maintenance windows: relocating the reservations on blocked days.
+"""
+from datetime import date, datetime, timedelta
+
+from conftest import make_server, make_user
+
+
+def test_relocation_respects_the_owners_limits(app, session):
+    from app.maintenance import start_maintenance
+    from app.models import TimeSlot, user_server
+    from app.quota import invalidate_allowances
+
+    admin = make_user(session, "root", position="Admin", ratio=0.0, is_admin=True)
+    user = make_user(session)
+    blocked, small, other = (make_server(session, name) for name in ("gpu-01", "gpu-02", "gpu-03"))
+    # One day a month on each server the reservations could move to
+    session.execute(user_server.insert(), [
+        {"user_id": user.id, "server_id": blocked.id, "MAX_QUOTA": 0},
+        {"user_id": user.id, "server_id": small.id, "MAX_QUOTA": 1},
+        {"user_id": user.id, "server_id": other.id, "MAX_QUOTA": 1},
+    ])
+    invalidate_allowances()
+
+    # Three days next month, booked on the server going down; free rows everywhere else
+    first = (date.today().replace(day=1) + timedelta(days=32)).replace(day=2)
+    days = [datetime.combine(first + timedelta(days=offset), datetime.min.time()) for offset in range(3)]
+    for server in (blocked, small, other):
+        for day in days:
+            session.add(TimeSlot(
+                start_time=day,
+                end_time=day + timedelta(seconds=86399),
+                server_id=server.id,
+                reserved_by_user_id=user.id if server is blocked else None,
+            ))
+    session.commit()
+    user_id, server_ids = user.id, (blocked.id, small.id, other.id)
+
+    result = start_maintenance([blocked.id], days[0].date(), days[-1].date(), admin.id, relocate=True)
+
+    # The second move doesn't fit on gpu-02 any more, and the third fits nowhere
+    assert result == {"windows": 1, "cancelled": 1, "relocated": 2}
+    session.expire_all()
+    owned = {
+        (slot.server_id, slot.start_time)
+        for slot in TimeSlot.query.filter_by(reserved_by_user_id=user_id)
+    }
+    assert owned == {(server_ids[1], days[0]), (server_ids[2], days[1])}
+
+
+def test_audit_details_fit_the_column_with_long_names(app, session):
+    from app.maintenance import start_maintenance
+    from app.models import AuditAction, AuditLog, TimeSlot, user_server
+
+    admin = make_user(session, "root", position="Admin", ratio=0.0, is_admin=True)
+    user = make_user(session, "u" * 130)  # Email: 150 chars
+    blocked, target = make_server(session, "a" * 150), make_server(session, "b" * 150)
+    session.execute(user_server.insert(), [
+        {"user_id": user.id, "server_id": server.id, "MAX_QUOTA": 0} for server in (blocked, target)
+    ])
+    day = datetime.combine(date.today() + timedelta(days=1), datetime.min.time())
+    for server in (blocked, target):
+        session.add(TimeSlot(
+            start_time=day,
+            end_time=day + timedelta(seconds=86399),
+            server_id=server.id,
+            reserved_by_user_id=user.id if server is blocked else None,
+        ))
+    session.commit()
+
+    result = start_maintenance([blocked.id], day.date(), day.date(), admin.id, reason="r" * 200, relocate=True)
+
+    assert result["relocated"] == 1
+    session.expire_all()
+    details = {log.action: log.details for log in AuditLog.query}
+    assert set(details) == {AuditAction.MAINTENANCE_START, AuditAction.MAINTENANCE_RELOCATE}
+    assert all(len(text) == 255 for text in details.values())
@@ -0,0 +1,38 @@
+"""
+Who may scrape GET /metrics.
+"""
+import pytest
+
+
+@pytest.fixture()
+def metrics_config(app):
+    saved = {key: app.config.get(key) for key in ("METRICS_TOKEN", "METRICS_REQUIRE_TOKEN")}
+    yield app.config
+    app.config.update(saved)
+
+
+def scrape(app, remote_addr="127.0.0.1", **headers):
+    return app.test_client().get("/metrics", headers=headers, environ_base={"REMOTE_ADDR": remote_addr})
+
+
+def test_without_a_token_only_localhost_is_answered(app, metrics_config):
+    metrics_config.update(METRICS_TOKEN=None, METRICS_REQUIRE_TOKEN=False)
+    assert scrape(app).status_code == 200
+    assert scrape(app, "::1").status_code == 200
+    assert scrape(app, "10.0.0.7").status_code == 403
+
+
+def test_token_is_required_from_every_address(app, metrics_config):
+    metrics_config.update(METRICS_TOKEN="s3cret", METRICS_REQUIRE_TOKEN=False)
+    assert scrape(app).status_code == 401
+    assert scrape(app, Authorization="Bearer wrong").status_code == 401
+    assert scrape(app, "10.0.0.7", Authorization="Bearer s3cret").status_code == 200
+
+
+def test_production_answers_nothing_without_a_token(app, metrics_config):
+    from config import ProductionConfig
+
+    metrics_config.update(METRICS_TOKEN=None, METRICS_REQUIRE_TOKEN=ProductionConfig.METRICS_REQUIRE_TOKEN)
+    response = scrape(app)
+    assert response.status_code == 403
+    assert b"METRICS_TOKEN" in response.data
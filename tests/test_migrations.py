@@ -0,0 +1,25 @@
+"""
+The migrations build the schema models.py describes.
+"""
+import os
+import subprocess
+import sys
+
+from conftest import ROOT
+
+
+def flask_db(database_url, *args):
+    env = {**os.environ, "DATABASE_URL": database_url}
+    return subprocess.run(
+        [sys.executable, "-m", "flask", "--app", "run", "db", *args],
+        cwd=ROOT, env=env, capture_output=True, text=True, timeout=300,
+    )
+
+
+def test_upgraded_sqlite_database_matches_the_models(tmp_path):
+    url = "sqlite:///" + str(tmp_path / "migrated.db")
+
+    upgrade = flask_db(url, "upgrade")
+    assert upgrade.returncode == 0, upgrade.stderr
+    check = flask_db(url, "check")
+    assert check.returncode == 0, check.stdout + check.stderr
@@ -0,0 +1,96 @@
+"""
+PostgreSQL-only behaviour: advisory locks, row locks and pg_dump backups.
+Skipped unless DATABASE_URL points at PostgreSQL (see conftest.py).
+"""
+import os
+import shutil
+import subprocess
+from datetime import datetime, timedelta
+from unittest import mock
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from conftest import make_server
+
+
+def try_lock(connection, sql, **params):
+    return connection.execute(text(sql), params).scalar()
+
+
+def test_lock_quota_serializes_one_user_and_server(postgres, other_connection):
+    from app.bookings import lock_quota
+
+    lock_quota(7, 3)
+    assert try_lock(other_connection, "SELECT pg_try_advisory_xact_lock(7, 3)") is False
+    assert try_lock(other_connection, "SELECT pg_try_advisory_xact_lock(7, 4)") is True
+    other_connection.rollback()
+
+    postgres.rollback()  # Transaction over: the lock is gone
+    assert try_lock(other_connection, "SELECT pg_try_advisory_xact_lock(7, 3)") is True
+
+
+def test_lock_server_days_shared_for_bookings_exclusive_for_maintenance(postgres, other_connection):
+    from app.bookings import lock_server_days
+
+    # Bookings share the lock with each other but keep a maintenance window out
+    lock_server_days([5])
+    assert try_lock(other_connection, "SELECT pg_try_advisory_xact_lock_shared(5)") is True
+    assert try_lock(other_connection, "SELECT pg_try_advisory_xact_lock(5)") is False
+    other_connection.rollback()
+    postgres.rollback()
+
+    # A maintenance window keeps bookings out
+    lock_server_days([5, 6], exclusive=True)
+    assert try_lock(other_connection, "SELECT pg_try_advisory_xact_lock_shared(6)") is False
+    # The single-key space doesn't collide with lock_quota's two-key locks
+    assert try_lock(other_connection, "SELECT pg_try_advisory_xact_lock(5, 6)") is True
+
+
+def test_lock_day_holds_the_row_until_commit(postgres, other_connection):
+    from app.models import TimeSlot
+    from app.slots import lock_day
+
+    server = make_server(postgres)
+    day = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    postgres.add(TimeSlot(start_time=day, end_time=day + timedelta(seconds=86399), server_id=server.id))
+    postgres.commit()
+
+    slot = lock_day(server.id, day)
+    assert slot is not None
+    with pytest.raises(OperationalError):
+        other_connection.execute(text("SELECT id FROM time_slot WHERE id = :id FOR UPDATE NOWAIT"), {"id": slot.id})
+    other_connection.rollback()
+
+    postgres.commit()
+    assert other_connection.execute(
+        text("SELECT id FROM time_slot WHERE id = :id FOR UPDATE NOWAIT"), {"id": slot.id}
+    ).scalar() == slot.id
+
+
+def test_backup_streams_pg_dump_without_password_in_argv(app, postgres):
+    from app.utils import backup_database
+
+    pg_dump = app.config["PG_DUMP_PATH"]
+    if not shutil.which(pg_dump):
+        pytest.skip("pg_dump not found (set PG_DUMP_PATH)")
+    make_server(postgres)
+
+    popen = subprocess.Popen
+    with mock.patch("app.utils.subprocess.Popen", side_effect=popen) as spy:
+        filename, error = backup_database()
+    assert error is None
+
+    command, kwargs = spy.call_args.args[0], spy.call_args.kwargs
+    password = postgres.get_bind().url.password
+    if password:
+        assert not any(password in arg for arg in command)
+        assert kwargs["env"]["PGPASSWORD"] == password
+
+    path = os.path.join(os.path.dirname(app.root_path), "backups", filename)
+    try:
+        with open(path, "rb") as f:
+            assert f.read(5) == b"PGDMP"  # Custom-format archive header
+    finally:
+        os.remove(path)
@@ -0,0 +1,81 @@
+"""
+Quota policy and the used_quota counter.
+"""
+from datetime import datetime, timedelta
+
+from conftest import make_server, make_user
+
+
+def add_day(session, server, day, owner=None):
+    from app.models import TimeSlot
+
+    slot = TimeSlot(start_time=day, end_time=day + timedelta(seconds=86399), server_id=server.id)
+    slot.reserved_by_user_id = owner.id if owner else None
+    session.add(slot)
+    return slot
+
+
+def counter(session, user, server):
+    from app.models import user_server
+
+    return session.execute(
+        user_server.select().where(user_server.c.user_id == user.id, user_server.c.server_id == server.id)
+    ).one()
+
+
+def test_counter_from_an_earlier_month_is_recounted(app, session):
+    from app.bookings import reserve
+    from app.models import user_server
+    from app.quota import month_usage
+
+    user, server = make_user(session), make_server(session)
+    first = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    last_month = (first - timedelta(days=1)).year * 100 + (first - timedelta(days=1)).month
+    this_month = first.year * 100 + first.month
+
+    # The month-start reset never ran: last month's 5 days are still in the counter
+    session.execute(user_server.insert().values(user_id=user.id, server_id=server.id, used_quota=5, quota_month=last_month))
+    add_day(session, server, first, user)
+    add_day(session, server, first + timedelta(days=1), user)
+    free = add_day(session, server, first + timedelta(days=2))
+    session.commit()
+    assert month_usage(user.id, server.id, first) == 2
+
+    # The next booking recounts and restamps it
+    reserve(free, user.id)
+    session.commit()
+    row = counter(session, user, server)
+    assert (row.used_quota, row.quota_month) == (3, this_month)
+
+    # Stamped for this month: read as is (no COUNT)
+    session.execute(user_server.update().values(used_quota=7))
+    assert month_usage(user.id, server.id, first) == 7
+
+
+def test_allowances_scale_down_on_an_oversubscribed_server_and_respect_caps(app, session):
+    from app.models import user_server
+    from app.quota import compute_allowances, weekly_allowance
+
+    busy, quiet = make_server(session, "gpu-01"), make_server(session, "gpu-02")
+    professors = [make_user(session, f"prof{i}", position="Professor", ratio=2.0) for i in range(3)]
+    student = make_user(session, "pg", position="PG", ratio=0.5)
+    undergrad = make_user(session, "ug", position="UG", ratio=0.25)
+    admin = make_user(session, "root", position="Admin", ratio=0.0, is_admin=True)
+    session.execute(user_server.insert(), [
+        *({"user_id": user.id, "server_id": busy.id, "MAX_QUOTA": 0} for user in professors + [admin]),
+        {"user_id": student.id, "server_id": busy.id, "MAX_QUOTA": 1},
+        {"user_id": student.id, "server_id": quiet.id, "MAX_QUOTA": 0},
+        {"user_id": undergrad.id, "server_id": quiet.id, "MAX_QUOTA": 0},
+    ])
+    session.commit()
+
+    allowances = compute_allowances(2026, 10)  # 31 days
+
+    # gpu-01: 3 x 16 + 4 = 52 days asked for 31, so every request is scaled by 31/52
+    assert [allowances[(user.id, busy.id)] for user in professors] == [9, 9, 9]
+    assert allowances[(student.id, busy.id)] == 1  # 2 after scaling, capped by MAX_QUOTA
+    assert allowances[(admin.id, busy.id)] == 31  # Unlimited and not part of the demand
+    # gpu-02 has room: QUOTA_BASE_MONTHLY (8) times the ratio
+    assert allowances[(student.id, quiet.id)] == 4
+    assert allowances[(undergrad.id, quiet.id)] == 2
+    assert (weekly_allowance(9), weekly_allowance(4), weekly_allowance(1)) == (3, 1, 1)
@@ -0,0 +1,38 @@
+"""
+Login throttling: failed attempts per username and per client IP.
+"""
+from unittest import mock
+
+from conftest import make_user
+
+
+def attempt(client, username, password, ip="10.1.0.1"):
+    return client.post(
+        "/auth/login",
+        data={"username": username, "password": password},
+        environ_base={"REMOTE_ADDR": ip},
+    )
+
+
+def test_login_is_refused_before_any_lookup_once_the_limit_is_reached(app, session):
+    from app.extensions import login_limiter
+    from app.hashing import hash_password
+    from app.ratelimit import MemoryStore
+
+    user, other = make_user(session, "alice"), make_user(session, "bob")
+    user.password = other.password = hash_password("secret")
+    session.commit()
+    client = app.test_client()
+
+    with mock.patch.object(login_limiter, "store", MemoryStore()):
+        for _ in range(app.config["LOGIN_RATE_LIMIT_USER"]):
+            assert attempt(client, "Alice ", "wrong").status_code == 200
+
+        # Even the right password: no user query and no hash work while limited
+        with mock.patch("app.routes.auth.User") as model, mock.patch("app.routes.auth.verify_password") as verify:
+            assert attempt(client, "alice", "secret", ip="10.1.0.2").status_code == 429
+        model.query.filter_by.assert_not_called()
+        verify.assert_not_called()
+
+        # Other accounts from the same address are not affected
+        assert attempt(client, "bob", "secret").status_code == 302
@@ -0,0 +1,139 @@
+"""
+Utilization telemetry: the ring buffers, batch validation and the agents'
+ingestion endpoint (POST /telemetry/samples).
+"""
+import time
+
+import pytest
+
+from conftest import make_server
+
+
+def post_samples(client, token, samples):
+    return client.post("/telemetry/samples", json={"samples": samples}, headers={"Authorization": f"Bearer {token}"})
+
+
+def test_sample_ring_wraps_around_and_survives_a_round_trip():
+    from app.telemetry import Sample, SampleRing
+
+    ring = SampleRing(3)
+    for timestamp in range(1, 6):
+        ring.append(Sample(timestamp, timestamp, 0, 0))
+    assert [s.timestamp for s in ring.samples()] == [3, 4, 5]  # 1 and 2 overwritten, oldest first
+    assert ring.head == 2
+
+    stored = SampleRing(3, ring.to_bytes(), ring.head)
+    stored.append(Sample(6, 6, 0, 0))
+    assert [s.timestamp for s in stored.samples()] == [4, 5, 6]
+
+    # Resized ring: the stored blob no longer fits, the ring starts over
+    assert SampleRing(4, ring.to_bytes(), ring.head).samples() == []
+
+
+def test_rollup_ring_reuses_a_slot_for_a_newer_bucket():
+    from app.telemetry import RollupRing, Sample
+
+    ring = RollupRing(60, 2)  # Two one-minute slots
+    ring.add(Sample(0, 10, 0, 0))
+    ring.add(Sample(30, 30, 0, 0))
+    ring.add(Sample(60, 50, 0, 0))
+    [first, second] = ring.buckets(-1)
+    assert (first.start, first.samples, first.gpu, first.gpu_max) == (0, 2, 20, 30)
+    assert (second.start, second.samples) == (60, 1)
+
+    # Minute 2 lands on minute 0's slot: the old bucket is reset, not added to
+    ring.add(Sample(125, 90, 0, 0))
+    assert [(b.start, b.samples, b.gpu) for b in ring.buckets(-1)] == [(60, 1, 50), (120, 1, 90)]
+
+    # A late sample for minute 0 no longer has a slot and is ignored
+    ring.add(Sample(5, 0, 0, 0))
+    assert [(b.start, b.samples) for b in ring.buckets(-1)] == [(60, 1), (120, 1)]
+    assert [b.start for b in ring.buckets(60)] == [120]
+
+
+@pytest.mark.parametrize("payload", [
+    None,
+    [],
+    {"samples": {}},
+    {"samples": [{"gpu": 1, "cpu": 2}]},
+    {"samples": [{"gpu": "busy", "cpu": 2, "ram": 3}]},
+    {"samples": ["gpu"]},
+    {"samples": [{"gpu": float("nan"), "cpu": 2, "ram": 3}]},
+    {"samples": [{"ts": float("inf"), "gpu": 1, "cpu": 2, "ram": 3}]},
+])
+def test_parse_samples_rejects_malformed_batches(app, payload):
+    from app.telemetry import parse_samples
+
+    with app.app_context(), pytest.raises(ValueError):
+        parse_samples(payload)
+
+
+def test_parse_samples_clamps_values_and_drops_stale_timestamps(app):
+    from app.telemetry import parse_samples
+
+    now = 1_000_000_000.0
+    with app.app_context():
+        samples, dropped = parse_samples({"samples": [
+            {"ts": now - 10, "gpu": 120, "cpu": -5, "ram": "42.5"},
+            {"gpu": 1, "cpu": 2, "ram": 3},                     # No ts: now
+            {"ts": now + 3600, "gpu": 1, "cpu": 2, "ram": 3},   # Future
+            {"ts": now - 3600 * 721, "gpu": 1, "cpu": 2, "ram": 3},  # Older than the hourly history
+        ]}, now=now)
+        assert samples == [(now - 10, 100.0, 0.0, 42.5), (now, 1.0, 2.0, 3.0)]
+        assert dropped == 2
+
+        app.config["TELEMETRY_MAX_BATCH"] = 2
+        try:
+            with pytest.raises(ValueError):
+                parse_samples({"samples": [{"gpu": 1, "cpu": 1, "ram": 1}] * 3}, now=now)
+        finally:
+            app.config["TELEMETRY_MAX_BATCH"] = 1000
+
+
+def test_endpoint_authenticates_the_agent(app, session):
+    from app.telemetry import agent_token
+
+    server = make_server(session)
+    client = app.test_client()
+    sample = [{"gpu": 1, "cpu": 2, "ram": 3}]
+
+    assert client.post("/telemetry/samples", json={"samples": sample}).status_code == 401
+    assert post_samples(client, "forged", sample).status_code == 401
+    assert post_samples(client, agent_token(server.id + 1), sample).status_code == 404
+
+    response = post_samples(client, agent_token(server.id), {"samples": "nope"})
+    assert response.status_code == 400
+    assert response.get_json()["error"]
+
+
+def test_endpoint_stores_batches_in_the_server_row(app, session):
+    from app.models import ServerTelemetry
+    from app.telemetry import SampleRing, agent_token, fleet_status, server_telemetry
+
+    server = make_server(session)
+    token = agent_token(server.id)
+    client = app.test_client()
+    now = time.time()
+
+    response = post_samples(client, token, [
+        {"ts": now - 20, "gpu": 10, "cpu": 20, "ram": 30},
+        {"ts": now - 10, "gpu": 50, "cpu": 60, "ram": 70},
+        {"ts": now + 3600, "gpu": 1, "cpu": 1, "ram": 1},
+    ])
+    assert response.status_code == 200
+    assert response.get_json() == {"stored": 2, "skipped": 1}
+
+    # A second batch, out of order: the latest sample stays the newest one
+    assert post_samples(client, token, [{"ts": now - 30, "gpu": 0, "cpu": 0, "ram": 0}]).get_json()["stored"] == 1
+
+    session.expire_all()
+    row = session.get(ServerTelemetry, server.id)
+    raw = SampleRing(app.config["TELEMETRY_RAW_SAMPLES"], row.raw, row.raw_head)
+    assert [s.gpu for s in raw.samples()] == [10, 50, 0]  # Arrival order
+    assert row.raw_head == 3 and row.gpu == 50
+
+    latest, online = fleet_status([server.id])[server.id]
+    assert online and latest.gpu == 50
+    telemetry = server_telemetry(server.id, now=now)
+    assert sum(b.samples for b in telemetry["last_hour"]) == 3
+    assert sum(b.samples for b in telemetry["history"]) == 3
@@ -0,0 +1,129 @@
+"""
+Waitlist hand-over: a cancelled or revoked day goes to the oldest waiting user who
+is still assigned to the server and within their quota.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import login, make_server, make_user
+
+
+def midnight(days_from_today):
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    return today + timedelta(days=days_from_today)
+
+
+def add_slot(session, server, day, owner=None):
+    from app.models import TimeSlot
+
+    slot = TimeSlot(start_time=day, end_time=day + timedelta(seconds=86399), server_id=server.id)
+    slot.reserved_by_user_id = owner.id if owner else None
+    session.add(slot)
+    session.commit()
+    return slot
+
+
+def assign(session, server, *users, max_quota=0):
+    from app.models import user_server
+    from app.quota import invalidate_allowances
+
+    session.execute(user_server.insert(), [
+        {"user_id": user.id, "server_id": server.id, "MAX_QUOTA": max_quota} for user in users
+    ])
+    session.commit()
+    invalidate_allowances()
+
+
+def wait_for(session, server, day, *users):
+    from app.models import WaitlistEntry
+
+    for minutes, user in enumerate(users):
+        entry = WaitlistEntry(user.id, server.id, day.date())
+        entry.created_at = datetime.now() - timedelta(hours=1) + timedelta(minutes=minutes)  # Arrival order
+        session.add(entry)
+    session.commit()
+
+
+def waiting(session):
+    from app.models import User, WaitlistEntry
+
+    session.expire_all()
+    return [session.get(User, entry.user_id).username for entry in WaitlistEntry.query.order_by(WaitlistEntry.created_at)]
+
+
+def test_cancel_hands_the_day_to_the_oldest_eligible_waiter(app, session):
+    from app.models import AuditAction, AuditLog, TimeSlot
+
+    day = midnight(1)
+    if day.month != datetime.now().month:
+        pytest.skip("cancelling is only open for the current month; tomorrow is next month")
+
+    server = make_server(session)
+    owner, gone, full, first, second = (make_user(session, name) for name in ("alice", "carol", "dave", "erin", "frank"))
+    assign(session, server, owner, first, second)
+    assign(session, server, full, max_quota=1)  # And carol lost her access
+    add_slot(session, server, midnight(0), full)  # dave's one day this month
+    slot = add_slot(session, server, day, owner)
+    wait_for(session, server, day, gone, full, first, second)
+    slot_id = slot.id
+
+    client = login(app.test_client(), session, owner)
+    response = client.post(f"/reserve/{server.id}/book/{day.year}/{day.month}/{day.day}")
+    assert response.status_code == 302
+
+    session.expire_all()
+    assert session.get(TimeSlot, slot_id).reserved_by_user_id == first.id
+    # carol is dropped for good, dave keeps his place, erin got the day, frank waits on
+    assert waiting(session) == ["dave", "frank"]
+    assert [(log.action, log.user_id) for log in AuditLog.query.order_by(AuditLog.id)] == [
+        (AuditAction.CANCEL_SLOT, owner.id),
+        (AuditAction.WAITLIST_ASSIGN, first.id),
+    ]
+
+
+def test_admin_revoke_hands_the_day_over(app, session):
+    from app.models import AuditAction, AuditLog, TimeSlot
+
+    admin = make_user(session, "root", position="Admin", ratio=0.0, is_admin=True)
+    server = make_server(session)
+    owner, waiter = make_user(session, "alice"), make_user(session, "bob")
+    assign(session, server, owner, waiter)
+    day = midnight(2)
+    slot = add_slot(session, server, day, owner)
+    wait_for(session, server, day, waiter)
+    slot_id = slot.id
+
+    client = login(app.test_client(), session, admin)
+    assert client.post(f"/admin/reservations/cancel/{slot_id}").status_code == 302
+
+    session.expire_all()
+    assert session.get(TimeSlot, slot_id).reserved_by_user_id == waiter.id
+    assert waiting(session) == []
+    logs = AuditLog.query.order_by(AuditLog.id).all()
+    assert [(log.action, log.target_user_id) for log in logs] == [
+        (AuditAction.ADMIN_REVOKE, owner.id),
+        (AuditAction.WAITLIST_ASSIGN, None),
+    ]
+    assert logs[1].user_id == waiter.id
+
+
+def test_day_stays_free_when_nobody_waiting_can_take_it(app, session):
+    from app.bookings import release
+    from app.models import TimeSlot
+
+    server = make_server(session)
+    owner, unassigned = make_user(session, "alice"), make_user(session, "carol")
+    assign(session, server, owner)
+    day = midnight(3)
+    slot = add_slot(session, server, day, owner)
+    wait_for(session, server, day, unassigned)
+
+    assert release(slot) is None
+    session.commit()
+
+    assert waiting(session) == []
+    if app.config.get("SLOT_STORAGE") == "sparse":
+        assert TimeSlot.query.count() == 0  # Free days have no row
+    else:
+        assert TimeSlot.query.one().reserved_by_user_id is None